@@ -0,0 +1,296 @@
+"""
+Wspólny, asynchroniczny silnik pętli agenta dla CLI (main.py) i Streamlit (app.py).
+
+Jedna iteracja (step):
+  okno historii (ContextManager) -> model przez client.aio (opcjonalnie streaming)
+  -> reviewer (najpierw lokalna analiza AST, potem LLM) / zgody dla wrażliwych narzędzi
+  -> narzędzia w puli wątków -> historia.
+Wszystko, co blokuje (narzędzia, reviewer, input() w CLI, zapis pamięci, cache promptu),
+idzie do executora, więc jedna pętla zdarzeń może prowadzić wiele sesji naraz.
+
+Frontend podpina się przez AgentHooks:
+  - review(...)   - werdykt dla kodu / diffu (domyślnie reviewer.py)
+  - approve(...)  - zgoda na wrażliwe narzędzie (domyślnie: tak)
+  - on_event(...) - zdarzenia UI (wywoływane zawsze w wątku pętli zdarzeń)
+"""
+import asyncio
+import contextvars
+import functools
+import os
+
+from google.genai import types  # type: ignore[import]
+
+from blob_store import BlobStore, MediaResolver
+from call_function import get_available_tool, call_functions
+from config import BLOB_DIR, MAX_ITERS, MODEL_NAME, WORKING_DIR, STATIC_REVIEW_ENABLED, STATIC_REVIEW_AUTO_APPROVE
+from functions.edit_file import EditConflict, preview_edit, change_diff, content_hash
+from memory import save_memory
+from prompts import system_prompt
+from reviewer import review_code, review_diff
+from static_review import pre_review
+from streaming import astream_generate_content
+import tracing
+from tracing import span
+import usage
+
+# Funkcje wrażliwe wymagające zgody
+SENSITIVE_FUNCTIONS = ["write_file", "edit_file", "run_python_file"]
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Uruchamia blokującą funkcję w puli wątków, z kopią kontekstu (spany, ledger tokenów)."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
+
+
+class AgentHooks:
+    """
+    Domyślne zachowanie silnika - frontend nadpisuje to, czego potrzebuje.
+
+    Zdarzenia on_event (nazwa, dane):
+      iteration(index), context(sent, total), text(text), response(response), tool_call(name, args),
+      diff(name, file_path, diff), review(name, file_path, approved, feedback),
+      rejected(name, kind, reason) - kind: review / conflict / denied,
+      tool_output(name, stream, text), tool_result(name, response),
+      budget(message), done(text)
+    """
+
+    async def review(self, func_name, file_path, kind, payload):
+        """kind: "code" (cały plik z write_file) albo "diff" (zmiana z edit_file)."""
+        reviewer = review_code if kind == "code" else review_diff
+        return await run_blocking(reviewer, payload)
+
+    async def approve(self, func_name, func_args, change=None):
+        return True
+
+    def on_event(self, event, **data):
+        pass
+
+
+class AgentEngine:
+    def __init__(self, client, hooks=None, stream=False, context=None, prompt_cache=None, ledger=None,
+                 tracer=None, max_iters=MAX_ITERS, working_directory=WORKING_DIR, save_messages=save_memory, media=None,
+                 verbose=False):
+        self.client = client
+        self.hooks = hooks or AgentHooks()
+        self.stream = stream
+        self.context = context
+        self.prompt_cache = prompt_cache
+        self.ledger = ledger
+        # Własny tracer (np. sesji usługi); None -> tracer bieżącego kontekstu / globalny
+        self.tracer = tracer
+        self.max_iters = max_iters
+        self.working_directory = working_directory
+        self.save_messages = save_messages
+        # Referencje blob:// w historii -> bajty / upload / notka, dopiero przed wywołaniem modelu
+        self.media = media or MediaResolver(BlobStore(os.path.join(working_directory, BLOB_DIR)), client)
+        self.verbose = verbose
+        self.iteration = 0
+        # "done", "budget" albo "max_iters" po zakończeniu run()
+        self.stop_reason = None
+
+    async def run(self, messages):
+        """
+        Prowadzi pętlę do odpowiedzi końcowej, budżetu albo limitu iteracji.
+        Zwraca tekst odpowiedzi albo None (powód w stop_reason). Historia jest zapisywana po każdej iteracji.
+        """
+        if self.ledger is not None:
+            usage.activate(self.ledger)
+        if self.tracer is not None:
+            tracing.activate(self.tracer)
+
+        for i in range(self.max_iters):
+            self.iteration = i
+            # Budżet tokenów/kosztu sprawdzamy przed każdym wywołaniem modelu
+            budget_message = self.ledger.exceeded() if self.ledger is not None else None
+            if budget_message:
+                self.stop_reason = "budget"
+                self.hooks.on_event("budget", message=budget_message)
+                return None
+
+            self.hooks.on_event("iteration", index=i)
+            with span("iteration", index=i):
+                final_response = await self.step(messages)
+                await run_blocking(self.save_messages, messages)
+
+            if final_response:
+                self.stop_reason = "done"
+                self.hooks.on_event("done", text=final_response)
+                return final_response
+
+        self.stop_reason = "max_iters"
+        return None
+
+    async def step(self, messages):
+        """Jedna tura: model + ewentualne narzędzia. Zwraca tekst odpowiedzi, gdy model skończył."""
+        with span("context.build", messages=len(messages)):
+            contents = self.context.build(messages) if self.context else messages
+        self.hooks.on_event("context", sent=len(contents), total=len(messages))
+        if self.media.needs_resolve(contents):
+            contents = await run_blocking(self.media.resolve, contents)
+
+        # Narzędzia mogły się zmienić (refresh_tools), więc bierzemy aktualny zestaw
+        tool = get_available_tool()
+        if self.prompt_cache:
+            config = await run_blocking(self.prompt_cache.generation_config, system_prompt, tool)
+        else:
+            config = types.GenerateContentConfig(
+                tools=[tool],
+                system_instruction=system_prompt
+            )
+
+        with span("model.call", model=MODEL_NAME, stream=self.stream) as model_span:
+            if self.stream:
+                response = await astream_generate_content(
+                    self.client,
+                    model=MODEL_NAME,
+                    contents=contents,
+                    config=config,
+                    on_text=lambda text: self.hooks.on_event("text", text=text),
+                )
+            else:
+                response = await self.client.aio.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=contents,
+                    config=config,
+                )
+            tracing.current_tracer().record_usage(response.usage_metadata, model_span)
+        usage.record("model", MODEL_NAME, response.usage_metadata)
+
+        if not response.usage_metadata:
+            raise RuntimeError("Gemini API response appears to be malformed")
+        self.hooks.on_event("response", response=response)
+
+        if response.candidates:
+            for candidate in response.candidates:
+                if candidate.content:
+                    messages.append(candidate.content)
+
+        if not response.function_calls:
+            return response.text
+
+        function_responses, approved_calls = await self._gate(response.function_calls)
+        await self._execute(approved_calls, function_responses)
+
+        messages.append(types.Content(role="tool", parts=function_responses))
+        return None
+
+    def _reject(self, function_responses, index, func_name, kind, reason):
+        self.hooks.on_event("rejected", name=func_name, kind=kind, reason=reason)
+        function_responses[index] = types.Part.from_function_response(
+            name=func_name,
+            response={"error": reason}
+        )
+
+    def _static_review(self, code, file_path, baseline=None):
+        """Lokalny pre-reviewer (AST): werdykt dla oczywistych przypadków, None -> reviewer LLM."""
+        if not STATIC_REVIEW_ENABLED:
+            return None
+        with span("reviewer.static", file=file_path):
+            return pre_review(code, self.working_directory, file_path, baseline, STATIC_REVIEW_AUTO_APPROVE)
+
+    async def _gate(self, function_calls):
+        """Reviewer i zgody. Zwraca (miejsca na odpowiedzi, zatwierdzone wywołania z indeksami)."""
+        # Miejsca na odpowiedzi - kolejność musi odpowiadać kolejności function_calls
+        function_responses = [None] * len(function_calls)
+        approved_calls = []
+        # Treść plików po zatwierdzonych już zapisach/edycjach tej tury - kolejna edycja
+        # tego samego pliku jest liczona (i przeglądana) względem niej, a nie stanu z dysku
+        pending = {}
+
+        for index, function_call in enumerate(function_calls):
+            func_name = function_call.name
+            func_args = function_call.args or {}
+            file_path = func_args.get("file_path", "")
+            self.hooks.on_event("tool_call", name=func_name, args=func_args)
+
+            # Reviewer sprawdza tylko kod Pythona - pliki .txt, .json, .md przechodzą bez audytu
+            if func_name == "write_file" and file_path.endswith(".py"):
+                content = func_args.get("content", "")
+                is_approved, feedback = (
+                    self._static_review(content, file_path)
+                    or await self.hooks.review(func_name, file_path, "code", content)
+                )
+                self.hooks.on_event("review", name=func_name, file_path=file_path, approved=is_approved, feedback=feedback)
+                if not is_approved:
+                    self._reject(function_responses, index, func_name, "review",
+                                 f"Security Review Failed: {feedback}. Please fix the code and try again.")
+                    continue
+
+            # Edycja: reviewer (i użytkownik) widzą tylko diff ze zmianą, a nie cały plik
+            change = None
+            if func_name == "edit_file":
+                try:
+                    _, old_text, new_text = preview_edit(
+                        self.working_directory, file_path, func_args.get("edits"), func_args.get("diff"),
+                        old_text=pending.get(os.path.normpath(file_path)),
+                    )
+                except EditConflict as e:
+                    self._reject(function_responses, index, func_name, "conflict", f"Edit conflict: {e}. The file was not modified.")
+                    continue
+                change = change_diff(file_path, old_text, new_text)
+                self.hooks.on_event("diff", name=func_name, file_path=file_path, diff=change)
+
+                if file_path.endswith(".py") and change:
+                    is_approved, feedback = (
+                        self._static_review(new_text, file_path, baseline=old_text)
+                        or await self.hooks.review(func_name, file_path, "diff", change)
+                    )
+                    self.hooks.on_event("review", name=func_name, file_path=file_path, approved=is_approved, feedback=feedback)
+                    if not is_approved:
+                        self._reject(function_responses, index, func_name, "review",
+                                     f"Security Review Failed: {feedback}. Please fix the change and try again.")
+                        continue
+
+            if func_name in SENSITIVE_FUNCTIONS:
+                with span("approval.wait", tool=func_name):
+                    allowed = await self.hooks.approve(func_name, func_args, change)
+                if not allowed:
+                    self._reject(function_responses, index, func_name, "denied", "User denied execution of this function.")
+                    continue
+
+            if func_name == "write_file":
+                pending[os.path.normpath(file_path)] = func_args.get("content", "")
+            elif func_name == "edit_file":
+                pending[os.path.normpath(file_path)] = new_text
+                # Przy wykonaniu edit_file sprawdzi, że plik ma dokładnie tę treść, względem której
+                # zmiana została przejrzana - inaczej nic nie zapisze (uruchomi się to, co zatwierdzono)
+                function_call = types.FunctionCall(
+                    id=function_call.id, name=func_name,
+                    args={**func_args, "expected_sha256": content_hash(old_text)},
+                )
+            approved_calls.append((index, function_call))
+
+        return function_responses, approved_calls
+
+    async def _execute(self, approved_calls, function_responses):
+        """Narzędzia w puli wątków; niezależne (PARALLEL_SAFE) lecą równolegle."""
+        if not approved_calls:
+            return
+        loop = asyncio.get_running_loop()
+
+        def on_output(tool_name, stream, text):
+            # Wołane z wątku narzędzia - zdarzenie przekazujemy do wątku pętli (UI)
+            loop.call_soon_threadsafe(
+                functools.partial(self.hooks.on_event, "tool_output", name=tool_name, stream=stream, text=text)
+            )
+
+        results = await run_blocking(
+            call_functions,
+            [function_call for _, function_call in approved_calls],
+            self.verbose,
+            on_output,
+            self.working_directory,
+        )
+
+        for (index, function_call), result in zip(approved_calls, results):
+            if (
+                not result.parts
+                or not result.parts[0].function_response
+                or not result.parts[0].function_response.response
+            ):
+                raise RuntimeError(f"Empty function response for {function_call.name}")
+
+            self.hooks.on_event("tool_result", name=function_call.name, response=result.parts[0].function_response.response)
+            function_responses[index] = result.parts[0]
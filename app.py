@@ -1,20 +1,27 @@
 import streamlit as st # type: ignore[import]
+import asyncio
 import os
-import time
 from dotenv import load_dotenv # type: ignore[import]
 from google import genai
 from google.genai import types # type: ignore[import]
 from PIL import Image # type: ignore[import]
-import io
 import base64
 from streamlit_mic_recorder import mic_recorder # type: ignore[import]
 
 
 # Importujemy nasze moduły
-from call_function import available_functions_tool, call_function
-from prompts import system_prompt
-from reviewer import review_code
-from memory import load_memory, save_memory, clear_memory
+from agent_engine import AgentEngine, AgentHooks
+import artifacts
+from blob_store import BlobStore
+from media_preprocess import MediaPreprocessor, format_report
+from reviewer import verdict_cache
+from memory import load_memory, save_memory, clear_memory, load_usage, save_usage
+from config import PROMPT_CACHE_ENABLED, PYTHON_POOL_ENABLED, WORKING_DIR
+from context_manager import ContextManager
+from prompt_cache import PromptCache
+import interpreter_pool
+from tracing import tracer
+import usage
 
 # Konfiguracja strony
 st.set_page_config(page_title="AI Agent Workspace", page_icon="🤖", layout="wide")
@@ -23,32 +30,184 @@ st.set_page_config(page_title="AI Agent Workspace", page_icon="🤖", layout="wi
 load_dotenv()
 api_key = os.environ.get("GEMINI_API_KEY")
 
-# Funkcje wrażliwe wymagające zgody
-SENSITIVE_FUNCTIONS = ["write_file", "run_python_file"]
+
+class StreamlitHooks(AgentHooks):
+    """Zdarzenia silnika agenta -> elementy czatu (status, tekst na żywo, wyjście skryptów)."""
+
+    def __init__(self, message_placeholder, status_container):
+        self.message_placeholder = message_placeholder
+        self.status = status_container
+        self.streamed_text = []
+        self.live_box = None
+        self.live_output = ""
+
+    async def review(self, func_name, file_path, kind, payload):
+        what = "kod" if kind == "code" else "zmianę"
+        self.status.info(f"🔍 Reviewer sprawdza {what}: {file_path}")
+        return await super().review(func_name, file_path, kind, payload)
+
+    async def approve(self, func_name, func_args, change=None):
+        # UI nie pyta o zgodę - wrażliwa akcja jest tylko sygnalizowana
+        self.status.warning(f"⚠️ Wykonuję wrażliwą akcję: {func_name}...")
+        return True
+
+    def on_event(self, event, **data):
+        if event == "iteration":
+            self.streamed_text = []
+            self.status.write(f"🔄 Iteracja {data['index'] + 1}...")
+        elif event == "text":
+            # Tekst pojawia się w czacie kawałek po kawałku
+            self.streamed_text.append(data["text"])
+            self.message_placeholder.markdown("".join(self.streamed_text) + "▌")
+        elif event == "tool_call":
+            self.status.write(f"🛠️ Agent chce użyć: `{data['name']}`")
+        elif event == "diff":
+            self.status.code(data["diff"] or "(brak zmian)", language="diff")
+        elif event == "review":
+            what = "kod" if data["name"] == "write_file" else "zmianę"
+            if data["approved"]:
+                self.status.success(f"✅ Reviewer zatwierdził {what}.")
+            else:
+                self.status.error(f"❌ Reviewer odrzucił {what}: {data['feedback']}")
+        elif event == "rejected" and data["kind"] == "conflict":
+            self.status.error(f"❌ Edycja nie pasuje do pliku: {data['reason']}")
+        elif event == "tool_output":
+            # Wyjście uruchamianych skryptów na żywo (ostatnie ~2000 znaków)
+            if self.live_box is None:
+                self.live_box = self.status.empty()
+            self.live_output = (self.live_output + data["text"])[-2000:]
+            self.live_box.code(f"[{data['name']}] {self.live_output}")
+        elif event == "tool_result":
+            if self.live_box is not None:
+                self.live_box.empty()
+                self.live_box = None
+                self.live_output = ""
+            result_text = str(data["response"])[:200] + "..."
+            self.status.code(f"Wynik ({data['name']}): {result_text}")
+            for image_path in artifacts.response_images(data["response"], WORKING_DIR):
+                self.status.image(image_path, caption=os.path.basename(image_path), width=400)
+        elif event == "budget":
+            self.status.update(label="Przerwano - budżet", state="error", expanded=False)
+            st.warning(f"⛔ {data['message']}. Agent zatrzymany.")
+        elif event == "done":
+            self.status.update(label="Gotowe!", state="complete", expanded=False)
+            self.message_placeholder.markdown(data["text"])
+
+def message_blocks(msg):
+    """Co pokazać dla jednej wiadomości historii: lista (rola czatu, rodzaj, treść)."""
+    blocks = []
+    if msg.role in ("user", "model"):
+        # Obrazy i nagrania użytkownika z poprzednich tur pomijamy dla czytelności
+        text_content = "".join(part.text for part in msg.parts or [] if part.text)
+        if text_content:
+            blocks.append(("user" if msg.role == "user" else "assistant", "text", text_content))
+    elif msg.role == "tool":
+        for part in msg.parts or []:
+            if part.function_response and part.function_response.response:
+                for image_path in artifacts.response_images(part.function_response.response, WORKING_DIR):
+                    blocks.append(("assistant", "image", image_path))
+    return blocks
+
+
+def history_blocks(messages):
+    """Bloki kolejnych wiadomości z cache kluczowanego indeksem (ważny, dopóki wiadomość jest ta sama)."""
+    cache = st.session_state.render_cache
+    if len(cache) > len(messages):
+        cache.clear()
+    for index, msg in enumerate(messages):
+        cached = cache.get(index)
+        if cached is None or cached[0] is not msg:
+            cached = cache[index] = (msg, message_blocks(msg))
+        yield cached[1]
+
 
 # === INICJALIZACJA STANU (SESSION STATE) ===
+# Bajty obrazów i nagrań trzymamy w magazynie blobów, w historii są tylko referencje
+if "blob_store" not in st.session_state:
+    st.session_state.blob_store = BlobStore()
+
+# Zmniejszanie obrazów i nagrań przed wysłaniem (wyniki w magazynie blobów, cache po hashu)
+if "media_preprocessor" not in st.session_state:
+    st.session_state.media_preprocessor = MediaPreprocessor(st.session_state.blob_store)
+
 if "messages" not in st.session_state:
-    st.session_state.messages = load_memory()  # Ładujemy pamięć z pliku na start
+    # Ładujemy pamięć z pliku na start (bajty inline ze starszych sesji idą do magazynu)
+    st.session_state.messages = st.session_state.blob_store.externalize(load_memory())
+
+if "render_cache" not in st.session_state:
+    st.session_state.render_cache = {}
+
+if "context_manager" not in st.session_state:
+    st.session_state.context_manager = ContextManager()
 
 if "client" not in st.session_state:
     st.session_state.client = genai.Client(api_key=api_key)
+    # Rozgrzewamy workery run_python_file (pandas, matplotlib...) w tle
+    if PYTHON_POOL_ENABLED:
+        interpreter_pool.prewarm()
+
+if "prompt_cache" not in st.session_state:
+    st.session_state.prompt_cache = PromptCache(st.session_state.client)
+
+# Liczniki tokenów i kosztu (zapisywane razem z pamięcią sesji)
+if "usage_ledger" not in st.session_state:
+    st.session_state.usage_ledger = usage.UsageLedger()
+    st.session_state.usage_ledger.load_dict(load_usage())
+usage.activate(st.session_state.usage_ledger)
+
+# Spany są tanie (tylko pamięć), więc w UI zbieramy je zawsze - panel "Czasy" w pasku bocznym
+tracer.enable()
 
 # === UI: PASEK BOCZNY ===
 with st.sidebar:
     st.title("🔧 Panel Sterowania")
     if st.button("🧹 Wyczyść pamięć"):
         clear_memory()
+        st.session_state.blob_store.clear()
         st.session_state.messages = []
+        st.session_state.render_cache.clear()
+        st.session_state.context_manager.reset()
+        st.session_state.usage_ledger.reset()
         st.rerun()
     
     st.markdown("---")
     st.markdown("**Aktywne moduły:**")
     st.success("✅ Dynamic Loader")
     st.success("✅ Code Reviewer")
+    review_stats = verdict_cache.stats()
+    st.caption(f"Cache reviewera: {review_stats['hits']} trafień / {review_stats['misses']} pudeł ({review_stats['entries']} werdyktów)")
     st.success("✅ Long-term Memory")
     st.success("✅ Internet Access")
     st.success("✅ Docker Sandbox")
 
+    ledger = st.session_state.usage_ledger
+    session_totals = ledger.session["total"]
+    st.metric(
+        "🪙 Tokeny sesji",
+        f"{session_totals['prompt'] + session_totals['response']:,}",
+        help="Suma tokenów wszystkich wywołań modelu (agent + reviewer) w tej sesji",
+    )
+    st.caption(f"Koszt sesji: ${session_totals['cost']:.4f} | ostatnie zapytanie: ${ledger.request['total']['cost']:.4f}")
+    with st.expander("🧾 Zużycie tokenów (szczegóły)"):
+        st.code(ledger.report())
+
+    with st.expander("⏱️ Czasy (profil pętli)"):
+        profile_rows = tracer.summary()
+        if profile_rows:
+            st.dataframe(profile_rows, hide_index=True, use_container_width=True)
+            st.caption(
+                f"Tokeny: prompt {tracer.tokens['prompt']} | odpowiedź {tracer.tokens['response']} "
+                f"| z cache {tracer.tokens['cached']}"
+            )
+            st.download_button("📥 Metryki (Prometheus)", tracer.prometheus_text(), file_name="metrics.prom")
+            if st.button("💾 Zapisz trace (JSONL)"):
+                st.caption(f"Zapisano: {tracer.export_jsonl()}")
+        else:
+            st.caption("Brak pomiarów - wyślij pierwsze zapytanie.")
+
+    stream_enabled = st.toggle("⚡ Streaming odpowiedzi", value=True)
+    cache_enabled = st.toggle("🗄️ Cache promptu i narzędzi", value=PROMPT_CACHE_ENABLED)
+
     # --- OCZY AGENTA ---
     st.markdown("---")
     st.subheader("📸 Oczy Agenta")
@@ -68,11 +227,13 @@ with st.sidebar:
     st.markdown("---")
     st.subheader("🎤 Uszy Agenta")
 
-    # Komponent nagrywający
+    # Komponent nagrywający - WAV, bo tylko ten format media_preprocess umie przyciąć i przepróbkować
+    # (domyślnie komponent nagrywa webm)
     audio_input = mic_recorder(
         start_prompt="🔴 Nagraj",
         stop_prompt="⏹️ Stop",
         just_once=True,
+        format="wav",
         key='recorder'
     )
 
@@ -81,38 +242,18 @@ st.title("🤖 AI Super-Agent")
 st.caption("Powered by Gemini 2.5 Flash & Python")
 
 # Wyświetlanie historii czatu
-for msg in st.session_state.messages:
-    if msg.role == "user":
-        with st.chat_message("user"):
-            st.markdown(msg.parts[0].text)
-            # Jeśli użytkownik wysłał obrazek w poprzednich turach, tu byśmy musieli go odtworzyć,
-            # ale w tej prostej wersji pomijamy wyświetlanie starych obrazków usera dla czytelności.
-            
-    elif msg.role == "model":
-        text_content = ""
-        for part in msg.parts:
-            if part.text:
-                text_content += part.text
-        if text_content:
-            with st.chat_message("assistant"):
-                st.markdown(text_content)
-    
-    # === NOWOŚĆ: Wyświetlanie wykresów stworzonych przez Agenta ===
-    elif msg.role == "tool":
-        # Sprawdzamy, czy narzędzie zwróciło informację o stworzonym pliku graficznym
-        for part in msg.parts:
-            if part.function_response and part.function_response.response:
-                resp = str(part.function_response.response)
-                # Prosta heurystyka: jeśli odpowiedź zawiera ".png" lub ".jpg"
-                if ".png" in resp or ".jpg" in resp:
-                    import glob
-                    # Szukamy najnowszego pliku w workspace
-                    files = glob.glob("agent_workspace/*.png") + glob.glob("agent_workspace/*.jpg")
-                    if files:
-                        latest_file = max(files, key=os.path.getmtime)
-                        # Jeśli plik jest świeży (z tej sesji)
-                        with st.chat_message("assistant"):
-                            st.image(latest_file, caption="Wygenerowany plik", width=400)
+# Bloki do pokazania liczymy raz na wiadomość (cache po indeksie) - przy każdym
+# odświeżeniu Streamlit tylko je rysuje, bez analizowania starych tur od nowa
+for blocks in history_blocks(st.session_state.messages):
+    for role, kind, payload in blocks:
+        if kind == "image" and not os.path.exists(payload):
+            continue
+        with st.chat_message(role):
+            if kind == "text":
+                st.markdown(payload)
+            else:
+                # Wykres / obraz, który utworzyło konkretne wywołanie narzędzia (lista artifacts)
+                st.image(payload, caption=f"Wygenerowany plik: {os.path.basename(payload)}", width=400)
 
 # === LOGIKA AGENTA ===
 
@@ -130,6 +271,7 @@ elif audio_input:
 # Jeśli jest jakakolwiek akcja (Tekst lub Audio)
 if user_action:
     user_parts = []
+    media_reports = []
     
     # --- SCENARIUSZ A: TEKST ---
     if user_action == "text":
@@ -142,113 +284,65 @@ if user_action:
     elif user_action == "audio":
         # Wyciągamy bajty z nagrania
         audio_bytes = audio_input['bytes']
+        audio_mime = f"audio/{audio_input.get('format') or 'wav'}"
         
-        # Dodajemy plik audio dla modelu
-        user_parts.append(types.Part.from_bytes(data=audio_bytes, mime_type="audio/wav"))
+        # Dodajemy plik audio dla modelu (bez ciszy na brzegach, mono 16 kHz)
+        audio_part, report = st.session_state.media_preprocessor.part(audio_bytes, audio_mime)
+        user_parts.append(audio_part)
+        media_reports.append(report)
         # Dodajemy instrukcję pomocniczą
         user_parts.append(types.Part(text="Odsłuchaj to nagranie i wykonaj polecenie."))
         
         # Wyświetl odtwarzacz w czacie (żebyś widział, że wyszło)
         with st.chat_message("user"):
-            st.audio(audio_bytes, format="audio/wav")
+            st.audio(audio_bytes, format=audio_mime)
             st.caption("🎙️ Wiadomość głosowa")
 
     # --- WSPÓLNE: OBRAZ (Jeśli dodano w pasku bocznym) ---
     if image_input:
-        img_byte_arr = io.BytesIO()
-        image_input.save(img_byte_arr, format=image_input.format)
-        img_bytes = img_byte_arr.getvalue()
-        
-        user_parts.append(
-            types.Part.from_bytes(data=img_bytes, mime_type=f"image/{image_input.format.lower()}")
+        # Oryginalne bajty pliku - preprocessor sam pomniejsza i kompresuje
+        image_part, report = st.session_state.media_preprocessor.part(
+            uploaded_file.getvalue(), Image.MIME.get(image_input.format, "image/png")
         )
+        user_parts.append(image_part)
+        media_reports.append(report)
         # Pokaż obrazek w czacie
         with st.chat_message("user"):
             st.image(image_input, width=200)
 
+    # Ile bajtów i tokenów oszczędziło przygotowanie załączników
+    if any(media_reports):
+        with st.chat_message("user"):
+            st.caption(f"📉 {format_report(media_reports)}")
+
     # 3. Zapisz w historii
     st.session_state.messages.append(types.Content(role="user", parts=user_parts))
+    st.session_state.usage_ledger.start_request(prompt_text or "audio")
 
     # 4. Uruchom Agenta
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         status_container = st.status("Thinking...", expanded=True)
-        
-        current_messages = st.session_state.messages.copy()
-        MAX_ITERS = 20
-        
+
+        def save_session(messages):
+            save_memory(messages)
+            save_usage(st.session_state.usage_ledger.to_dict())
+
+        engine = AgentEngine(
+            st.session_state.client,
+            hooks=StreamlitHooks(message_placeholder, status_container),
+            stream=stream_enabled,
+            # Z historii do modelu idzie tylko okno mieszczące się w budżecie
+            context=st.session_state.context_manager,
+            prompt_cache=st.session_state.prompt_cache if cache_enabled else None,
+            ledger=st.session_state.usage_ledger,
+            save_messages=save_session,
+            verbose=True,
+        )
+
         try:
-            for i in range(MAX_ITERS):
-                status_container.write(f"🔄 Iteracja {i+1}...")
-                
-                # Wywołanie API Gemini
-                response = st.session_state.client.models.generate_content(
-                    model="gemini-2.5-flash", # Upewnij się, że masz tu dobry model (np. 2.0 Flash)
-                    contents=current_messages,
-                    config=types.GenerateContentConfig(
-                        tools=[available_functions_tool],
-                        system_instruction=system_prompt
-                    ),
-                )
-
-                # Dodajemy odpowiedź kandydata do historii (tymczasowej)
-                if response.candidates and response.candidates[0].content:
-                    current_messages.append(response.candidates[0].content)
-
-                # Sprawdzamy czy agent chce zakończyć (brak wywołań funkcji)
-                if not response.function_calls:
-                    status_container.update(label="Gotowe!", state="complete", expanded=False)
-                    message_placeholder.markdown(response.text)
-                    
-                    # Aktualizujemy główną pamięć sesji
-                    st.session_state.messages = current_messages
-                    save_memory(st.session_state.messages)
-                    break
-                
-                # Jeśli są funkcje do wykonania:
-                function_responses = []
-                
-                for function_call in response.function_calls:
-                    func_name = function_call.name
-                    func_args = function_call.args
-                    
-                    status_container.write(f"🛠️ Agent chce użyć: `{func_name}`")
-                    
-                    # --- REVIEWER ---
-                    if func_name == "write_file":
-                        file_path = func_args.get("file_path", "")
-                        if file_path.endswith(".py"):
-                            status_container.info(f"🔍 Reviewer sprawdza kod: {file_path}")
-                            content_to_review = func_args.get("content", "")
-                            is_approved, feedback = review_code(content_to_review)
-                            
-                            if not is_approved:
-                                status_container.error(f"❌ Reviewer odrzucił kod: {feedback}")
-                                rejection_part = types.Part.from_function_response(
-                                    name=func_name,
-                                    response={"error": f"Security Review Failed: {feedback}"}
-                                )
-                                function_responses.append(rejection_part)
-                                continue 
-                            else:
-                                status_container.success("✅ Reviewer zatwierdził kod.")
-
-                    # --- HUMAN APPROVAL (Symulacja) ---
-                    if func_name in SENSITIVE_FUNCTIONS:
-                            status_container.warning(f"⚠️ Wykonuję wrażliwą akcję: {func_name}...")
-                            time.sleep(1)
-
-                    # --- WYKONANIE ---
-                    result = call_function(function_call, verbose=True)
-                    
-                    # Wyświetl wynik w expanderze
-                    result_text = str(result.parts[0].function_response.response)[:200] + "..."
-                    status_container.code(f"Wynik: {result_text}")
-                    
-                    function_responses.append(result.parts[0])
-
-                # Dodajemy wyniki funkcji do historii
-                current_messages.append(types.Content(role="tool", parts=function_responses))
-                
+            asyncio.run(engine.run(st.session_state.messages))
+            if engine.stop_reason == "max_iters":
+                status_container.update(label="Limit iteracji", state="error", expanded=False)
         except Exception as e:
-            st.error(f"Błąd krytyczny: {e}")
\ No newline at end of file
+            st.error(f"Błąd krytyczny: {e}")
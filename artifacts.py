@@ -0,0 +1,63 @@
+"""
+Indeks artefaktów: które pliki utworzyło albo zmieniło konkretne wywołanie narzędzia.
+
+call_function robi migawkę workspace (ścieżka -> mtime_ns, rozmiar) przed i po
+narzędziu zapisującym pliki (call_function.ARTIFACT_TOOLS) i dopisuje do odpowiedzi
+funkcji listę "artifacts".
+Historia sama pamięta więc, który wykres powstał w której turze - UI nie musi
+przeszukiwać workspace przy każdym odświeżeniu.
+"""
+import os
+import re
+
+from functions.task_manager import TASKS_DB
+from memory import MEMORY_FILE, JOURNAL_FILE, USAGE_FILE
+from workspace_index import walk_files
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+# Pliki stanu agenta zmieniają się przy każdej turze - to nie są wyniki pracy
+INTERNAL_FILES = {
+    TASKS_DB, TASKS_DB + "-wal", TASKS_DB + "-shm", TASKS_DB + "-journal",
+    os.path.basename(MEMORY_FILE), os.path.basename(JOURNAL_FILE), os.path.basename(USAGE_FILE),
+}
+# Starsze wiadomości nie mają listy artifacts - szukamy wtedy ścieżek obrazów w treści wyniku
+_IMAGE_PATH_PATTERN = re.compile(r"[\w./-]+\.(?:png|jpe?g|gif|webp)\b", re.IGNORECASE)
+
+
+def snapshot(root):
+    """Stan plików workspace: ścieżka względna -> (mtime_ns, rozmiar)."""
+    state = {}
+    for rel_path, entry in walk_files(root):
+        if rel_path in INTERNAL_FILES:
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        state[rel_path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def changed_files(before, after):
+    """Pliki nowe albo zmienione między dwiema migawkami."""
+    return sorted(rel_path for rel_path, signature in after.items() if before.get(rel_path) != signature)
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def response_images(response, root):
+    """Obrazy z odpowiedzi narzędzia (ścieżki bezwzględne, tylko istniejące pliki)."""
+    if "artifacts" in response:
+        candidates = [path for path in response["artifacts"] if is_image(path)]
+    else:
+        candidates = _IMAGE_PATH_PATTERN.findall(str(response.get("result", "")))
+
+    abs_root = os.path.abspath(root)
+    images = []
+    for rel_path in dict.fromkeys(candidates):
+        abs_path = os.path.abspath(os.path.join(abs_root, rel_path))
+        if os.path.commonpath([abs_root, abs_path]) == abs_root and os.path.isfile(abs_path):
+            images.append(abs_path)
+    return images
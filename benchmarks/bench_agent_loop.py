@@ -0,0 +1,319 @@
+"""
+Offline benchmark pętli agenta (AgentEngine.step) z fałszywym klientem Gemini.
+
+Odtwarza nagrane transkrypty (benchmarks/transcripts/*.json) wiele razy pod rząd,
+na rosnącej historii, i mierzy, ile czasu zjada sam harness:
+  - context.build   - wybór okna historii wysyłanego do modelu
+  - model (fake)    - fałszywy klient (budowa obiektów odpowiedzi, prawie zero)
+  - reviewer        - review_code / review_diff (fałszywy reviewer + cache werdyktów)
+  - tools           - call_functions (w tym prawdziwe narzędzia i run_python_file)
+  - save_memory     - zapis sesji (dziennik + snapshoty)
+  - refresh_tools   - skan rejestru narzędzi przed turą
+  - harness (reszta) - wszystko inne w step(): types.Content, pętla zgód, executor itd.
+
+Wszystko działa w katalogu tymczasowym - prawdziwy agent_workspace, pamięć sesji
+i cache werdyktów nie są dotykane.
+
+Użycie:
+    python benchmarks/bench_agent_loop.py [--requests 50] [--history 2000] [--stream]
+                                          [--tracemalloc] [--json wynik.json] [--max-harness-ms 5]
+--max-harness-ms kończy się kodem 1, gdy mediana narzutu harnessu na iterację przekroczy próg.
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import glob
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import config  # noqa: E402
+
+# Workspace podmieniamy przed importem call_function (też pośrednio przez agent_engine):
+# rejestr narzędzi skanuje go i zapisuje manifest już przy imporcie (manifest też przenosimy)
+SCRATCH_DIR = tempfile.mkdtemp(prefix="agent-bench-")
+config.WORKING_DIR = SCRATCH_DIR
+config.TOOL_MANIFEST_FILE = os.path.join(SCRATCH_DIR, "tool_manifest.json")
+atexit.register(shutil.rmtree, SCRATCH_DIR, True)
+
+from google.genai import types  # type: ignore[import]  # noqa: E402
+
+import agent_engine  # noqa: E402
+import call_function  # noqa: E402
+import interpreter_pool  # noqa: E402
+import memory  # noqa: E402
+import reviewer  # noqa: E402
+from context_manager import ContextManager  # noqa: E402
+from fake_genai import FakeClient, FakeReviewerClient, load_transcript  # noqa: E402
+from review_cache import VerdictCache  # noqa: E402
+
+TRANSCRIPTS_DIR = os.path.join(BENCH_DIR, "transcripts")
+PHASES = ["context.build", "model (fake)", "reviewer", "tools", "save_memory", "refresh_tools", "harness (reszta)"]
+# Fazy mierzone wewnątrz AgentEngine.step - reszta czasu to narzut harnessu
+INNER_PHASES = ["context.build", "model (fake)", "reviewer", "tools", "save_memory"]
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.samples = {phase: [] for phase in PHASES}
+        self._current = None
+
+    def begin_iteration(self):
+        self._current = {phase: 0.0 for phase in PHASES}
+
+    def add(self, phase, seconds):
+        if self._current is not None:
+            self._current[phase] += seconds
+
+    def end_iteration(self, total):
+        inner = sum(self._current[phase] for phase in INNER_PHASES)
+        self._current["harness (reszta)"] = max(0.0, total - inner)
+        for phase, seconds in self._current.items():
+            self.samples[phase].append(seconds * 1000)
+        self._current = None
+
+    def wrap(self, phase, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, phase, func):
+        """Jak wrap, ale dla korutyn (client.aio) - liczy czas do zwrócenia wyniku."""
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        return timed
+
+
+def isolate(workdir):
+    """Przekierowuje workspace, pamięć sesji i cache werdyktów do katalogu tymczasowego."""
+    call_function.WORKING_DIR = workdir
+    call_function.TOOL_MANIFEST_FILE = os.path.join(workdir, ".tool_manifest.json")
+    memory._journal = memory.SessionJournal(
+        os.path.join(workdir, ".bench_session.pkl"), os.path.join(workdir, ".bench_session.journal")
+    )
+    reviewer.verdict_cache = VerdictCache(path=os.path.join(workdir, ".bench_review_cache.json"))
+    reviewer._client = FakeReviewerClient()
+
+
+# Funkcje w agent_engine podmieniane na wersje z pomiarem (przywracane po każdym transkrypcie)
+TIMED_ENGINE_FUNCTIONS = {
+    "call_functions": "tools",
+    "review_code": "reviewer",
+    "review_diff": "reviewer",
+}
+
+
+def install_timers(timer, client, context):
+    """Zwraca oryginalne funkcje z agent_engine, żeby można je było przywrócić."""
+    originals = {name: getattr(agent_engine, name) for name in TIMED_ENGINE_FUNCTIONS}
+    for name, phase in TIMED_ENGINE_FUNCTIONS.items():
+        setattr(agent_engine, name, timer.wrap(phase, originals[name]))
+    client.aio.models.generate_content = timer.wrap_async("model (fake)", client.aio.models.generate_content)
+    client.aio.models.generate_content_stream = timer.wrap_async("model (fake)", client.aio.models.generate_content_stream)
+    context.build = timer.wrap("context.build", context.build)
+    return originals
+
+
+def write_files(workdir, files):
+    for rel_path, content in files.items():
+        path = os.path.join(workdir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def synthetic_history(count):
+    """Długa historia: tury użytkownika, wywołania narzędzi i spore odpowiedzi narzędzi."""
+    messages = []
+    for i in range(count // 4):
+        messages.append(types.Content(role="user", parts=[types.Part(text=f"Wcześniejsze zadanie {i}: " + "opis " * 40)]))
+        messages.append(types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(
+            name="get_file_content", args={"file_path": f"data/file_{i}.txt"}))]))
+        messages.append(types.Content(role="tool", parts=[types.Part.from_function_response(
+            name="get_file_content", response={"result": f"zawartość pliku {i}\n" * 200})]))
+        messages.append(types.Content(role="model", parts=[types.Part(text=f"Gotowe: zadanie {i}. " + "wynik " * 30)]))
+    return messages
+
+
+def run_benchmark(transcript, requests, history, stream, latency):
+    workdir = tempfile.mkdtemp(prefix="agent-bench-")
+    originals = {}
+    try:
+        isolate(workdir)
+        write_files(workdir, transcript["files"])
+        # Rozgrzewka poza pomiarem: rejestr narzędzi i pula interpreterów
+        call_function.refresh_tools()
+        if config.PYTHON_POOL_ENABLED:
+            interpreter_pool.prewarm()
+
+        client = FakeClient(transcript["turns"], latency=latency)
+        context = ContextManager()
+        timer = PhaseTimer()
+        originals = install_timers(timer, client, context)
+
+        messages = synthetic_history(history)
+        memory.save_memory(messages)
+        save_memory = timer.wrap("save_memory", memory.save_memory)
+        # Domyślne hooki: reviewer z reviewer.py, zgoda na wszystko
+        engine = agent_engine.AgentEngine(client, stream=stream, context=context, working_directory=workdir)
+
+        async def replay():
+            iterations = 0
+            failures = 0
+            for _ in range(requests):
+                write_files(workdir, transcript["files"])
+                client.models.rewind()
+                messages.append(types.Content(role="user", parts=[types.Part(text=transcript["prompt"])]))
+
+                for _ in range(config.MAX_ITERS):
+                    timer.begin_iteration()
+                    start = time.perf_counter()
+                    call_function.refresh_tools()
+                    timer.add("refresh_tools", time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    try:
+                        final = await engine.step(messages)
+                        await agent_engine.run_blocking(save_memory, messages)
+                    except Exception:
+                        failures += 1
+                        final = "error"
+                    # refresh_tools nie wchodzi do step() - liczymy go osobno
+                    timer.end_iteration(time.perf_counter() - start)
+                    iterations += 1
+                    if final:
+                        break
+            return iterations, failures
+
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            iterations, failures = asyncio.run(replay())
+        wall = time.perf_counter() - started
+
+        session_bytes = sum(
+            os.path.getsize(path) for path in (memory._journal.snapshot_path, memory._journal.journal_path)
+            if os.path.exists(path)
+        )
+        return {
+            "transcript": transcript["name"],
+            "requests": requests,
+            "iterations": iterations,
+            "failures": failures,
+            "messages": len(messages),
+            "wall_s": wall,
+            "session_bytes": session_bytes,
+            "model_calls": client.models.calls,
+            "reviewer_calls": reviewer._client.calls,
+            "phases": timer.samples,
+        }
+    finally:
+        for name, func in originals.items():
+            setattr(agent_engine, name, func)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "total_ms": sum(ordered),
+        "median_ms": statistics.median(ordered),
+        "p95_ms": p95,
+        "max_ms": ordered[-1],
+    }
+
+
+def report(result):
+    print(f"\n=== {result['transcript']} ===")
+    print(
+        f"{result['requests']} zapytań, {result['iterations']} iteracji, {result['messages']} wiadomości w historii, "
+        f"{result['failures']} błędów, {result['wall_s']:.2f} s"
+    )
+    print(f"{'faza':<18} {'suma ms':>10} {'mediana':>10} {'p95':>10} {'max':>10}")
+    for phase in PHASES:
+        stats = summarize(result["phases"][phase])
+        print(
+            f"{phase:<18} {stats['total_ms']:10.1f} {stats['median_ms']:10.3f} "
+            f"{stats['p95_ms']:10.3f} {stats['max_ms']:10.3f}"
+        )
+    print(f"Sesja na dysku: {result['session_bytes'] / 1024:.0f} KiB | wywołania modelu: {result['model_calls']} "
+          f"| reviewer (poza cache): {result['reviewer_calls']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline agent loop benchmark")
+    parser.add_argument("--transcript", action="append", help="Transcript JSON (default: all in benchmarks/transcripts)")
+    parser.add_argument("--requests", type=int, default=50, help="How many times each transcript is replayed")
+    parser.add_argument("--history", type=int, default=0, help="Synthetic messages preloaded into the history")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming code path")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated model latency in seconds")
+    parser.add_argument("--tracemalloc", action="store_true", help="Track Python allocations (slows the run)")
+    parser.add_argument("--json", help="Write raw results to this file")
+    parser.add_argument("--max-harness-ms", type=float, default=None,
+                        help="Fail if the median harness overhead per iteration exceeds this")
+    args = parser.parse_args()
+
+    paths = args.transcript or sorted(glob.glob(os.path.join(TRANSCRIPTS_DIR, "*.json")))
+    results = []
+    for path in paths:
+        transcript = load_transcript(path)
+        if args.tracemalloc:
+            tracemalloc.start()
+        result = run_benchmark(transcript, args.requests, args.history, args.stream, args.latency)
+        if args.tracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("filename")[:5]
+            tracemalloc.stop()
+            result["tracemalloc"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_files": [[str(stat.traceback[0].filename), stat.size] for stat in top],
+            }
+        results.append(result)
+        report(result)
+        if "tracemalloc" in result:
+            traced = result["tracemalloc"]
+            print(f"tracemalloc: teraz {traced['current_bytes'] / 2**20:.1f} MiB, szczyt {traced['peak_bytes'] / 2**20:.1f} MiB")
+            for filename, size in traced["top_files"]:
+                print(f"  {size / 2**20:8.2f} MiB  {os.path.relpath(filename, PROJECT_ROOT)}")
+
+    # ru_maxrss: KiB na Linuksie, bajty na macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mib = max_rss / 2**20 if sys.platform == "darwin" else max_rss / 1024
+    print(f"\nMaks. RSS procesu: {max_rss_mib:.0f} MiB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "max_rss_mib": max_rss_mib}, f, indent=2)
+
+    if args.max_harness_ms is not None:
+        worst = max(statistics.median(r["phases"]["harness (reszta)"]) for r in results)
+        if worst > args.max_harness_ms:
+            print(f"❌ Narzut harnessu {worst:.2f} ms/iterację > {args.max_harness_ms} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
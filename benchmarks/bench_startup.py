@@ -0,0 +1,86 @@
+"""
+Benchmark startu CLI.
+
+Mierzy (w osobnych procesach, żeby każdy pomiar był zimnym startem):
+  - import main          - to, co płaci każde `python main.py "..."` przed pierwszym zapytaniem
+  - import call_function - sam rejestr narzędzi
+oraz w jednym procesie: refresh_tools() od zera vs z manifestu.
+
+Użycie:
+    python benchmarks/bench_startup.py [--runs 10] [--max-ms 1500]
+--max-ms kończy się kodem 1, gdy mediana `import main` przekroczy próg (np. w CI).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def time_import(module, runs):
+    env = dict(os.environ)
+    # Klucz jest potrzebny tylko przy pierwszym zapytaniu - start nie może go wymagać
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+            cwd=PROJECT_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]) * 1000)
+    return samples
+
+
+def time_refresh(runs):
+    import call_function
+
+    cold, from_manifest = [], []
+    for _ in range(runs):
+        call_function._file_index.clear()
+        t = time.perf_counter()
+        call_function.refresh_tools()
+        cold.append((time.perf_counter() - t) * 1000)
+
+        call_function._file_index.clear()
+        t = time.perf_counter()
+        call_function._load_manifest()
+        call_function.refresh_tools()
+        from_manifest.append((time.perf_counter() - t) * 1000)
+    return cold, from_manifest
+
+
+def report(label, samples):
+    print(f"{label:<34} median {statistics.median(samples):8.1f} ms   min {min(samples):8.1f} ms   max {max(samples):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Number of runs per measurement")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if median `import main` exceeds this")
+    args = parser.parse_args()
+
+    main_samples = time_import("main", args.runs)
+    report("import main", main_samples)
+    report("import call_function", time_import("call_function", args.runs))
+
+    cold, from_manifest = time_refresh(args.runs)
+    report("refresh_tools() od zera", cold)
+    report("refresh_tools() z manifestu", from_manifest)
+
+    if args.max_ms is not None and statistics.median(main_samples) > args.max_ms:
+        print(f"❌ Start wolniejszy niż {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Skryptowy zamiennik genai.Client do benchmarków (bez sieci i bez klucza API).
+
+Odtwarza nagrany transkrypt: kolejne wywołania generate_content / generate_content_stream
+(również przez client.aio.models) zwracają kolejne tury z pliku JSON. Odpowiedzi to
+prawdziwe obiekty google.genai.types, więc pętla agenta przechodzi dokładnie tę samą ścieżkę co z prawdziwym API.
+
+Format transkryptu (benchmarks/transcripts/*.json):
+    {
+      "name": "...",
+      "prompt": "pierwsza wiadomość użytkownika",
+      "files": {"ścieżka/w/workspace": "zawartość", ...},   # odtwarzane przed każdym powtórzeniem
+      "turns": [
+        {"function_calls": [{"name": "get_files_info", "args": {...}}, ...]},
+        {"text": "odpowiedź końcowa"}
+      ]
+    }
+Tura może mieć też "usage": {"prompt": N, "response": M}; domyślnie prompt jest
+szacowany z długości wysłanej historii.
+
+FakeClient(..., stateless=True) wybiera turę z samej historii (liczba odpowiedzi
+modelu od ostatniej wiadomości użytkownika), więc jeden klient może obsługiwać
+wiele równoległych sesji - tak jak prawdziwy.
+"""
+import asyncio
+import json
+import time
+
+from google.genai import types  # type: ignore[import]
+
+# Tyle kawałków dostaje tekst w trybie streamingu
+STREAM_CHUNKS = 4
+
+
+def load_transcript(path):
+    with open(path, "r", encoding="utf-8") as f:
+        transcript = json.load(f)
+    if not transcript.get("turns"):
+        raise ValueError(f"Transcript {path} has no turns")
+    if "text" not in transcript["turns"][-1]:
+        raise ValueError(f"Transcript {path} must end with a text turn")
+    return transcript
+
+
+def _estimate_prompt_tokens(contents):
+    chars = 0
+    for content in contents or []:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            elif part.function_response is not None:
+                chars += len(str(part.function_response.response))
+            elif part.function_call is not None:
+                chars += len(str(part.function_call.args))
+    return chars // 4
+
+
+def _turn_from_history(contents):
+    """Ile tur modelu minęło od ostatniej wiadomości użytkownika (z tekstem, nie wynikiem narzędzia)."""
+    turn = 0
+    for content in reversed(contents or []):
+        if content.role == "user" and any(part.text for part in content.parts or []):
+            break
+        if content.role == "model":
+            turn += 1
+    return turn
+
+
+def build_response(turn, prompt_tokens, text=None):
+    """Tura transkryptu -> types.GenerateContentResponse."""
+    if "function_calls" in turn:
+        parts = [
+            types.Part(function_call=types.FunctionCall(name=call["name"], args=call.get("args", {})))
+            for call in turn["function_calls"]
+        ]
+    else:
+        parts = [types.Part(text=turn["text"] if text is None else text)]
+
+    usage = turn.get("usage", {})
+    response_tokens = usage.get("response", sum(len(str(p.function_call.args if p.function_call else p.text)) for p in parts) // 4)
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=parts),
+                finish_reason=types.FinishReason.STOP,
+            )
+        ],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=usage.get("prompt", prompt_tokens),
+            candidates_token_count=response_tokens,
+            total_token_count=usage.get("prompt", prompt_tokens) + response_tokens,
+        ),
+    )
+
+
+class FakeModels:
+    def __init__(self, turns, latency=0.0, stateless=False):
+        self.turns = turns
+        self.latency = latency
+        self.stateless = stateless
+        self.calls = 0
+        self._position = 0
+
+    def _next_turn(self, contents, latency=True):
+        if self.stateless:
+            turn = self.turns[min(_turn_from_history(contents), len(self.turns) - 1)]
+        else:
+            turn = self.turns[self._position % len(self.turns)]
+            self._position += 1
+        self.calls += 1
+        if latency and self.latency:
+            time.sleep(self.latency)
+        return turn
+
+    def rewind(self):
+        """Następne wywołanie zacznie transkrypt od początku."""
+        self._position = 0
+
+    def generate_content(self, model, contents, config=None, latency=True):
+        return build_response(self._next_turn(contents, latency), _estimate_prompt_tokens(contents))
+
+    def generate_content_stream(self, model, contents, config=None, latency=True):
+        turn = self._next_turn(contents, latency)
+        prompt_tokens = _estimate_prompt_tokens(contents)
+        if "text" not in turn:
+            yield build_response(turn, prompt_tokens)
+            return
+        text = turn["text"]
+        step = max(1, -(-len(text) // STREAM_CHUNKS))
+        for start in range(0, len(text), step):
+            yield build_response(turn, prompt_tokens, text=text[start:start + step])
+
+
+class FakeAsyncModels:
+    """Odpowiednik client.aio.models - te same tury co wersja synchroniczna."""
+
+    def __init__(self, models):
+        self._models = models
+
+    async def generate_content(self, model, contents, config=None):
+        if self._models.latency:
+            await asyncio.sleep(self._models.latency)
+        return self._models.generate_content(model, contents, config, latency=False)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        if self._models.latency:
+            await asyncio.sleep(self._models.latency)
+        # Kawałki powstają od razu - czas ich budowy liczy się do samego wywołania
+        chunks = list(self._models.generate_content_stream(model, contents, config, latency=False))
+
+        async def iterate():
+            for chunk in chunks:
+                yield chunk
+
+        return iterate()
+
+
+class FakeAio:
+    def __init__(self, models):
+        self.models = FakeAsyncModels(models)
+
+
+class FakeClient:
+    """Minimalny interfejs genai.Client używany przez pętlę agenta."""
+
+    def __init__(self, turns, latency=0.0, stateless=False):
+        self.models = FakeModels(turns, latency, stateless)
+        self.aio = FakeAio(self.models)
+
+
+class FakeReviewerClient:
+    """Reviewer, który zatwierdza każdy kod (werdykt w tym samym formacie co model)."""
+
+    def __init__(self, verdict="APPROVED"):
+        self.models = self
+        self.verdict = verdict
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=self.verdict)]))]
+        )
@@ -0,0 +1,206 @@
+"""
+Lokalny test obciążenia trybu usługi (service.py) z fałszywym klientem Gemini.
+
+Dla rosnącej liczby równoległych sesji każda sesja wysyła po kolei --requests
+zapytań odtwarzających transkrypt (benchmarks/transcripts/*.json) we własnym
+workspace. Mierzymy przepustowość (zapytania/s) i opóźnienie zapytania (p50/p95),
+a na końcu sprawdzamy izolację: każda sesja ma własną historię, tasks.db i pliki.
+
+Fałszywy model czeka --latency sekund na turę (asyncio.sleep), więc przy jednej
+pętli zdarzeń przepustowość powinna rosnąć z liczbą sesji, dopóki nie zacznie
+ograniczać jej praca narzędzi w puli wątków.
+
+Użycie:
+    python benchmarks/load_test_service.py [--sessions 1,2,4,8,16] [--requests 5]
+                                           [--latency 0.2] [--http] [--json wynik.json]
+--http puszcza zapytania przez prawdziwy serwer HTTP (wątki klienta + urllib).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import call_function  # noqa: E402
+import config  # noqa: E402
+import interpreter_pool  # noqa: E402
+import memory  # noqa: E402
+import reviewer  # noqa: E402
+import service  # noqa: E402
+from bench_agent_loop import write_files  # noqa: E402
+from fake_genai import FakeClient, FakeReviewerClient, load_transcript  # noqa: E402
+from functions.task_manager import list_tasks  # noqa: E402
+from review_cache import VerdictCache  # noqa: E402
+
+DEFAULT_TRANSCRIPT = os.path.join(BENCH_DIR, "transcripts", "explore_and_edit.json")
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_in_process(agent_service, session_ids, transcript, requests):
+    """Każda sesja to osobne zadanie asyncio wysyłające zapytania jedno po drugim."""
+    latencies = []
+
+    async def client(session_id):
+        workspace = service.session_workspace(agent_service.root, session_id)
+        for _ in range(requests):
+            write_files(workspace, transcript["files"])
+            start = time.perf_counter()
+            result = await agent_service.send(session_id, transcript["prompt"])
+            latencies.append(time.perf_counter() - start)
+            if result["stop_reason"] != "done":
+                raise RuntimeError(f"Session {session_id} stopped: {result['stop_reason']}")
+
+    await asyncio.gather(*(client(session_id) for session_id in session_ids))
+    return latencies
+
+
+def run_over_http(base_url, root, session_ids, transcript, requests):
+    """Każda sesja to osobny wątek klienta HTTP."""
+    latencies = []
+    errors = []
+
+    def client(session_id):
+        workspace = service.session_workspace(root, session_id)
+        body = json.dumps({"prompt": transcript["prompt"]}).encode("utf-8")
+        try:
+            for _ in range(requests):
+                write_files(workspace, transcript["files"])
+                request = urllib.request.Request(
+                    f"{base_url}/sessions/{session_id}/messages", data=body,
+                    headers={"Content-Type": "application/json"}, method="POST",
+                )
+                start = time.perf_counter()
+                with urllib.request.urlopen(request, timeout=300) as response:
+                    result = json.loads(response.read())
+                latencies.append(time.perf_counter() - start)
+                if result["stop_reason"] != "done":
+                    raise RuntimeError(f"Session {session_id} stopped: {result['stop_reason']}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=client, args=(session_id,)) for session_id in session_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return latencies
+
+
+def check_isolation(root, session_ids, transcript, requests):
+    """Każda sesja: własna historia (requests zapytań), własne zadania i pliki."""
+    for session_id in session_ids:
+        workspace = service.session_workspace(root, session_id)
+        messages = memory.load_memory(memory.session_journal(service.session_state_dir(root, session_id)))
+        prompts = [m for m in messages if m.role == "user" and any(p.text for p in m.parts or [])]
+        if len(prompts) != requests:
+            raise AssertionError(f"Session {session_id}: {len(prompts)} prompts in history, expected {requests}")
+        if "Current Plan" not in list_tasks(workspace):
+            raise AssertionError(f"Session {session_id}: task store is empty")
+        for rel_path in transcript["files"]:
+            if not os.path.exists(os.path.join(workspace, rel_path)):
+                raise AssertionError(f"Session {session_id}: missing {rel_path}")
+
+
+def run_level(sessions, transcript, requests, latency, use_http):
+    root = tempfile.mkdtemp(prefix="agent-load-")
+    loop = service.start_loop()
+    server = None
+    try:
+        client = FakeClient(transcript["turns"], latency=latency, stateless=True)
+        agent_service = service.AgentService(client, root=root, auto_approve=True)
+        session_ids = [agent_service.create_session() for _ in range(sessions)]
+
+        started = time.perf_counter()
+        if use_http:
+            server = service.serve(agent_service, loop, "127.0.0.1", 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            latencies = run_over_http(base_url, root, session_ids, transcript, requests)
+        else:
+            future = asyncio.run_coroutine_threadsafe(
+                run_in_process(agent_service, session_ids, transcript, requests), loop
+            )
+            latencies = future.result()
+        wall = time.perf_counter() - started
+
+        check_isolation(root, session_ids, transcript, requests)
+        return {
+            "sessions": sessions,
+            "requests": len(latencies),
+            "wall_s": wall,
+            "throughput_rps": len(latencies) / wall,
+            "p50_s": statistics.median(latencies),
+            "p95_s": percentile(latencies, 0.95),
+            "model_calls": client.models.calls,
+            "failed": agent_service.stats["failed"],
+        }
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        loop.call_soon_threadsafe(loop.stop)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load test for the headless agent service")
+    parser.add_argument("--transcript", default=DEFAULT_TRANSCRIPT, help="Transcript JSON to replay")
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="Comma-separated concurrent session counts")
+    parser.add_argument("--requests", type=int, default=5, help="Requests sent by each session")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated model latency per turn in seconds")
+    parser.add_argument("--http", action="store_true", help="Go through the HTTP server instead of in-process calls")
+    parser.add_argument("--json", help="Write raw results to this file")
+    args = parser.parse_args()
+
+    transcript = load_transcript(args.transcript)
+    # Reviewer i jego cache poza prawdziwym workspace; rejestr narzędzi i pula - wspólne, rozgrzane
+    scratch = tempfile.mkdtemp(prefix="agent-load-cache-")
+    reviewer.verdict_cache = VerdictCache(path=os.path.join(scratch, ".review_cache.json"))
+    reviewer._client = FakeReviewerClient()
+    call_function.refresh_tools()
+    if config.PYTHON_POOL_ENABLED:
+        interpreter_pool.prewarm()
+
+    results = []
+    print(f"{'sesje':>6} {'zapytania':>10} {'czas s':>8} {'zap./s':>8} {'p50 s':>8} {'p95 s':>8}")
+    try:
+        for sessions in (int(value) for value in args.sessions.split(",")):
+            # Logi narzędzi i reviewera z wszystkich wątków idą w próżnię - zostaje sama tabela
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = run_level(sessions, transcript, args.requests, args.latency, args.http)
+            results.append(result)
+            print(
+                f"{result['sessions']:>6} {result['requests']:>10} {result['wall_s']:>8.2f} "
+                f"{result['throughput_rps']:>8.2f} {result['p50_s']:>8.3f} {result['p95_s']:>8.3f}"
+            )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print("✅ Izolacja sesji: każda ma własną historię, tasks.db i pliki")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
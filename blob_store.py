@@ -0,0 +1,197 @@
+"""
+Magazyn blobów adresowanych treścią (sha256) dla obrazów i nagrań w historii.
+
+Historia nie trzyma bajtów - tylko referencję:
+    types.Part(file_data=types.FileData(file_uri="blob://sha256/<hash>", mime_type=...))
+Ten sam plik wysłany kilka razy to jeden blob w <workspace>/.blobs/<ab>/<hash>,
+a pamięć sesji (pickle) zapisuje kilkadziesiąt bajtów zamiast megabajtów.
+
+MediaResolver zamienia referencje na coś, co zrozumie model, dopiero przed
+wywołaniem modelu:
+  - bieżąca tura użytkownika -> bajty wczytane z dysku (inline_data)
+  - starsze tury -> wg MEDIA_HISTORY_POLICY:
+      "drop"   - krótka notka tekstowa zamiast załącznika
+      "upload" - jednorazowy upload przez client.files (URI zapamiętany do wygaśnięcia)
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from google.genai import types  # type: ignore[import]
+
+from config import WORKING_DIR, BLOB_DIR, MEDIA_HISTORY_POLICY, FILE_UPLOAD_TTL
+from context_manager import is_user_turn
+
+BLOB_URI_PREFIX = "blob://sha256/"
+UPLOADS_FILE = "uploads.json"
+# Tyle wczytanych załączników bieżącej tury trzymamy w pamięci między iteracjami
+INLINE_CACHE_SIZE = 8
+
+
+def blob_digest(part):
+    """Hash bloba, jeśli część jest referencją do magazynu, w przeciwnym razie None."""
+    file_data = part.file_data
+    if file_data and file_data.file_uri and file_data.file_uri.startswith(BLOB_URI_PREFIX):
+        return file_data.file_uri[len(BLOB_URI_PREFIX):]
+    return None
+
+
+class BlobStore:
+    def __init__(self, root=os.path.join(WORKING_DIR, BLOB_DIR)):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """Zapisuje bajty (jeśli ich jeszcze nie ma) i zwraca ich hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        with open(self._path(digest), "rb") as f:
+            return f.read()
+
+    def size(self, digest):
+        try:
+            return os.path.getsize(self._path(digest))
+        except OSError:
+            return 0
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def part(self, data, mime_type):
+        """types.Part z referencją zamiast bajtów - to trafia do historii."""
+        return self.ref_part(self.put(data), mime_type)
+
+    @staticmethod
+    def ref_part(digest, mime_type):
+        return types.Part(file_data=types.FileData(file_uri=BLOB_URI_PREFIX + digest, mime_type=mime_type))
+
+    def externalize(self, messages):
+        """
+        Zamienia bajty inline w historii (stare sesje) na referencje.
+        Wiadomości bez bajtów zostają tymi samymi obiektami.
+        """
+        result = []
+        for content in messages:
+            if not any(part.inline_data and part.inline_data.data for part in content.parts or []):
+                result.append(content)
+                continue
+            parts = [
+                self.part(part.inline_data.data, part.inline_data.mime_type)
+                if part.inline_data and part.inline_data.data else part
+                for part in content.parts
+            ]
+            result.append(types.Content(role=content.role, parts=parts))
+        return result
+
+    # === UPLOADY (Files API) ===
+
+    def _load_uploads(self):
+        try:
+            with open(os.path.join(self.root, UPLOADS_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def uploaded_uri(self, client, digest, mime_type):
+        """URI pliku w Files API - upload tylko wtedy, gdy nie ma ważnego wpisu."""
+        with self._lock:
+            uploads = self._load_uploads()
+            entry = uploads.get(digest)
+            if entry and entry["expire_at"] > time.time():
+                return entry["uri"]
+
+            uploaded = client.files.upload(
+                file=self._path(digest), config=types.UploadFileConfig(mime_type=mime_type)
+            )
+            expire_at = uploaded.expiration_time.timestamp() if uploaded.expiration_time else time.time() + FILE_UPLOAD_TTL
+            # Margines, żeby nie wysłać URI, który wygaśnie w trakcie wywołania
+            uploads[digest] = {"uri": uploaded.uri, "expire_at": min(expire_at, time.time() + FILE_UPLOAD_TTL)}
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = os.path.join(self.root, UPLOADS_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(uploads, f)
+            os.replace(tmp_path, os.path.join(self.root, UPLOADS_FILE))
+            return uploaded.uri
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class MediaResolver:
+    """Referencje blobów -> części zrozumiałe dla modelu (tuż przed wywołaniem)."""
+
+    def __init__(self, store, client=None, policy=MEDIA_HISTORY_POLICY):
+        self.store = store
+        self.client = client
+        self.policy = policy
+        self._inline = OrderedDict()
+
+    @staticmethod
+    def needs_resolve(contents):
+        return any(blob_digest(part) for content in contents for part in content.parts or [])
+
+    def _inline_part(self, digest, mime_type):
+        part = self._inline.get(digest)
+        if part is None:
+            part = self._inline[digest] = types.Part.from_bytes(data=self.store.get(digest), mime_type=mime_type)
+            if len(self._inline) > INLINE_CACHE_SIZE:
+                self._inline.popitem(last=False)
+        self._inline.move_to_end(digest)
+        return part
+
+    def _history_part(self, digest, mime_type):
+        if self.policy == "upload" and self.client is not None:
+            try:
+                return types.Part(file_data=types.FileData(
+                    file_uri=self.store.uploaded_uri(self.client, digest, mime_type), mime_type=mime_type
+                ))
+            except Exception as e:
+                print(f"⚠️ [MEDIA] Upload załącznika nie powiódł się, pomijam go w kontekście: {e}")
+        size_kb = self.store.size(digest) / 1024
+        return types.Part(text=f"[Załącznik z wcześniejszej tury ({mime_type}, {size_kb:.0f} KB) - pominięty w kontekście]")
+
+    def resolve(self, contents):
+        """Kopia okna kontekstu bez referencji blob:// (wiadomości bez mediów bez zmian)."""
+        current_turn = 0
+        for index in range(len(contents) - 1, -1, -1):
+            if is_user_turn(contents[index]):
+                current_turn = index
+                break
+
+        resolved = []
+        for index, content in enumerate(contents):
+            if not any(blob_digest(part) for part in content.parts or []):
+                resolved.append(content)
+                continue
+            parts = []
+            for part in content.parts:
+                digest = blob_digest(part)
+                if digest is None:
+                    parts.append(part)
+                    continue
+                mime_type = part.file_data.mime_type
+                try:
+                    if index >= current_turn:
+                        parts.append(self._inline_part(digest, mime_type))
+                    else:
+                        parts.append(self._history_part(digest, mime_type))
+                except OSError:
+                    parts.append(types.Part(text=f"[Załącznik ({mime_type}) niedostępny - brak pliku w magazynie]"))
+            resolved.append(types.Content(role=content.role, parts=parts))
+        return resolved
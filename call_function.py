@@ -1,41 +1,184 @@
+import ast
+import contextvars
+import hashlib
+import json
 import os
 import sys
 import importlib.util
 import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from google.genai import types  # type: ignore[import]
 
-from config import WORKING_DIR, PROJECT_ROOT
+from config import WORKING_DIR, PROJECT_ROOT, MAX_PARALLEL_TOOLS, TOOL_MANIFEST_FILE
+from tracing import span
+import artifacts
+import usage
 
 # Gdzie szukać narzędzi?
 STATIC_FUNCTIONS_DIR = os.path.join(PROJECT_ROOT, "functions")
 DYNAMIC_FUNCTIONS_DIR = WORKING_DIR
 
+# Zapisany indeks narzędzi (TOOL_MANIFEST_FILE) - pozwala wystartować bez wykonywania modułów
+TOOL_MANIFEST_VERSION = 1
+
 # Globalne kontenery
 function_map = {}
 declarations = []
+# Narzędzia, których moduł deklaruje PARALLEL_SAFE = True (brak efektów ubocznych)
+parallel_safe_tools = set()
+
+# Narzędzia, które tworzą albo zmieniają pliki w workspace - tylko wokół nich robimy
+# migawki (pełny skan stat) do listy artefaktów; add_task, list_tasks itp. ich nie potrzebują
+ARTIFACT_TOOLS = {"write_file", "edit_file", "run_python_file"}
+
+# Indeks plików z narzędziami: ścieżka -> {"mtime_ns", "size", "hash", "tools"}
+# "tools" to lista (nazwa, funkcja, schemat, parallel_safe); pusta dla zwykłych skryptów
+_file_index = {}
+# Kolejność plików z ostatniego skanu (narzędzia z workspace nadpisują wbudowane)
+_scan_order = []
+_registry_lock = threading.RLock()
+
+_executor = None
+
+
+class _LazyTool:
+    """
+    Zaślepka narzędzia wczytanego z manifestu.
+    Moduł jest wykonywany dopiero przy pierwszym wywołaniu narzędzia.
+    """
+
+    def __init__(self, filepath, name):
+        self.filepath = filepath
+        self.name = name
+        self._func = None
+
+    def load(self):
+        with _registry_lock:
+            if self._func is not None:
+                return self._func
+
+            real = {tool_name: func for tool_name, func, _, _ in load_tool_from_file(self.filepath)}
+
+            # Wszystkie zaślepki z tego pliku dostają prawdziwe funkcje za jednym wykonaniem modułu
+            entry = _file_index.get(self.filepath)
+            for tool_name, stub, _, _ in (entry["tools"] if entry else []):
+                if isinstance(stub, _LazyTool) and tool_name in real:
+                    stub._func = real[tool_name]
+                    if function_map.get(tool_name) is stub:
+                        function_map[tool_name] = stub._func
+
+            if self._func is None:
+                self._func = real.get(self.name)
+            if self._func is None:
+                raise RuntimeError(f"Tool {self.name} not found in {os.path.basename(self.filepath)}")
+            return self._func
+
+
+def _load_manifest():
+    """Wypełnia indeks plików z manifestu - deklaracje bez importowania modułów."""
+    if not os.path.exists(TOOL_MANIFEST_FILE):
+        return
+    try:
+        with open(TOOL_MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != TOOL_MANIFEST_VERSION:
+            return
+        for filepath, entry in manifest["files"].items():
+            _file_index[filepath] = {
+                "mtime_ns": entry["mtime_ns"],
+                "size": entry["size"],
+                "hash": entry["hash"],
+                "tools": [
+                    (
+                        tool["name"],
+                        _LazyTool(filepath, tool["name"]),
+                        types.FunctionDeclaration.model_validate(tool["schema"]),
+                        tool["parallel_safe"],
+                    )
+                    for tool in entry["tools"]
+                ],
+            }
+    except Exception as e:
+        print(f"  [LOADER] Nieprawidłowy manifest narzędzi, ładuję od zera: {e}")
+        _file_index.clear()
+
+
+def _save_manifest():
+    manifest = {
+        "version": TOOL_MANIFEST_VERSION,
+        "files": {
+            filepath: {
+                "mtime_ns": entry["mtime_ns"],
+                "size": entry["size"],
+                "hash": entry["hash"],
+                "tools": [
+                    {
+                        "name": tool_name,
+                        "schema": schema.model_dump(mode="json", exclude_none=True),
+                        "parallel_safe": parallel_safe,
+                    }
+                    for tool_name, _, schema, parallel_safe in entry["tools"]
+                ],
+            }
+            for filepath, entry in _file_index.items()
+        },
+    }
+    tmp_path = TOOL_MANIFEST_FILE + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(TOOL_MANIFEST_FILE), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, TOOL_MANIFEST_FILE)
+    except Exception as e:
+        print(f"  [LOADER] Nie udało się zapisać manifestu narzędzi: {e}")
+
+def _is_tool_candidate(filename):
+    module_name = os.path.splitext(filename)[0]
+    return filename.endswith(".py") and not filename.startswith("__") and module_name != "security_utils"
+
+def _declares_tools(source):
+    """
+    Szybki test bez wykonywania kodu: czy plik w ogóle tworzy FunctionDeclaration?
+    Zwykłe skrypty agenta (wykresy, analizy) są pomijane bez exec.
+    """
+    if b"FunctionDeclaration" not in source:
+        return False
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        # Niech błąd zgłosi loader - tak jak dotychczas
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if name == "FunctionDeclaration":
+                return True
+    return False
 
 def load_tool_from_file(filepath):
     """
     Ładuje plik .py, szuka w nim funkcji i schematu.
-    Zabezpieczone przed duplikatami i błędami zmiennych globalnych.
+    Zwraca listę (nazwa, funkcja, schemat, parallel_safe) - rejestracją zajmuje się refresh_tools.
     """
-    # === POPRAWKA: Musimy zadeklarować, że używamy zmiennych globalnych ===
-    global declarations, function_map 
-    
     filename = os.path.basename(filepath)
     module_name = os.path.splitext(filename)[0]
     
-    if filename.startswith("__") or module_name == "security_utils" or not filename.endswith(".py"):
-        return
+    if not _is_tool_candidate(filename):
+        return []
 
+    tools = []
     try:
         spec = importlib.util.spec_from_file_location(module_name, filepath)
         if spec is None or spec.loader is None:
-            return
+            return []
         module = importlib.util.module_from_spec(spec)
         sys.modules[module_name] = module
         spec.loader.exec_module(module)
 
+        parallel_safe = bool(getattr(module, "PARALLEL_SAFE", False))
+
         # Skanowanie zawartości modułu
         for name, obj in inspect.getmembers(module):
             if isinstance(obj, types.FunctionDeclaration):
@@ -43,41 +186,132 @@ def load_tool_from_file(filepath):
                 tool_name = schema.name
                 
                 if hasattr(module, tool_name) and callable(getattr(module, tool_name)):
-                    func = getattr(module, tool_name)
-                    
-                    # === ZABEZPIECZENIE PRZED DUPLIKATAMI ===
-                    # Jeśli narzędzie już istnieje, usuwamy starą definicję z listy declarations
-                    if tool_name in function_map:
-                        # Filtrujemy listę globalną, usuwając stary wpis
-                        declarations = [d for d in declarations if d.name != tool_name]
-
-                    # Rejestracja nowej wersji
-                    function_map[tool_name] = func
-                    declarations.append(schema)
+                    tools.append((tool_name, getattr(module, tool_name), schema, parallel_safe))
 
     except Exception as e:
         print(f"  [LOADER] Błąd przy ładowaniu {filename}: {e}")
 
-def refresh_tools():
-    global declarations, function_map
-    declarations.clear()
+    return tools
+
+def _sync_file(filepath, stat):
+    """Przeładowuje plik tylko wtedy, gdy zmieniła się jego treść. Zwraca True przy zmianie."""
+    entry = _file_index.get(filepath)
+    if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return False
+
+    with open(filepath, "rb") as f:
+        source = f.read()
+    content_hash = hashlib.sha256(source).hexdigest()
+
+    if entry and entry["hash"] == content_hash:
+        # Sam "touch" - treść bez zmian, nie wykonujemy modułu ponownie
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        return False
+
+    tools = load_tool_from_file(filepath) if _declares_tools(source) else []
+    _file_index[filepath] = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": content_hash,
+        "tools": tools,
+    }
+    return True
+
+def _rebuild_registry():
+    """Składa function_map / declarations z indeksu (bez wykonywania modułów)."""
+    global available_functions_tool
+    registered = {}
+    for filepath in _scan_order:
+        for tool_name, func, schema, parallel_safe in _file_index[filepath]["tools"]:
+            # === ZABEZPIECZENIE PRZED DUPLIKATAMI ===
+            # Późniejszy plik (np. z workspace) nadpisuje wcześniejszą definicję
+            registered.pop(tool_name, None)
+            registered[tool_name] = (func, schema, parallel_safe)
+
     function_map.clear()
+    function_map.update({name: func for name, (func, _, _) in registered.items()})
+    declarations[:] = [schema for _, schema, _ in registered.values()]
+    parallel_safe_tools.clear()
+    parallel_safe_tools.update(name for name, (_, _, safe) in registered.items() if safe)
+
+    # Nowy obiekt Tool tylko przy zmianie - po nim cache promptu poznaje zmianę
+    available_functions_tool = types.Tool(function_declarations=list(declarations))
+
+def refresh_tools():
+    """
+    Przyrostowe odświeżenie rejestru: wykonuje ponownie tylko zmienione pliki,
+    usuwa narzędzia z usuniętych plików, a pliki bez FunctionDeclaration pomija.
+    """
+    global _scan_order
+    with _registry_lock:
+        changed = False
+        scan_order = []
+
+        for directory in (STATIC_FUNCTIONS_DIR, DYNAMIC_FUNCTIONS_DIR):
+            if not os.path.exists(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if not _is_tool_candidate(entry.name) or not entry.is_file():
+                        continue
+                    scan_order.append(entry.path)
+                    try:
+                        changed |= _sync_file(entry.path, entry.stat())
+                    except OSError as e:
+                        print(f"  [LOADER] Błąd przy odczycie {entry.name}: {e}")
+                        scan_order.pop()
 
-    if os.path.exists(STATIC_FUNCTIONS_DIR):
-        for filename in os.listdir(STATIC_FUNCTIONS_DIR):
-            load_tool_from_file(os.path.join(STATIC_FUNCTIONS_DIR, filename))
+        # Pliki, które zniknęły z dysku
+        for filepath in set(_file_index) - set(scan_order):
+            del _file_index[filepath]
+            changed = True
 
-    if os.path.exists(DYNAMIC_FUNCTIONS_DIR):
-        for filename in os.listdir(DYNAMIC_FUNCTIONS_DIR):
-            load_tool_from_file(os.path.join(DYNAMIC_FUNCTIONS_DIR, filename))
+        if changed or scan_order != _scan_order or not _file_index:
+            _scan_order = scan_order
+            _rebuild_registry()
+        if changed:
+            _save_manifest()
 
-    return types.Tool(function_declarations=declarations)
+        return available_functions_tool
 
-# Inicjalizacja
-available_functions_tool = refresh_tools() 
+# Inicjalizacja - niezmienione pliki dostają deklaracje z manifestu,
+# a ich moduły wykonujemy dopiero przy pierwszym wywołaniu narzędzia
+available_functions_tool = None
+_load_manifest()
+refresh_tools()
 
 
-def call_function(function_call, verbose=False):
+def get_available_tool():
+    """Aktualny zestaw narzędzi (po ewentualnym refresh_tools w trakcie sesji)."""
+    return available_functions_tool
+
+
+def call_function(function_call, verbose=False, on_output=None, working_directory=WORKING_DIR):
+    """
+    Rejestr narzędzi jest wspólny dla całego procesu, a katalog roboczy przychodzi
+    z każdym wywołaniem - dzięki temu sesje usługi (service.py) mają osobne workspace.
+    """
+    function_name = function_call.name or ""
+    with span("tool.call", tool=function_name) as current:
+        # Narzędzia zapisujące pliki: zapamiętujemy, które pliki utworzyły (artefakty dla UI)
+        track_artifacts = function_name in ARTIFACT_TOOLS
+        before = artifacts.snapshot(working_directory) if track_artifacts else None
+
+        result = _call_function(function_call, verbose, on_output, working_directory)
+        response = result.parts[0].function_response.response or {}
+        if "error" in response:
+            current.set(failed=True)
+        if track_artifacts:
+            produced = artifacts.changed_files(before, artifacts.snapshot(working_directory))
+            if produced:
+                response["artifacts"] = produced
+        # Wynik narzędzia trafia do historii - liczymy, ile tokenów dokłada do promptów
+        usage.record_tool(function_name, response)
+        return result
+
+
+def _call_function(function_call, verbose=False, on_output=None, working_directory=WORKING_DIR):
     if verbose:
         print(f" - Calling function: {function_call.name}")
 
@@ -98,10 +332,27 @@ def call_function(function_call, verbose=False):
     args = dict(function_call.args) if function_call.args else {}
     
     func_obj = function_map[function_name]
+    if isinstance(func_obj, _LazyTool):
+        try:
+            func_obj = func_obj.load()
+        except Exception as e:
+            return types.Content(
+                role="tool",
+                parts=[types.Part.from_function_response(
+                    name=function_name,
+                    response={"error": f"Function loading failed: {str(e)}"},
+                )],
+            )
     sig = inspect.signature(func_obj)
     
     if "working_directory" in sig.parameters:
-        args["working_directory"] = WORKING_DIR
+        args["working_directory"] = working_directory
+
+    # Narzędzia z parametrem on_output (np. run_python_file) mogą relacjonować postęp na żywo
+    if "on_output" in sig.parameters:
+        args.pop("on_output", None)
+        if on_output:
+            args["on_output"] = lambda stream, text: on_output(function_name, stream, text)
 
     try:
         result = func_obj(**args)
@@ -119,4 +370,55 @@ def call_function(function_call, verbose=False):
                 name=function_name,
                 response={"error": f"Function execution failed: {str(e)}"},
             )],
-        )
\ No newline at end of file
+        )
+
+
+def is_parallel_safe(function_name):
+    return function_name in parallel_safe_tools
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix="tool")
+    return _executor
+
+
+def call_functions(function_calls, verbose=False, on_output=None, working_directory=WORKING_DIR):
+    """
+    Wykonuje wszystkie wywołania z jednej tury modelu.
+    Kolejne narzędzia oznaczone jako PARALLEL_SAFE lecą równolegle w puli wątków,
+    pozostałe (zapis plików, uruchamianie skryptów) wykonujemy pojedynczo,
+    żeby zachować kolejność efektów ubocznych.
+    Zwraca listę types.Content w tej samej kolejności co function_calls.
+    on_output(nazwa_narzędzia, strumień, tekst) dostaje wyjście narzędzi na bieżąco.
+    """
+    results = [None] * len(function_calls)
+    batch = []
+
+    def flush_batch():
+        if len(batch) == 1:
+            index, function_call = batch[0]
+            results[index] = call_function(function_call, verbose, on_output, working_directory)
+        elif batch:
+            executor = _get_executor()
+            # Każdy wątek dostaje kopię kontekstu - spany narzędzi wiszą pod bieżącą iteracją
+            futures = [
+                (index, executor.submit(
+                    contextvars.copy_context().run, call_function, fc, verbose, on_output, working_directory
+                ))
+                for index, fc in batch
+            ]
+            for index, future in futures:
+                results[index] = future.result()
+        batch.clear()
+
+    for index, function_call in enumerate(function_calls):
+        if is_parallel_safe(function_call.name or ""):
+            batch.append((index, function_call))
+            continue
+        flush_batch()
+        results[index] = call_function(function_call, verbose, on_output, working_directory)
+
+    flush_batch()
+    return results
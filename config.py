@@ -6,5 +6,105 @@ WORKING_DIR = os.path.join(PROJECT_ROOT, "agent_workspace")
 
 os.makedirs(WORKING_DIR, exist_ok=True)
 
+# Manifest rejestru narzędzi (ścieżki absolutne, deklaracje) i cache werdyktów reviewera leżą
+# przy kodzie, a nie w workspace, do którego agent może pisać (podrobiony werdykt omijałby reviewera)
+TOOL_MANIFEST_FILE = os.path.join(PROJECT_ROOT, "__pycache__", "tool_manifest.json")
+REVIEW_CACHE_FILE = os.path.join(PROJECT_ROOT, "__pycache__", "review_cache.json")
+
+MODEL_NAME = "gemini-2.5-flash"
+
 MAX_ITERS = 20
-MAX_CHARS = 10000
\ No newline at end of file
+MAX_CHARS = 10000
+
+# Ile niezależnych wywołań narzędzi z jednej tury może działać jednocześnie
+MAX_PARALLEL_TOOLS = 4
+
+# Co ile dopisanych rekordów dziennik sesji jest kompaktowany do snapshotu
+JOURNAL_COMPACT_EVERY = 50
+
+# Budżet kontekstu wysyłanego do modelu (szacowane tokeny historii).
+# Starsze tury trafiają do kroczącego podsumowania, duże wyniki narzędzi są przycinane.
+CONTEXT_TOKEN_BUDGET = 60000
+CONTEXT_TOOL_OUTPUT_CHARS = 4000
+CONTEXT_SUMMARY_CHARS = 6000
+
+# Cache system promptu + deklaracji narzędzi po stronie modelu (opcjonalny)
+PROMPT_CACHE_ENABLED = False
+PROMPT_CACHE_TTL = 3600
+
+# Obrazy i nagrania z historii: bajty w magazynie blobów (<workspace>/.blobs), w historii tylko referencje.
+# Załączniki ze starszych tur: "drop" (notka tekstowa zamiast pliku) albo "upload" (jednorazowo przez Files API)
+BLOB_DIR = ".blobs"
+MEDIA_HISTORY_POLICY = "drop"
+# Files API trzyma pliki 48 h - po tym czasie (z zapasem) wysyłamy ponownie
+FILE_UPLOAD_TTL = 47 * 3600
+
+# Przygotowanie załączników przed wysłaniem (media_preprocess.py): obrazy pomniejszane do
+# MEDIA_IMAGE_MAX_DIM px i kompresowane (WebP/JPEG), nagrania bez ciszy na brzegach, mono 16 kHz
+MEDIA_PREPROCESS_ENABLED = True
+MEDIA_IMAGE_MAX_DIM = 1536
+MEDIA_IMAGE_QUALITY = 80
+MEDIA_AUDIO_SAMPLE_RATE = 16000
+# Średnia amplituda (PCM 16-bit), poniżej której okno nagrania uznajemy za ciszę
+MEDIA_AUDIO_SILENCE_THRESHOLD = 300
+
+# Lokalna analiza statyczna (static_review.py) przed reviewerem LLM: oczywiste naruszenia
+# są odrzucane od razu. AUTO_APPROVE zatwierdza trywialnie bezpieczny kod bez modelu -
+# domyślnie wyłączone, bo run_python_file nie ma sandboxa i reviewer LLM jest jedyną ochroną
+STATIC_REVIEW_ENABLED = True
+STATIC_REVIEW_AUTO_APPROVE = False
+
+# Ile werdyktów reviewera trzymamy w cache (REVIEW_CACHE_FILE)
+REVIEW_CACHE_SIZE = 512
+
+# Pula rozgrzanych interpreterów dla run_python_file (tylko systemy z fork())
+PYTHON_POOL_ENABLED = True
+PYTHON_POOL_SIZE = 1
+# Po tylu zadaniach zygota jest wymieniana na świeżą
+PYTHON_POOL_MAX_JOBS = 50
+# Biblioteki importowane raz, przy starcie workera
+PYTHON_POOL_PRELOAD = ["numpy", "pandas", "matplotlib", "matplotlib.pyplot"]
+
+# Ile bajtów początku i końca wyjścia skryptu dostaje model (na strumień);
+# całość ląduje w agent_workspace/.run_logs
+RUN_OUTPUT_HEAD_BYTES = 4000
+RUN_OUTPUT_TAIL_BYTES = 4000
+RUN_LOGS_KEEP = 20
+# Limit jednego logu na dysku (na strumień) - dalej zostaje tylko końcówka wyjścia
+RUN_LOG_MAX_BYTES = 10 * 1024 * 1024
+
+# Wyszukiwarka: cache wyników (sekundy / liczba wpisów), limit zapytań na sekundę
+# i liczba równoległych zapytań w search_web_batch
+SEARCH_CACHE_TTL = 6 * 3600
+SEARCH_CACHE_SIZE = 500
+SEARCH_RATE_LIMIT = 1.0
+SEARCH_BATCH_WORKERS = 4
+
+# Profilowanie (main.py --profile, panel w Streamlit): ile ostatnich spanów trzymamy w pamięci
+# i ile próbek na fazę bierzemy do kwantyli; eksport trafia do agent_workspace/.traces
+TRACE_MAX_SPANS = 10000
+TRACE_SAMPLES_PER_SPAN = 1000
+
+# Koszt tokenów (USD za 1M tokenów) - do liczenia kosztu sesji; ceny trzeba aktualizować ręcznie
+MODEL_PRICES = {
+    "gemini-2.5-flash": {"input": 0.30, "output": 2.50, "cached": 0.075},
+}
+# Budżety: po przekroczeniu pętla agenta kończy się przed kolejnym wywołaniem modelu (None = bez limitu)
+REQUEST_TOKEN_BUDGET = None
+REQUEST_COST_BUDGET = None
+SESSION_TOKEN_BUDGET = None
+SESSION_COST_BUDGET = None
+# Tryb usługi (service.py): każda sesja dostaje własny katalog w agent_sessions/<id>
+# (workspace/ agenta z tasks.db oraz state/ z pamięcią i licznikami tokenów, poza zasięgiem agenta);
+# rejestr narzędzi i klient Gemini są wspólne
+SESSIONS_DIR = os.path.join(PROJECT_ROOT, "agent_sessions")
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+# Ile zapytań (pętli agenta) z różnych sesji może działać jednocześnie
+SERVICE_MAX_CONCURRENT_RUNS = 16
+# Wątki dla narzędzi i innych blokujących kroków wszystkich sesji
+SERVICE_WORKER_THREADS = 32
+# Ile sesji trzymamy w pamięci - najdawniej używane są zamykane (dane zostają na dysku)
+SERVICE_MAX_OPEN_SESSIONS = 256
+# Bez człowieka przy konsoli wrażliwe narzędzia (zapis, uruchamianie) są domyślnie blokowane
+SERVICE_AUTO_APPROVE = False
@@ -0,0 +1,168 @@
+import json
+
+from google.genai import types # type: ignore[import]
+
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOOL_OUTPUT_CHARS, CONTEXT_SUMMARY_CHARS
+
+# Zgrubny przelicznik znaków na tokeny (wystarczy do pilnowania budżetu)
+CHARS_PER_TOKEN = 4
+# Tyle tokenów liczymy za obraz / nagranie / plik w historii
+MEDIA_PART_TOKENS = 258
+
+SUMMARY_HEADER = "[PODSUMOWANIE WCZEŚNIEJSZEJ ROZMOWY - starsze tury zostały skrócone]\n"
+
+
+def _shorten(text, limit):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def estimate_part_tokens(part):
+    if part.text:
+        return len(part.text) // CHARS_PER_TOKEN + 1
+    if part.function_call:
+        return len(json.dumps(part.function_call.args or {}, default=str)) // CHARS_PER_TOKEN + 5
+    if part.function_response:
+        return len(json.dumps(part.function_response.response or {}, default=str)) // CHARS_PER_TOKEN + 5
+    return MEDIA_PART_TOKENS
+
+
+def is_user_turn(content):
+    """Czy wiadomość rozpoczyna nową turę użytkownika (a nie jest wynikiem narzędzia)."""
+    return content.role == "user" and any(not part.function_response for part in content.parts or [])
+
+
+class ContextManager:
+    """
+    Warstwa między pamięcią a pętlą agenta.
+
+    Pełna historia zostaje w pamięci sesji, a do modelu idzie tylko okno mieszczące
+    się w token_budget. Najstarsze tury wypadają z okna do kroczącego podsumowania
+    (raz streszczonej wiadomości już nie ruszamy), duże wyniki narzędzi spoza
+    bieżącej tury są przycinane. Cięcie zawsze wypada na początku tury użytkownika,
+    więc pary function_call / function_response się nie rozjeżdżają, a najnowsza
+    tura jest przekazywana w całości.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, tool_output_chars=CONTEXT_TOOL_OUTPUT_CHARS,
+                 summary_chars=CONTEXT_SUMMARY_CHARS):
+        self.token_budget = token_budget
+        self.tool_output_chars = tool_output_chars
+        self.summary_chars = summary_chars
+        self.summary = ""
+        self._summarized = 0
+        # id(wiadomości) -> (wiadomość, wersja do wysłania, tokeny)
+        self._cache = {}
+        self.last_estimate = 0
+
+    def reset(self):
+        self.summary = ""
+        self._summarized = 0
+        self._cache.clear()
+
+    # === PRZYCINANIE WYNIKÓW NARZĘDZI ===
+
+    def _trim_tool_output(self, content):
+        parts = []
+        changed = False
+        for part in content.parts or []:
+            response = part.function_response.response if part.function_response else None
+            text = json.dumps(response, ensure_ascii=False, default=str) if response else ""
+            if len(text) > self.tool_output_chars:
+                half = self.tool_output_chars // 2
+                skipped = len(text) - 2 * half
+                part = types.Part.from_function_response(
+                    name=part.function_response.name,
+                    response={"result": f"{text[:half]}\n[...pominięto {skipped} znaków starego wyniku...]\n{text[-half:]}"},
+                )
+                changed = True
+            parts.append(part)
+        return types.Content(role=content.role, parts=parts) if changed else content
+
+    def _prepared(self, content):
+        """Zwraca (wersja do wysłania, tokeny) z cache, żeby nie liczyć okna od nowa co iterację."""
+        cached = self._cache.get(id(content))
+        if cached and cached[0] is content:
+            return cached[1], cached[2]
+        prepared = self._trim_tool_output(content) if content.role == "tool" else content
+        tokens = sum(estimate_part_tokens(part) for part in prepared.parts or [])
+        self._cache[id(content)] = (content, prepared, tokens)
+        return prepared, tokens
+
+    def _tokens(self, content):
+        cached = self._cache.get(id(content))
+        if cached and cached[0] is content:
+            return cached[2]
+        return sum(estimate_part_tokens(part) for part in content.parts or [])
+
+    # === PODSUMOWANIE ===
+
+    def _summarize(self, messages):
+        lines = []
+        for content in messages:
+            for part in content.parts or []:
+                if part.text and not part.thought:
+                    who = "Użytkownik" if content.role == "user" else "Agent"
+                    lines.append(f"- {who}: {_shorten(part.text, 200)}")
+                elif part.function_call:
+                    args = _shorten(json.dumps(part.function_call.args or {}, ensure_ascii=False, default=str), 120)
+                    lines.append(f"- Agent wywołał {part.function_call.name}({args})")
+                elif part.function_response:
+                    result = _shorten(json.dumps(part.function_response.response or {}, ensure_ascii=False, default=str), 150)
+                    lines.append(f"  -> {part.function_response.name}: {result}")
+                elif part.inline_data or part.file_data:
+                    lines.append("- (załącznik multimedialny)")
+            self._cache.pop(id(content), None)
+
+        summary = "\n".join(filter(None, [self.summary, *lines]))
+        # Podsumowanie też ma limit - najstarsze linie wypadają jako pierwsze
+        if len(summary) > self.summary_chars:
+            summary = summary[-self.summary_chars:]
+            summary = summary[summary.find("\n") + 1:]
+        self.summary = summary
+
+    # === OKNO KONTEKSTU ===
+
+    def build(self, messages):
+        """Zwraca listę wiadomości do wysłania do modelu, mieszczącą się w budżecie."""
+        if self._summarized > len(messages):
+            # Historia została wyczyszczona - zaczynamy od nowa
+            self.reset()
+
+        # Najnowsza tura użytkownika (razem z trwającymi wywołaniami narzędzi) jest nietykalna
+        protected_start = self._summarized
+        for index in range(len(messages) - 1, self._summarized - 1, -1):
+            if is_user_turn(messages[index]):
+                protected_start = index
+                break
+
+        total = len(self.summary) // CHARS_PER_TOKEN
+        total += sum(self._tokens(content) for content in messages[protected_start:])
+
+        # Cofamy się od najnowszej tury i szukamy najwcześniejszego początku tury,
+        # od którego wszystko mieści się w budżecie
+        cut = protected_start
+        running = total
+        for index in range(protected_start - 1, self._summarized - 1, -1):
+            running += self._prepared(messages[index])[1]
+            if running > self.token_budget:
+                break
+            if is_user_turn(messages[index]):
+                cut = index
+                total = running
+
+        if cut > self._summarized:
+            self._summarize(messages[self._summarized:cut])
+            self._summarized = cut
+            total = len(self.summary) // CHARS_PER_TOKEN + sum(
+                self._tokens(content) for content in messages[cut:]
+            )
+
+        window = [self._prepared(content)[0] for content in messages[self._summarized:protected_start]]
+        window.extend(messages[protected_start:])
+
+        if self.summary:
+            window.insert(0, types.Content(role="user", parts=[types.Part(text=SUMMARY_HEADER + self.summary)]))
+
+        self.last_estimate = total
+        return window
@@ -0,0 +1,273 @@
+import difflib
+import hashlib
+import os
+import re
+import tempfile
+
+from google.genai import types  # type: ignore[import]
+
+import workspace_index
+
+# Ile linii kontekstu wokół zmian dostaje reviewer (i użytkownik przy akceptacji)
+REVIEW_CONTEXT_LINES = 5
+# O ile linii hunk z diffa może się "przesunąć" względem numeru z nagłówka
+MAX_HUNK_OFFSET = 200
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class EditConflict(Exception):
+    """Hunk nie pasuje do aktualnej zawartości pliku."""
+
+
+def _closest_hint(text, snippet):
+    """Podpowiedź dla modelu: najbardziej podobny fragment pliku."""
+    lines = text.splitlines()
+    first = next((line for line in snippet.splitlines() if line.strip()), "")
+    match = difflib.get_close_matches(first, lines, n=1, cutoff=0.6)
+    if not match:
+        return ""
+    line_no = lines.index(match[0]) + 1
+    return f' Closest line in the file is {line_no}: "{match[0].strip()}". Re-read the file and retry'
+
+
+def _apply_search_replace(text, edits):
+    for number, edit in enumerate(edits, start=1):
+        search = edit.get("search", "")
+        replace = edit.get("replace", "")
+        if not search:
+            raise EditConflict(f"Edit #{number}: 'search' must not be empty")
+        count = text.count(search)
+        if count == 0:
+            raise EditConflict(f"Edit #{number}: search text not found.{_closest_hint(text, search)}")
+        if count > 1:
+            raise EditConflict(
+                f"Edit #{number}: search text matches {count} places; include more surrounding lines to make it unique"
+            )
+        text = text.replace(search, replace, 1)
+    return text
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _split_lines(text):
+    """
+    Linie bez końców + ich końce ("\n", "\r\n", "" dla ostatniej bez nowej linii).
+    Dzielimy tylko po \n - splitlines() rozcina też \x0c, \x85, U+2028 i zamienia CRLF na LF.
+    """
+    if not text:
+        return [], []
+    lines = text.split("\n")
+    endings = ["\n"] * (len(lines) - 1) + [""]
+    if lines[-1] == "":
+        lines.pop()
+        endings.pop()
+    for index, line in enumerate(lines):
+        if line.endswith("\r") and endings[index]:
+            lines[index] = line[:-1]
+            endings[index] = "\r\n"
+    return lines, endings
+
+
+def _parse_unified_diff(diff):
+    """Zwraca listę hunków: (linia_startowa, indeks_w_pliku, stare_linie, nowe_linie)."""
+    hunks = []
+    current = None
+    diff_lines = diff.split("\n")
+    if diff_lines[-1] == "":
+        diff_lines.pop()
+    for line in diff_lines:
+        line = line[:-1] if line.endswith("\r") else line
+        if line.startswith(("--- ", "+++ ", "diff ", "index ")):
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header:
+            start = int(header.group(1))
+            # "@@ -5,0 +6,2 @@" to wstawienie PO linii 5, więc indeks 5, a nie 4
+            index = start if header.group(2) == "0" else start - 1
+            current = (start, index, [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith("\\"):
+            continue  # Tekst przed pierwszym hunkiem / "\ No newline at end of file"
+        tag, body = (line[:1], line[1:]) if line else (" ", "")
+        if tag == " ":
+            current[2].append(body)
+            current[3].append(body)
+        elif tag == "-":
+            current[2].append(body)
+        elif tag == "+":
+            current[3].append(body)
+        else:
+            raise EditConflict(f"Malformed diff line: {line!r}")
+    if not hunks:
+        raise EditConflict("No hunks found in diff (expected '@@ -a,b +c,d @@' headers)")
+    return hunks
+
+
+def _find_hunk(lines, old, expected):
+    """Szuka starych linii hunka najpierw w miejscu z nagłówka, potem coraz dalej od niego."""
+    if not old:
+        return min(max(expected, 0), len(lines))
+    for delta in range(MAX_HUNK_OFFSET + 1):
+        for start in {expected - delta, expected + delta}:
+            if 0 <= start <= len(lines) - len(old) and lines[start:start + len(old)] == old:
+                return start
+    return None
+
+
+def _apply_unified_diff(text, diff):
+    """Końce linii pliku (LF/CRLF, brak \n na końcu) zostają takie, jakie były."""
+    lines, endings = _split_lines(text)
+    newline = "\r\n" if "\r\n" in endings else "\n"
+    shift = 0
+    for number, (start_line, index, old, new) in enumerate(_parse_unified_diff(diff), start=1):
+        position = _find_hunk(lines, old, index + shift)
+        if position is None:
+            raise EditConflict(
+                f"Hunk #{number} (@@ -{start_line}) does not match the current file content."
+                f"{_closest_hint(text, chr(10).join(old))}"
+            )
+        end = position + len(old)
+        new_endings = [newline] * len(new)
+        if end == len(lines) and new:
+            # Hunk sięga końca pliku: ostatnia linia zachowuje (brak) końca jak w oryginale
+            last_ending = endings[-1] if endings else newline
+            if not old and position > 0 and not endings[position - 1]:
+                endings[position - 1] = newline
+            new_endings[-1] = last_ending
+        lines[position:end] = new
+        endings[position:end] = new_endings
+        shift += len(new) - len(old)
+    return "".join(line + ending for line, ending in zip(lines, endings))
+
+
+def _resolve(working_directory, file_path, must_exist=True):
+    abs_working_dir = os.path.abspath(working_directory)
+    abs_file_path = os.path.normpath(os.path.join(abs_working_dir, file_path))
+    if os.path.commonpath([abs_working_dir, abs_file_path]) != abs_working_dir:
+        raise EditConflict(f'Cannot edit "{file_path}" as it is outside the permitted working directory')
+    if must_exist and not os.path.isfile(abs_file_path):
+        raise EditConflict(f'File "{file_path}" does not exist; use write_file to create it')
+    return abs_working_dir, abs_file_path
+
+
+def preview_edit(working_directory, file_path, edits=None, diff=None, old_text=None):
+    """
+    Liczy wynik edycji bez zapisu.
+    old_text: treść, na której edycja zadziała (np. po wcześniejszym zapisie w tej samej turze);
+    domyślnie aktualna zawartość pliku.
+    Zwraca (ścieżka, stara_treść, nowa_treść); przy konflikcie rzuca EditConflict.
+    """
+    _, abs_file_path = _resolve(working_directory, file_path, must_exist=old_text is None)
+    if bool(edits) == bool(diff):
+        raise EditConflict("Provide exactly one of 'edits' (search/replace list) or 'diff' (unified diff)")
+    if old_text is None:
+        with open(abs_file_path, "r", encoding="utf-8", newline="") as f:
+            old_text = f.read()
+    if edits:
+        new_text = _apply_search_replace(old_text, list(edits))
+    else:
+        new_text = _apply_unified_diff(old_text, diff)
+    return abs_file_path, old_text, new_text
+
+
+def change_diff(file_path, old_text, new_text, context=REVIEW_CONTEXT_LINES):
+    """Unified diff zmiany z kontekstem - to widzi reviewer zamiast całego pliku."""
+    old_lines, old_endings = _split_lines(old_text)
+    new_lines, new_endings = _split_lines(new_text)
+    return "".join(difflib.unified_diff(
+        [line + ending for line, ending in zip(old_lines, old_endings)],
+        [line + ending for line, ending in zip(new_lines, new_endings)],
+        fromfile=f"a/{file_path}",
+        tofile=f"b/{file_path}",
+        n=context,
+    ))
+
+
+def _atomic_write(path, content):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".edit-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def edit_file(working_directory, file_path, edits=None, diff=None, expected_sha256=None):
+    """
+    expected_sha256: hash treści, dla której edycja została przejrzana (ustawia silnik agenta) -
+    jeśli plik zmienił się od przeglądu, nic nie zapisujemy.
+    """
+    try:
+        abs_working_dir, _ = _resolve(working_directory, file_path)
+        abs_file_path, old_text, new_text = preview_edit(working_directory, file_path, edits, diff)
+        if expected_sha256 and content_hash(old_text) != expected_sha256:
+            raise EditConflict(f'"{file_path}" changed after the edit was reviewed; re-read the file and retry')
+        if new_text == old_text:
+            return f'No changes: edits leave "{file_path}" unchanged'
+
+        _atomic_write(abs_file_path, new_text)
+        workspace_index.notify_write(abs_working_dir, abs_file_path)
+
+        diff_lines = change_diff(file_path, old_text, new_text, context=0).splitlines()
+        added = sum(1 for line in diff_lines if line.startswith("+") and not line.startswith("+++"))
+        removed = sum(1 for line in diff_lines if line.startswith("-") and not line.startswith("---"))
+        return f'Successfully edited "{file_path}" (+{added} -{removed} lines)'
+    except EditConflict as e:
+        return f"Error: edit conflict: {e}. The file was not modified."
+    except Exception as e:
+        return f"Error: editing file: {e}"
+
+
+schema_edit_file = types.FunctionDeclaration(
+    name="edit_file",
+    description=(
+        "Edits an existing file in place without resending its whole content. "
+        "Give either 'edits' (a list of exact search/replace pairs; each search text must occur exactly once) "
+        "or 'diff' (a unified diff with @@ hunk headers). All changes are applied atomically: if any hunk "
+        "does not match, nothing is written and the error explains which one. Use write_file only for new files "
+        "or complete rewrites."
+    ),
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "file_path": types.Schema(
+                type=types.Type.STRING,
+                description="File path to edit, relative to the working directory",
+            ),
+            "edits": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "search": types.Schema(
+                            type=types.Type.STRING,
+                            description="Exact text currently in the file (include a few lines of context so it is unique)",
+                        ),
+                        "replace": types.Schema(
+                            type=types.Type.STRING,
+                            description="Text to put in its place",
+                        ),
+                    },
+                    required=["search", "replace"],
+                ),
+                description="Search/replace edits applied in order",
+            ),
+            "diff": types.Schema(
+                type=types.Type.STRING,
+                description="Unified diff to apply (alternative to edits)",
+            ),
+        },
+        required=["file_path"],
+    ),
+)
@@ -1,36 +1,220 @@
 import os
+import threading
+from array import array
+from collections import OrderedDict
 from config import MAX_CHARS
 from google.genai import types  # type: ignore[import]
 
-def get_file_content(working_directory, file_path):
-    try:   
+# Tylko odczyt - call_functions może uruchamiać to narzędzie równolegle
+PARALLEL_SAFE = True
+
+# Indeks linii: zapamiętujemy offset co LINE_INDEX_STEP-tej linii
+LINE_INDEX_STEP = 256
+LINE_INDEX_CACHE_SIZE = 32
+READ_CHUNK = 1 << 20
+
+# ścieżka -> (mtime_ns, rozmiar, liczba_linii, offsety)
+_line_indexes = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def _build_line_index(path):
+    """Jedno przejście po pliku: offset początku co LINE_INDEX_STEP-tej linii + liczba linii."""
+    offsets = array("Q", [0])
+    line_count = 0
+    position = 0
+    last_byte = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            start = 0
+            while True:
+                newline = chunk.find(b"\n", start)
+                if newline == -1:
+                    break
+                line_count += 1
+                if line_count % LINE_INDEX_STEP == 0:
+                    offsets.append(position + newline + 1)
+                start = newline + 1
+            position += len(chunk)
+            last_byte = chunk[-1:]
+    if last_byte != b"\n":
+        line_count += 1  # Ostatnia linia bez znaku nowej linii
+    return line_count, offsets
+
+
+def _get_line_index(path):
+    stat = os.stat(path)
+    with _index_lock:
+        cached = _line_indexes.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _line_indexes.move_to_end(path)
+            return cached[2], cached[3]
+
+    line_count, offsets = _build_line_index(path)
+    with _index_lock:
+        _line_indexes[path] = (stat.st_mtime_ns, stat.st_size, line_count, offsets)
+        _line_indexes.move_to_end(path)
+        while len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+            _line_indexes.popitem(last=False)
+    return line_count, offsets
+
+
+def _decode_chunk(data, at_eof):
+    """
+    Dekoduje fragment UTF-8, odcinając niepełny znak na końcu.
+    Zwraca (tekst, liczba_zużytych_bajtów).
+    """
+    end = len(data)
+    if not at_eof:
+        # Cofamy się do początku ostatniego znaku, jeśli jest ucięty
+        back = 0
+        while back < min(3, end) and (data[end - 1 - back] & 0xC0) == 0x80:
+            back += 1
+        lead = end - 1 - back
+        if lead >= 0 and data[lead] >= 0xC0:
+            needed = 2 if data[lead] < 0xE0 else 3 if data[lead] < 0xF0 else 4
+            if back + 1 < needed and lead > 0:
+                end = lead
+    return data[:end].decode("utf-8", errors="replace"), end
+
+
+def _take_chars(data, max_chars, at_eof):
+    """
+    Najwyżej max_chars znaków z początku bajtów UTF-8.
+    Zwraca (tekst, liczba_zużytych_bajtów) - bajty są cursorem do kontynuacji.
+    """
+    text, consumed = _decode_chunk(data, at_eof)
+    if len(text) <= max_chars:
+        return text, consumed
+    # Najkrótszy prefiks bajtów, który daje max_chars znaków (każdy bajt to najwyżej jeden znak)
+    low, high = max_chars, consumed
+    while low < high:
+        middle = (low + high) // 2
+        if len(_decode_chunk(data[:middle], at_eof=False)[0]) >= max_chars:
+            high = middle
+        else:
+            low = middle + 1
+    return _decode_chunk(data[:low], at_eof=False)[0][:max_chars], low
+
+
+def _read_bytes(target_path, file_path, offset, length):
+    """
+    Bez length: najwyżej MAX_CHARS znaków (jak odczyt tekstowy); z length: tyle bajtów.
+    Cursor kontynuacji jest zawsze offsetem w bajtach.
+    """
+    size = os.path.getsize(target_path)
+    if offset > size:
+        return f'Error: offset {offset} is beyond the end of "{file_path}" ({size} bytes)'
+    if length is not None and int(length) <= 0:
+        return "Error: length must be a positive number of bytes"
+
+    # UTF-8 ma najwyżej 4 bajty na znak
+    byte_limit = MAX_CHARS * 4 if length is None else min(int(length), MAX_CHARS)
+    with open(target_path, "rb") as f:
+        f.seek(offset)
+        # Nie zaczynamy w środku znaku UTF-8
+        while offset < size:
+            byte = f.read(1)
+            if (byte[0] & 0xC0) != 0x80:
+                f.seek(offset)
+                break
+            offset += 1
+        data = f.read(byte_limit)
+
+    end_of_data = offset + len(data)
+    content, consumed = _take_chars(data, MAX_CHARS, at_eof=end_of_data >= size)
+    next_offset = offset + consumed
+
+    if next_offset < size:
+        limit = f"{MAX_CHARS} characters" if length is None else f"{byte_limit} bytes"
+        content += (
+            f'\n[...File "{file_path}" truncated at {limit}: showing bytes {offset}-{next_offset} of {size}. '
+            f'To continue, call get_file_content with offset={next_offset}...]'
+        )
+    return content
+
+
+def _read_lines(target_path, file_path, start_line, end_line):
+    line_count, offsets = _get_line_index(target_path)
+    start_line = max(1, int(start_line or 1))
+    end_line = line_count if end_line is None else min(int(end_line), line_count)
+
+    if start_line > line_count:
+        return f'Error: "{file_path}" has only {line_count} lines'
+    if end_line < start_line:
+        return f'Error: end_line ({end_line}) is before start_line ({start_line})'
+
+    block, skip = divmod(start_line - 1, LINE_INDEX_STEP)
+    lines = []
+    used = 0
+    current = start_line - 1
+    with open(target_path, "rb") as f:
+        f.seek(offsets[block])
+        for _ in range(skip):
+            f.readline()
+        while current < end_line:
+            line_start = f.tell()
+            # Limit w bajtach - bardzo długa linia (np. zminifikowany JSON) nie trafia cała do pamięci
+            raw = f.readline(MAX_CHARS * 4 + 1)
+            if not raw:
+                break
+            text = raw.decode("utf-8", errors="replace")
+            if not lines and (len(text) > MAX_CHARS or not raw.endswith(b"\n") and f.peek(1)):
+                # Pojedyncza linia dłuższa niż limit: pokazujemy początek i cursor w bajtach wewnątrz niej
+                text, consumed = _take_chars(raw, MAX_CHARS, at_eof=False)
+                return (
+                    f"[Line {current + 1} of {line_count}, cut at {MAX_CHARS} characters]\n{text}"
+                    f'\n[...Line {current + 1} of "{file_path}" continues. To read the rest of it, call '
+                    f'get_file_content with offset={line_start + consumed}; the next line is start_line={current + 2}...]'
+                )
+            if lines and used + len(text) > MAX_CHARS:
+                break
+            lines.append(text)
+            used += len(text)
+            current += 1
+
+    content = f"[Lines {start_line}-{current} of {line_count}]\n" + "".join(lines)
+    if current < end_line:
+        content += (
+            f'\n[...File "{file_path}" truncated at {MAX_CHARS} characters. '
+            f'To continue, call get_file_content with start_line={current + 1}...]'
+        )
+    return content
+
+
+def get_file_content(working_directory, file_path, offset=None, length=None, start_line=None, end_line=None):
+    try:
         working_dir_abs = os.path.abspath(working_directory)
         # Zmieniam nazwę zmiennej na target_path, bo to plik, a nie katalog
         target_path = os.path.normpath(os.path.join(working_dir_abs, file_path))
-        
+
         # Zabezpieczenie przed wyjściem poza katalog (Path Traversal) - TO JEST DOBRZE
         if os.path.commonpath([working_dir_abs, target_path]) != working_dir_abs:
             return f'Error: Cannot read "{file_path}" as it is outside the permitted working directory'
-        
+
         if not os.path.isfile(target_path):
             return f'Error: File not found or is not a regular file: "{file_path}"'
-        
-        # --- POPRAWKA: Dodanie encoding i errors ---
-        with open(target_path, "r", encoding="utf-8", errors="replace") as f:
-            content = f.read(MAX_CHARS)
-            # Sprawdzenie, czy jest coś więcej
-            if f.read(1):
-                content += f'\n[...File "{file_path}" truncated at {MAX_CHARS} characters...]'
-        
-        return content
-    
+
+        # Tryb linii (start_line/end_line) albo bajtów (offset/length); domyślnie od początku pliku
+        if start_line is not None or end_line is not None:
+            return _read_lines(target_path, file_path, start_line, end_line)
+        return _read_bytes(target_path, file_path, max(0, int(offset or 0)), length)
+
     except Exception as e:
         return f"Error: reading file: {str(e)}"
-    
+
 
 schema_get_file_content = types.FunctionDeclaration(
     name="get_file_content",
-    description="Retrieves the content of a specified file relative to the working directory",
+    description=(
+        "Retrieves the content of a specified file relative to the working directory. "
+        f"Returns at most {MAX_CHARS} characters per call; for larger files use offset "
+        "(bytes) or start_line/end_line to page through the file - the truncation message "
+        "tells you where to continue."
+    ),
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -38,7 +222,23 @@ schema_get_file_content = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="File path to read content from, relative to the working directory",
             ),
+            "offset": types.Schema(
+                type=types.Type.INTEGER,
+                description="Byte offset to start reading from (default 0)",
+            ),
+            "length": types.Schema(
+                type=types.Type.INTEGER,
+                description=f"Number of bytes to read, at least 1 (max {MAX_CHARS}; default: up to {MAX_CHARS} characters)",
+            ),
+            "start_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="First line to read (1-based). Switches to line mode.",
+            ),
+            "end_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Last line to read, inclusive (default: end of file or size limit)",
+            ),
         },
         required=["file_path"], # Warto dodać
     ),
-)
\ No newline at end of file
+)
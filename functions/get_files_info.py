@@ -1,8 +1,61 @@
+import fnmatch
 import os
 
 from google.genai import types  # type: ignore[import]
 
-def get_files_info(working_directory, directory="."):
+# Tylko odczyt - call_functions może uruchamiać to narzędzie równolegle
+PARALLEL_SAFE = True
+
+# Domyślna i maksymalna liczba pozycji zwracanych w jednym wywołaniu
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+SORT_KEYS = {
+    "name": lambda item: item[0].lower(),
+    "size": lambda item: item[1],
+    "mtime": lambda item: item[3],
+}
+
+def _matches(patterns, rel_path, name):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+def _scan(target_dir, max_depth, include, exclude):
+    """
+    Przechodzi drzewo przez os.scandir - jeden stat na pozycję (z cache DirEntry).
+    Zwraca (lista (ścieżka_względna, rozmiar, is_dir, mtime), nieczytelne podkatalogi).
+    """
+    items = []
+    skipped = []
+    stack = [(target_dir, "", 1)]
+    while stack:
+        current, prefix, level = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            if not prefix:
+                raise  # Sam katalog docelowy - to błąd całego wywołania
+            # Np. PermissionError - jeden nieczytelny podkatalog nie przerywa listingu
+            skipped.append(prefix.rstrip("/"))
+            continue
+        with entries:
+            for entry in entries:
+                rel_path = prefix + entry.name
+                if exclude and _matches(exclude, rel_path, entry.name):
+                    continue
+
+                is_dir = entry.is_dir(follow_symlinks=False)
+                stat = entry.stat(follow_symlinks=False)
+
+                if not is_dir and include and not _matches(include, rel_path, entry.name):
+                    continue
+                if not (is_dir and include):
+                    items.append((rel_path, stat.st_size, is_dir, stat.st_mtime))
+
+                if is_dir and level < max_depth:
+                    stack.append((entry.path, rel_path + "/", level + 1))
+    return items, skipped
+
+def get_files_info(working_directory, directory=".", max_depth=1, include=None, exclude=None,
+                   sort_by="name", descending=False, offset=0, limit=DEFAULT_LIMIT):
     try:
         working_dir_abs = os.path.abspath(working_directory)
         target_dir = os.path.normpath(os.path.join(working_dir_abs, directory))
@@ -13,18 +66,29 @@ def get_files_info(working_directory, directory="."):
     
         if not os.path.isdir(target_dir):
             return f'Error: "{directory}" is not a directory'
-    
-        contents = os.listdir(target_dir)
+
+        if sort_by not in SORT_KEYS:
+            return f'Error: sort_by must be one of: {", ".join(SORT_KEYS)}'
+
+        max_depth = max(1, int(max_depth or 1))
+        offset = max(0, int(offset or 0))
+        limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+
+        items, skipped = _scan(target_dir, max_depth, list(include or []), list(exclude or []))
+        items.sort(key=SORT_KEYS[sort_by], reverse=bool(descending))
+        page = items[offset:offset + limit]
+
         lines = []
-        for content in contents:
-            item_path = os.path.join(target_dir, content)
-        
-            size = os.path.getsize(item_path)
+        for rel_path, size, is_dir, _ in page:
+            lines.append(f"- {rel_path}: file_size={size} bytes, is_dir={is_dir}")
 
-            if os.path.isdir(item_path):
-                lines.append(f"- {content}: file_size={size} bytes, is_dir=True")
-            else:
-                lines.append(f"- {content}: file_size={size} bytes, is_dir=False")
+        if offset + limit < len(items):
+            lines.append(
+                f"[Showing {offset + 1}-{offset + len(page)} of {len(items)} entries. "
+                f"To see more, call get_files_info with offset={offset + limit}]"
+            )
+        if skipped:
+            lines.append(f"[Skipped {len(skipped)} unreadable directories: {', '.join(sorted(skipped))}]")
         
         return "\n".join(lines)
     except Exception as e:
@@ -33,7 +97,10 @@ def get_files_info(working_directory, directory="."):
 
 schema_get_files_info = types.FunctionDeclaration(
     name="get_files_info",
-    description="Lists files in a specified directory relative to the working directory, providing file size and directory status",
+    description=(
+        "Lists files in a specified directory relative to the working directory, providing file size and directory status. "
+        "Can list a whole subtree in one call (max_depth), filter with glob patterns and page through large listings."
+    ),
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -41,6 +108,36 @@ schema_get_files_info = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="Directory path to list files from, relative to the working directory (default is the working directory itself)",
             ),
+            "max_depth": types.Schema(
+                type=types.Type.INTEGER,
+                description="How many directory levels to descend (default 1 = only this directory)",
+            ),
+            "include": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description="Glob patterns of files to list, e.g. ['*.py', 'data/*.csv'] (directories are then omitted)",
+            ),
+            "exclude": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description="Glob patterns of files or directories to skip, e.g. ['__pycache__', '.*']",
+            ),
+            "sort_by": types.Schema(
+                type=types.Type.STRING,
+                description="Sort key: 'name' (default), 'size' or 'mtime'",
+            ),
+            "descending": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Sort in descending order (default false)",
+            ),
+            "offset": types.Schema(
+                type=types.Type.INTEGER,
+                description="Number of entries to skip (for paging)",
+            ),
+            "limit": types.Schema(
+                type=types.Type.INTEGER,
+                description=f"Maximum number of entries to return (default {DEFAULT_LIMIT}, max {MAX_LIMIT})",
+            ),
         },
     ),
 )
\ No newline at end of file
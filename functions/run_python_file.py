@@ -1,9 +1,168 @@
+import codecs
 import os
 import subprocess
 import sys  
+import threading
+import time
+from collections import deque
 from google.genai import types  # type: ignore[import]
 
-def run_python_file(working_directory, file_path, args=None):
+import interpreter_pool
+import workspace_index
+from config import PYTHON_POOL_ENABLED, RUN_OUTPUT_HEAD_BYTES, RUN_OUTPUT_TAIL_BYTES, RUN_LOGS_KEEP, RUN_LOG_MAX_BYTES
+
+RUN_TIMEOUT = 30
+# Pełne wyjście skryptów trafia tutaj (względem workspace); model dostaje tylko początek i koniec
+RUN_LOGS_DIR = ".run_logs"
+# Co ile sekund doczytujemy wyjście i wołamy on_output
+POLL_INTERVAL = 0.1
+
+class _StreamCapture:
+    """
+    Przyrostowo czyta plik z wyjściem skryptu. W pamięci trzyma tylko pierwsze
+    head_bytes bajtów i ring buffer z ostatnimi tail_bytes - reszta zostaje w pliku.
+    Plik rośnie najwyżej do RUN_LOG_MAX_BYTES: skrypt dopisuje na koniec (O_APPEND),
+    a po przeczytaniu nadwyżki przycinamy go z powrotem do limitu; close() dokłada końcówkę.
+    """
+
+    def __init__(self, path, stream_name, on_output=None):
+        self.path = path
+        self.stream_name = stream_name
+        self.on_output = on_output
+        self.total = 0
+        self._file = open(path, "r+b")
+        self.log_cut = False
+        self._head = bytearray()
+        self._tail = deque()
+        self._tail_size = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def poll(self):
+        while True:
+            chunk = self._file.read(65536)
+            if not chunk:
+                if self._cap_log():
+                    continue
+                return
+            self.total += len(chunk)
+
+            if self.on_output:
+                text = self._decoder.decode(chunk)
+                if text:
+                    self.on_output(self.stream_name, text)
+
+            missing_head = RUN_OUTPUT_HEAD_BYTES - len(self._head)
+            if missing_head > 0:
+                self._head += chunk[:missing_head]
+                chunk = chunk[missing_head:]
+            if chunk:
+                self._tail.append(chunk)
+                self._tail_size += len(chunk)
+                while self._tail_size - len(self._tail[0]) >= RUN_OUTPUT_TAIL_BYTES:
+                    self._tail_size -= len(self._tail.popleft())
+
+    def _cap_log(self):
+        """Przycina log do RUN_LOG_MAX_BYTES. True, gdy skrypt zdążył dopisać coś do doczytania."""
+        position = self._file.tell()
+        if position <= RUN_LOG_MAX_BYTES:
+            return False
+        if os.fstat(self._file.fileno()).st_size > position:
+            return True
+        self._file.truncate(RUN_LOG_MAX_BYTES)
+        self._file.seek(RUN_LOG_MAX_BYTES)
+        self.log_cut = True
+        return False
+
+    @property
+    def truncated(self):
+        return self.total > len(self._head) + RUN_OUTPUT_TAIL_BYTES
+
+    def text(self, log_name):
+        tail = b"".join(self._tail)
+        if not self.truncated:
+            return (bytes(self._head) + tail).decode("utf-8", errors="replace")
+        tail = tail[-RUN_OUTPUT_TAIL_BYTES:]
+        skipped = self.total - len(self._head) - len(tail)
+        return (
+            self._head.decode("utf-8", errors="replace")
+            + f"\n[...pominięto {skipped} bajtów - {'początek i koniec' if self.log_cut else 'pełne'} wyjścia w {log_name}...]\n"
+            + tail.decode("utf-8", errors="replace")
+        )
+
+    def close(self):
+        try:
+            if self.log_cut:
+                tail = b"".join(self._tail)[-RUN_OUTPUT_TAIL_BYTES:]
+                skipped = self.total - RUN_LOG_MAX_BYTES - len(tail)
+                self._file.seek(0, os.SEEK_END)
+                self._file.write(
+                    f"\n[...log przycięty do {RUN_LOG_MAX_BYTES} bajtów - pominięto {skipped} bajtów, "
+                    f"dalej ostatnie {len(tail)}...]\n".encode("utf-8") + tail
+                )
+        finally:
+            self._file.close()
+
+def _prune_logs(logs_dir):
+    """Zostawia tylko RUN_LOGS_KEEP najnowszych logów."""
+    with os.scandir(logs_dir) as entries:
+        logs = sorted(entries, key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in logs[RUN_LOGS_KEEP:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+def _start_subprocess(command, cwd, stdout_path, stderr_path, result):
+    """Klasyczna ścieżka: nowy interpreter dla każdego uruchomienia."""
+    # Dopisywanie (O_APPEND) - _StreamCapture przycina za duży log w trakcie działania skryptu
+    with open(stdout_path, "ab") as stdout_file, open(stderr_path, "ab") as stderr_file:
+        process = subprocess.Popen(
+            command, cwd=cwd, stdout=stdout_file, stderr=stderr_file, env=interpreter_pool.script_environment()
+        )
+    try:
+        result["exit_code"] = process.wait(timeout=RUN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        result["timed_out"] = True
+
+def _start_in_pool(absolute_file_path, args, cwd, stdout_path, stderr_path, result):
+    """Uruchomienie w świeżym procesie z rozgrzanej zygoty (biblioteki już zaimportowane)."""
+    try:
+        result["exit_code"], result["timed_out"] = interpreter_pool.get_pool().run_script(
+            absolute_file_path, args, cwd, stdout_path, stderr_path, RUN_TIMEOUT
+        )
+    except interpreter_pool.WorkerUnavailable as e:
+        result["pool_error"] = e
+    except Exception as e:
+        # Skrypt mógł już ruszyć w puli - nie uruchamiamy go drugi raz
+        result["error"] = e
+
+def _run_and_capture(runner, stdout_path, stderr_path, on_output):
+    """
+    Uruchamia runner w tle, a w bieżącym wątku doczytuje wyjście (i woła on_output).
+    Zwraca (wynik_runnera, capture_stdout, capture_stderr).
+    """
+    for path in (stdout_path, stderr_path):
+        open(path, "wb").close()
+    result = {"exit_code": None, "timed_out": False}
+    captures = [_StreamCapture(stdout_path, "stdout", on_output), _StreamCapture(stderr_path, "stderr", on_output)]
+
+    worker = threading.Thread(target=runner, args=(result,), daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(POLL_INTERVAL)
+            for capture in captures:
+                capture.poll()
+        for capture in captures:
+            capture.poll()
+    finally:
+        for capture in captures:
+            capture.close()
+    return result, captures[0], captures[1]
+
+def run_python_file(working_directory, file_path, args=None, on_output=None):
     try:   
         working_dir_abs = os.path.abspath(working_directory)
         absolute_file_path = os.path.normpath(os.path.join(working_dir_abs, file_path))
@@ -19,40 +178,62 @@ def run_python_file(working_directory, file_path, args=None):
         command = [sys.executable, absolute_file_path]
         if args:
             command.extend(args)
-            
-        result = subprocess.run(
-            command, 
-            capture_output=True, 
-            text=True, 
-            cwd=working_dir_abs, 
-            timeout=30,
-            encoding='utf-8',
-            errors='replace' 
+
+        logs_dir = os.path.join(working_dir_abs, RUN_LOGS_DIR)
+        os.makedirs(logs_dir, exist_ok=True)
+        log_stem = f"{os.path.splitext(os.path.basename(file_path))[0]}-{time.time_ns()}"
+        stdout_path = os.path.join(logs_dir, f"{log_stem}.stdout.log")
+        stderr_path = os.path.join(logs_dir, f"{log_stem}.stderr.log")
+
+        def subprocess_runner(result):
+            _start_subprocess(command, working_dir_abs, stdout_path, stderr_path, result)
+
+        def pool_runner(result):
+            _start_in_pool(absolute_file_path, args, working_dir_abs, stdout_path, stderr_path, result)
+
+        use_pool = PYTHON_POOL_ENABLED and interpreter_pool.is_supported()
+        result, stdout_capture, stderr_capture = _run_and_capture(
+            pool_runner if use_pool else subprocess_runner, stdout_path, stderr_path, on_output
         )
+        if "pool_error" in result:
+            # Zadanie nie trafiło do puli - wracamy do zwykłego uruchomienia
+            print(f"  [RUN] Pula interpreterów niedostępna ({result['pool_error']}), używam subprocess.")
+            result, stdout_capture, stderr_capture = _run_and_capture(
+                subprocess_runner, stdout_path, stderr_path, on_output
+            )
+
+        # Skrypt mógł utworzyć albo zmienić pliki - indeks wyszukiwania przeskanuje workspace
+        workspace_index.notify_changed(working_dir_abs)
+
+        # Pełny log zostaje tylko wtedy, gdy model dostał skróconą wersję
+        for capture in (stdout_capture, stderr_capture):
+            if not capture.truncated:
+                os.remove(capture.path)
+        _prune_logs(logs_dir)
+        if "error" in result:
+            raise result["error"]
 
         lines = []
 
-        if result.returncode != 0:
-            lines.append(f"Exit Code: {result.returncode}")
+        if result["timed_out"]:
+            # Wyjście sprzed przekroczenia czasu zwykle pokazuje, gdzie skrypt utknął
+            lines.append(f"Error: Execution timed out after {RUN_TIMEOUT} seconds. Infinite loop suspected.")
+        elif result["exit_code"] != 0:
+            lines.append(f"Exit Code: {result['exit_code']}")
 
-        if result.stdout:
-            stdout = result.stdout.strip()
-            if stdout:
-                lines.append(f"STDOUT:\n{stdout}")
+        stdout = stdout_capture.text(os.path.join(RUN_LOGS_DIR, os.path.basename(stdout_path))).strip()
+        if stdout:
+            lines.append(f"STDOUT:\n{stdout}")
         
-        if result.stderr:
-            stderr_text = result.stderr.strip()
-            if stderr_text:
-                lines.append(f"STDERR:\n{stderr_text}")
+        stderr_text = stderr_capture.text(os.path.join(RUN_LOGS_DIR, os.path.basename(stderr_path))).strip()
+        if stderr_text:
+            lines.append(f"STDERR:\n{stderr_text}")
         
         if not lines:
             lines.append("Script executed successfully but produced no output.")
 
         return "\n".join(lines)
 
-    except subprocess.TimeoutExpired:
-        return f"Error: Execution timed out after 30 seconds. Infinite loop suspected."
-        
     except Exception as e:
         return f"Error: executing Python file: {e}"
     
@@ -0,0 +1,171 @@
+import fnmatch
+import os
+import re
+from collections import deque
+
+from google.genai import types  # type: ignore[import]
+
+import workspace_index
+from config import MAX_CHARS
+
+# Tylko odczyt - call_functions może uruchamiać to narzędzie równolegle
+PARALLEL_SAFE = True
+
+DEFAULT_MAX_RESULTS = 50
+MAX_CONTEXT_LINES = 10
+MAX_LINE_CHARS = 300
+
+
+def _clip(line):
+    line = line.rstrip("\r\n")
+    return line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + "..."
+
+
+def _scan(path, query, context_lines, keep):
+    """
+    Strumieniowe przejście pliku (duże logi/CSV nie trafiają do pamięci w całości).
+    Zwraca (liczba linii, numery wszystkich trafień, {numer: linia} - pierwsze `keep` trafień z kontekstem).
+    """
+    hits = []
+    kept = {}
+    before = deque(maxlen=context_lines)
+    after = 0
+    count = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for count, line in enumerate(f, start=1):
+            i = count - 1
+            if query.search(line):
+                hits.append(i)
+                if len(hits) <= keep:
+                    kept.update(before)
+                    before.clear()
+                    kept[i] = line
+                    after = context_lines
+                    continue
+            if after:
+                kept[i] = line
+                after -= 1
+            else:
+                before.append((i, line))
+    return count, hits, kept
+
+
+def search_files(working_directory, pattern, regex=False, case_sensitive=False, include=None,
+                 context_lines=2, max_results=DEFAULT_MAX_RESULTS):
+    try:
+        if not pattern:
+            return "Error: pattern must not be empty"
+        try:
+            query = workspace_index.compile_query(pattern, regex, case_sensitive)
+        except re.error as e:
+            return f"Error: invalid regular expression: {e}"
+
+        context_lines = max(0, min(int(context_lines or 0), MAX_CONTEXT_LINES))
+        max_results = max(1, int(max_results or DEFAULT_MAX_RESULTS))
+        include = list(include or [])
+
+        index = workspace_index.get_index(working_directory)
+        index.refresh()
+        candidates = index.candidates(workspace_index.required_trigrams(pattern, regex))
+
+        output = []
+        used = 0
+        shown = 0
+        total_matches = 0
+        matched_files = 0
+        budget_exhausted = False
+        for rel_path in candidates:
+            if include and not any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(os.path.basename(rel_path), p) for p in include):
+                continue
+            keep = 0 if budget_exhausted else max_results - shown
+            try:
+                line_count, hits, lines = _scan(os.path.join(index.root, rel_path), query, context_lines, keep)
+            except OSError:
+                continue
+            if not hits:
+                continue
+            matched_files += 1
+            total_matches += len(hits)
+            if budget_exhausted:
+                continue  # Dalej tylko liczymy trafienia do podsumowania
+
+            taken = hits[:max_results - shown]
+            hit_set = set(taken)
+            # Sąsiadujące trafienia łączymy w jeden blok kontekstu (jak grep -C)
+            ranges = []
+            for i in taken:
+                start, end = max(0, i - context_lines), min(line_count - 1, i + context_lines)
+                if ranges and start <= ranges[-1][1] + 1:
+                    ranges[-1][1] = end
+                else:
+                    ranges.append([start, end])
+
+            for start, end in ranges:
+                block = []
+                block_hits = 0
+                for i in range(start, end + 1):
+                    separator = ":" if i in hit_set else "-"
+                    block_hits += i in hit_set
+                    block.append(f"{rel_path}{separator}{i + 1}{separator} {_clip(lines[i])}")
+                text = "\n".join(block)
+                if used + len(text) > MAX_CHARS:
+                    budget_exhausted = True
+                    break
+                output.append(text)
+                used += len(text)
+                shown += block_hits
+            if shown >= max_results:
+                budget_exhausted = True
+
+        if not output:
+            stats = index.stats()
+            large = f", {stats['large']} large files scanned without the index" if stats["large"] else ""
+            return f'No matches for "{pattern}" ({stats["files"]} files indexed{large})'
+
+        summary = f"[Found {total_matches} matches in {matched_files} files"
+        if shown < total_matches:
+            summary += f"; showing {shown} - narrow the pattern or use include to see the rest"
+        return "\n--\n".join(output) + "\n" + summary + "]"
+    except Exception as e:
+        return f"Error: searching files: {e}"
+
+
+schema_search_files = types.FunctionDeclaration(
+    name="search_files",
+    description=(
+        "Searches the contents of all text files in the working directory for a substring or regular expression "
+        "(like grep -n -C) using a prebuilt index. Returns 'path:line: text' for matches and 'path-line- text' for context. "
+        "Use this instead of reading files one by one to find where something is defined or used."
+    ),
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "pattern": types.Schema(
+                type=types.Type.STRING,
+                description="Text to search for (or a Python regular expression if regex is true). Matched line by line.",
+            ),
+            "regex": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Treat pattern as a regular expression (default false = plain substring)",
+            ),
+            "case_sensitive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Case-sensitive matching (default false)",
+            ),
+            "include": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description="Optional glob patterns limiting which files are searched, e.g. ['*.py']",
+            ),
+            "context_lines": types.Schema(
+                type=types.Type.INTEGER,
+                description=f"Lines of context before and after each match (default 2, max {MAX_CONTEXT_LINES})",
+            ),
+            "max_results": types.Schema(
+                type=types.Type.INTEGER,
+                description=f"Maximum number of matching lines to show (default {DEFAULT_MAX_RESULTS})",
+            ),
+        },
+        required=["pattern"],
+    ),
+)
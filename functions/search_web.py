@@ -1,8 +1,105 @@
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests # type: ignore[import]
 from google.genai import types # type: ignore[import]
 
-def search_web(query, count=5):
+from config import WORKING_DIR, SEARCH_CACHE_TTL, SEARCH_CACHE_SIZE, SEARCH_RATE_LIMIT, SEARCH_BATCH_WORKERS
+
+# Tylko odczyt - call_functions może uruchamiać to narzędzie równolegle
+PARALLEL_SAFE = True
+
+# Adres można podmienić (np. na lokalny serwer testowy)
+SEARCH_URL = os.environ.get("BRAVE_SEARCH_URL", "https://api.search.brave.com/res/v1/web/search")
+# Cache leży w workspace - sesje usługi (service.py) mają każda swój
+SEARCH_CACHE_FILE = ".search_cache.json"
+MAX_BATCH_QUERIES = 10
+# Na 429 czekamy i ponawiamy raz, o ile serwer nie każe czekać dłużej niż tyle sekund
+MAX_RETRY_AFTER = 5
+
+# Wspólna sesja HTTP - keep-alive zamiast nowego połączenia TLS przy każdym zapytaniu
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=SEARCH_BATCH_WORKERS))
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=SEARCH_BATCH_WORKERS))
+
+_cache_lock = threading.Lock()
+# ścieżka pliku cache -> {klucz: [czas, wynik]}
+_caches = {}
+
+
+class _RateLimiter:
+    """Rozkłada zapytania w czasie, żeby nie wpaść w limit 429 Brave API."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = _RateLimiter(SEARCH_RATE_LIMIT)
+
+
+def _cache_key(query, count):
+    return f"{' '.join(query.lower().split())}|{count}"
+
+
+def _cache_path(working_directory):
+    return os.path.join(os.path.abspath(working_directory), SEARCH_CACHE_FILE)
+
+
+def _load_cache(path):
+    cache = _caches.get(path)
+    if cache is None:
+        cache = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+            except Exception:
+                cache = {}
+        _caches[path] = cache
+    return cache
+
+
+def _cache_get(path, key):
+    with _cache_lock:
+        entry = _load_cache(path).get(key)
+        if entry and time.time() - entry[0] < SEARCH_CACHE_TTL:
+            return entry[1]
+        return None
+
+
+def _cache_put(path, key, value):
+    with _cache_lock:
+        cache = _load_cache(path)
+        now = time.time()
+        cache[key] = [now, value]
+        # Porządki: wygasłe wpisy i najstarsze ponad limit
+        for stale in [k for k, (stamp, _) in cache.items() if now - stamp >= SEARCH_CACHE_TTL]:
+            del cache[stale]
+        if len(cache) > SEARCH_CACHE_SIZE:
+            for old in sorted(cache, key=lambda k: cache[k][0])[:len(cache) - SEARCH_CACHE_SIZE]:
+                del cache[old]
+        try:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            pass  # Cache jest tylko optymalizacją
+
+
+def search_web(query, count=5, working_directory=WORKING_DIR):
     """
     Wyszukuje informacje w internecie używając Brave Search API.
     Przydatne do zdobywania aktualnych informacji, dokumentacji lub rozwiązywania błędów.
@@ -11,24 +108,42 @@ def search_web(query, count=5):
     if not api_key:
         return "Error: BRAVE_API_KEY not found in environment variables."
 
-    url = "https://api.search.brave.com/res/v1/web/search"
+    count = min(int(count), 10)  # Limit max 10 wyników
+    cache_key = _cache_key(query, count)
+    cache_path = _cache_path(working_directory)
+    cached = _cache_get(cache_path, cache_key)
+    if cached is not None:
+        return cached
+
     headers = {
         "X-Subscription-Token": api_key,
         "Accept": "application/json",
     }
     params = {
         "q": query,
-        "count": min(count, 10)  # Limit max 10 wyników
+        "count": count
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        for attempt in range(2):
+            _rate_limiter.wait()
+            response = _session.get(SEARCH_URL, headers=headers, params=params, timeout=10)
+            if response.status_code != 429 or attempt:
+                break
+            try:
+                retry_after = float(response.headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+            if retry_after > MAX_RETRY_AFTER:
+                break
+            time.sleep(retry_after)
         
         if response.status_code == 200:
             data = response.json()
             results = data.get("web", {}).get("results", [])
             
             if not results:
+                _cache_put(cache_path, cache_key, "No results found.")
                 return "No results found."
             
             # Formatujemy wyniki w czytelną listę dla LLM
@@ -39,7 +154,9 @@ def search_web(query, count=5):
                 desc = result.get("description", "No description")
                 formatted_results.append(f"{i}. [{title}]({link})\n   {desc}")
             
-            return "\n\n".join(formatted_results)
+            formatted = "\n\n".join(formatted_results)
+            _cache_put(cache_path, cache_key, formatted)
+            return formatted
         
         elif response.status_code == 429:
             return "Error: Rate limit exceeded for Brave Search API."
@@ -51,6 +168,24 @@ def search_web(query, count=5):
     except Exception as e:
         return f"Error connecting to search API: {str(e)}"
 
+def search_web_batch(queries, count=5, working_directory=WORKING_DIR):
+    """
+    Wykonuje kilka wyszukiwań naraz (równolegle, z limitem zapytań na sekundę).
+    Powtórzone zapytania są wysyłane tylko raz.
+    """
+    unique = {}
+    for query in queries or []:
+        if query and query.strip():
+            unique.setdefault(_cache_key(query, count), query)
+    queries = list(unique.values())[:MAX_BATCH_QUERIES]
+    if not queries:
+        return "Error: No queries given."
+
+    with ThreadPoolExecutor(max_workers=min(len(queries), SEARCH_BATCH_WORKERS)) as executor:
+        results = list(executor.map(lambda q: search_web(q, count, working_directory), queries))
+
+    return "\n\n".join(f"### {query}\n{result}" for query, result in zip(queries, results))
+
 # Definicja schematu dla Gemini
 schema_search_web = types.FunctionDeclaration(
     name="search_web",
@@ -69,4 +204,24 @@ schema_search_web = types.FunctionDeclaration(
         },
         required=["query"],
     ),
+)
+
+schema_search_web_batch = types.FunctionDeclaration(
+    name="search_web_batch",
+    description="Runs several web searches at once (in parallel). Prefer this over many separate search_web calls when researching a topic.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "queries": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description=f"List of search queries (max {MAX_BATCH_QUERIES}).",
+            ),
+            "count": types.Schema(
+                type=types.Type.INTEGER,
+                description="Number of results per query (default 5).",
+            ),
+        },
+        required=["queries"],
+    ),
 )
\ No newline at end of file
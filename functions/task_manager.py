@@ -1,63 +1,219 @@
 import json
 import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from google.genai import types # type: ignore[import]
 
+# Zadania trzymamy w SQLite (WAL): zapis jednego zadania nie przepisuje całej listy,
+# a równoległe sesje/wątki nie nadpisują sobie nawzajem zmian
+TASKS_DB = "tasks.db"
+LEGACY_TASKS_FILE = "tasks.json"
+TASK_STATUSES = ("pending", "in_progress", "done", "blocked", "cancelled")
+STATUS_ICONS = {"pending": "⬜", "in_progress": "🔄", "done": "✅", "blocked": "⛔", "cancelled": "✖️"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS task_dependencies (
+    task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    depends_on INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    PRIMARY KEY (task_id, depends_on)
+);
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
 def _get_tasks_path(working_directory):
-    return os.path.join(working_directory, "tasks.json")
+    return os.path.join(working_directory, TASKS_DB)
 
-def _load_tasks(working_directory):
-    path = _get_tasks_path(working_directory)
-    if not os.path.exists(path):
-        return []
+def _migrate_legacy(working_directory, conn):
+    """Jednorazowe przeniesienie starego tasks.json (z zachowaniem ID)."""
+    legacy_path = os.path.join(working_directory, LEGACY_TASKS_FILE)
+    if not os.path.exists(legacy_path):
+        return
     try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+        with open(legacy_path, 'r') as f:
+            tasks = json.load(f)
+    except (OSError, ValueError):
+        tasks = []
+    now = time.time()
+    for t in tasks:
+        status = t.get("status") if t.get("status") in TASK_STATUSES else "pending"
+        conn.execute(
+            "INSERT OR IGNORE INTO tasks (id, description, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (int(t["id"]), str(t["description"]), status, now, now),
+        )
+    os.replace(legacy_path, legacy_path + ".migrated")
 
-def _save_tasks(working_directory, tasks):
+@contextmanager
+def _connect(working_directory, write=False):
     path = _get_tasks_path(working_directory)
-    with open(path, 'w') as f:
-        json.dump(tasks, f, indent=2)
+    is_new = not os.path.exists(path)
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        with _init_lock:
+            if is_new or path not in _initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                conn.execute("BEGIN IMMEDIATE")
+                _migrate_legacy(working_directory, conn)
+                conn.execute("COMMIT")
+                _initialized.add(path)
+        # BEGIN IMMEDIATE - blokada zapisu od razu, więc odczyt-modyfikacja-zapis jest atomowy
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
 
-def add_task(working_directory, description):
+def _existing_ids(conn, ids):
+    if not ids:
+        return set()
+    placeholders = ",".join("?" * len(ids))
+    return {row[0] for row in conn.execute(f"SELECT id FROM tasks WHERE id IN ({placeholders})", list(ids))}
+
+def _insert_task(conn, description, depends_on):
+    now = time.time()
+    task_id = conn.execute(
+        "INSERT INTO tasks (description, status, created_at, updated_at) VALUES (?, 'pending', ?, ?)",
+        (description, now, now),
+    ).lastrowid
+    conn.executemany(
+        "INSERT OR IGNORE INTO task_dependencies (task_id, depends_on) VALUES (?, ?)",
+        [(task_id, dep) for dep in depends_on],
+    )
+    return task_id
+
+def _set_status(working_directory, task_ids, status):
+    ids = [int(task_id) for task_id in task_ids]
+    if not ids:
+        return "Error: No task IDs given."
+    with _connect(working_directory, write=True) as conn:
+        found = _existing_ids(conn, ids)
+        missing = [task_id for task_id in ids if task_id not in found]
+        if missing:
+            # Wszystko albo nic - żeby plan nie został zaktualizowany tylko częściowo
+            return f"Error: Task ID(s) {', '.join(map(str, missing))} not found. Nothing was changed."
+        conn.executemany(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE id = ?",
+            [(status, time.time(), task_id) for task_id in ids],
+        )
+    return ids
+
+def add_task(working_directory, description, depends_on=None):
     """Adds a new task to the todo list."""
-    tasks = _load_tasks(working_directory)
-    new_id = len(tasks) + 1
-    tasks.append({"id": new_id, "description": description, "status": "pending"})
-    _save_tasks(working_directory, tasks)
+    depends_on = [int(dep) for dep in depends_on or []]
+    with _connect(working_directory, write=True) as conn:
+        missing = set(depends_on) - _existing_ids(conn, depends_on)
+        if missing:
+            return f"Error: Dependency task ID(s) {', '.join(map(str, sorted(missing)))} not found."
+        new_id = _insert_task(conn, description, depends_on)
     return f"Task added: [ID: {new_id}] {description}"
 
+def add_tasks(working_directory, tasks):
+    """Adds several tasks in one call (one transaction)."""
+    if not tasks:
+        return "Error: No tasks given."
+    try:
+        added = _add_tasks(working_directory, tasks)
+    except ValueError as e:
+        return f"Error: {e}. No tasks were added."
+    return "Tasks added:\n" + "\n".join(f"[ID: {task_id}] {description}" for task_id, description in added)
+
+def _add_tasks(working_directory, tasks):
+    added = []
+    with _connect(working_directory, write=True) as conn:
+        for position, task in enumerate(tasks, start=1):
+            if isinstance(task, str):
+                task = {"description": task}
+            description = str(task.get("description") or "").strip()
+            if not description:
+                raise ValueError(f"task #{position} has no description")
+
+            depends_on = [int(dep) for dep in task.get("depends_on") or []]
+            missing = set(depends_on) - _existing_ids(conn, depends_on)
+            if missing:
+                raise ValueError(f"task #{position} depends on unknown task ID(s) {', '.join(map(str, sorted(missing)))}")
+            # depends_on_steps: numery pozycji (od 1) w tej samej liście - ID nie są jeszcze znane
+            for step in task.get("depends_on_steps") or []:
+                step = int(step)
+                if not 1 <= step < position:
+                    raise ValueError(f"task #{position} can only depend on earlier steps (got {step})")
+                depends_on.append(added[step - 1][0])
+
+            added.append((_insert_task(conn, description, depends_on), description))
+    return added
+
 def list_tasks(working_directory):
     """Lists all current tasks and their status."""
-    tasks = _load_tasks(working_directory)
+    with _connect(working_directory) as conn:
+        tasks = conn.execute("SELECT id, description, status FROM tasks ORDER BY id").fetchall()
+        dependencies = {}
+        for row in conn.execute(
+            "SELECT d.task_id, d.depends_on, t.status FROM task_dependencies d JOIN tasks t ON t.id = d.depends_on"
+        ):
+            dependencies.setdefault(row["task_id"], []).append((row["depends_on"], row["status"]))
     if not tasks:
         return "Task list is empty."
     
     result = "Current Plan:\n"
     for t in tasks:
-        icon = "✅" if t["status"] == "done" else "⬜"
-        result += f"{icon} {t['id']}. {t['description']} ({t['status']})\n"
+        icon = STATUS_ICONS.get(t["status"], "⬜")
+        line = f"{icon} {t['id']}. {t['description']} ({t['status']})"
+        deps = dependencies.get(t["id"])
+        if deps:
+            waiting = [str(dep) for dep, status in deps if status != "done"]
+            line += f" [depends on: {', '.join(str(dep) for dep, _ in deps)}"
+            if waiting and t["status"] != "done":
+                line += f"; waiting for: {', '.join(waiting)}"
+            line += "]"
+        result += line + "\n"
     return result
 
 def finish_task(working_directory, task_id):
     """Marks a task as done."""
-    tasks = _load_tasks(working_directory)
-    found = False
-    for t in tasks:
-        if t["id"] == int(task_id):
-            t["status"] = "done"
-            found = True
-            break
-    
-    if found:
-        _save_tasks(working_directory, tasks)
-        return f"Task {task_id} marked as done."
-    return f"Error: Task ID {task_id} not found."
+    result = _set_status(working_directory, [task_id], "done")
+    if isinstance(result, str):
+        return f"Error: Task ID {task_id} not found."
+    return f"Task {task_id} marked as done."
+
+def finish_tasks(working_directory, task_ids):
+    """Marks several tasks as done in one call."""
+    result = _set_status(working_directory, task_ids, "done")
+    if isinstance(result, str):
+        return result
+    return f"Tasks {', '.join(map(str, result))} marked as done."
+
+def set_task_status(working_directory, task_ids, status):
+    """Sets the status of one or more tasks."""
+    if status not in TASK_STATUSES:
+        return f"Error: Unknown status '{status}'. Use one of: {', '.join(TASK_STATUSES)}."
+    result = _set_status(working_directory, task_ids, status)
+    if isinstance(result, str):
+        return result
+    return f"Tasks {', '.join(map(str, result))} set to {status}."
 
 def clear_tasks(working_directory):
     """Clears all tasks."""
-    _save_tasks(working_directory, [])
+    with _connect(working_directory, write=True) as conn:
+        conn.execute("DELETE FROM task_dependencies")
+        conn.execute("DELETE FROM tasks")
+        # Nowy plan znów numerujemy od 1
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
     return "Task list cleared."
 
 # === SCHEMATY DLA GEMINI ===
@@ -69,12 +225,50 @@ schema_add_task = types.FunctionDeclaration(
         type=types.Type.OBJECT,
         properties={
             "description": types.Schema(type=types.Type.STRING, description="Description of the task to be done."),
+            "depends_on": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.INTEGER),
+                description="Optional IDs of tasks that must be finished before this one.",
+            ),
             "working_directory": types.Schema(type=types.Type.STRING) # Injectowane automatycznie
         },
         required=["description"]
     )
 )
 
+schema_add_tasks = types.FunctionDeclaration(
+    name="add_tasks",
+    description="Adds a whole plan (several tasks) in one call. Prefer this over calling add_task repeatedly.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "tasks": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "description": types.Schema(type=types.Type.STRING, description="Description of the task."),
+                        "depends_on": types.Schema(
+                            type=types.Type.ARRAY,
+                            items=types.Schema(type=types.Type.INTEGER),
+                            description="IDs of already existing tasks this one depends on.",
+                        ),
+                        "depends_on_steps": types.Schema(
+                            type=types.Type.ARRAY,
+                            items=types.Schema(type=types.Type.INTEGER),
+                            description="1-based positions of earlier tasks in this same list that this one depends on.",
+                        ),
+                    },
+                    required=["description"],
+                ),
+                description="Tasks to add, in order.",
+            ),
+            "working_directory": types.Schema(type=types.Type.STRING) # Injectowane automatycznie
+        },
+        required=["tasks"]
+    )
+)
+
 schema_list_tasks = types.FunctionDeclaration(
     name="list_tasks",
     description="Shows the current status of all tasks.",
@@ -99,6 +293,44 @@ schema_finish_task = types.FunctionDeclaration(
     )
 )
 
+schema_finish_tasks = types.FunctionDeclaration(
+    name="finish_tasks",
+    description="Marks several tasks as completed in one call.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "task_ids": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.INTEGER),
+                description="IDs of the tasks to complete.",
+            ),
+            "working_directory": types.Schema(type=types.Type.STRING) # Injectowane automatycznie
+        },
+        required=["task_ids"]
+    )
+)
+
+schema_set_task_status = types.FunctionDeclaration(
+    name="set_task_status",
+    description="Sets the status of one or more tasks (pending, in_progress, done, blocked, cancelled).",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "task_ids": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.INTEGER),
+                description="IDs of the tasks to update.",
+            ),
+            "status": types.Schema(
+                type=types.Type.STRING,
+                description="New status: pending, in_progress, done, blocked or cancelled.",
+            ),
+            "working_directory": types.Schema(type=types.Type.STRING) # Injectowane automatycznie
+        },
+        required=["task_ids", "status"]
+    )
+)
+
 schema_clear_tasks = types.FunctionDeclaration(
     name="clear_tasks",
     description="Deletes all tasks from the plan. Use before starting a completely new project.",
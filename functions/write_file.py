@@ -1,6 +1,7 @@
 import os
 from google.genai import types  # type: ignore[import]
 from functions.security_utils import get_safe_path  
+import workspace_index
 
 def write_file(working_directory, file_path, content):
     try:
@@ -19,6 +20,9 @@ def write_file(working_directory, file_path, content):
         with open(abs_file_path, "w", encoding="utf-8") as f: 
             f.write(content)
 
+        # Indeks wyszukiwania (search_files) aktualizujemy od razu, bez czekania na skan
+        workspace_index.notify_write(abs_working_dir, abs_file_path)
+
         return f'Successfully wrote to "{file_path}" ({len(content)} characters written)'
     except Exception as e:
         return f"Error: writing to file: {e}"
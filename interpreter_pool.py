@@ -0,0 +1,199 @@
+"""
+Pula "rozgrzanych" interpreterów dla run_python_file.
+
+Każdy worker to proces-zygota (w stylu forkserver): raz importuje ciężkie biblioteki
+(PYTHON_POOL_PRELOAD - pandas, numpy, matplotlib...), a potem dla każdego zadania
+robi fork(). Skrypt agenta działa więc w świeżym procesie potomnym - z własnym cwd,
+osobnym stdout/stderr, kodem wyjścia i limitem czasu - ale bez kosztu startu
+interpretera i importów. Zygota jest wymieniana po PYTHON_POOL_MAX_JOBS zadaniach.
+
+Zygota startuje z interpreter_zygote.py, który importuje tylko bibliotekę standardową,
+a katalog projektu nie trafia do jej sys.path - skrypt z `import config` dostaje
+plik z workspace, a nie moduł agenta (tak jak przy zwykłym subprocess).
+
+Działa tylko na systemach z fork() (Linux/macOS); gdzie indziej run_python_file
+używa zwykłego subprocess.
+"""
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+
+from config import PROJECT_ROOT, PYTHON_POOL_SIZE, PYTHON_POOL_MAX_JOBS, PYTHON_POOL_PRELOAD
+
+# Dodatkowy czas na odpowiedź zygoty ponad limit skryptu
+RESPONSE_GRACE = 5
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpreter_zygote.py")
+
+
+def is_supported():
+    return hasattr(os, "fork") and os.name == "posix"
+
+
+def script_environment():
+    """Środowisko skryptów agenta - to samo w puli i w zwykłym subprocess (matplotlib bez okien)."""
+    env = dict(os.environ)
+    env.setdefault("MPLBACKEND", "Agg")
+    return env
+
+
+# === STRONA AGENTA ===
+
+class WorkerUnavailable(RuntimeError):
+    """Zadanie nie trafiło do zygoty - skrypt na pewno nie ruszył, można go uruchomić inaczej."""
+
+
+class _Zygote:
+    def __init__(self, preload):
+        self.jobs = 0
+        self.child_pid = None
+        self.proc = subprocess.Popen(
+            [sys.executable, ZYGOTE_SCRIPT, json.dumps(preload)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=PROJECT_ROOT,
+            env=script_environment(),
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            start_new_session=True,  # Ctrl+C w CLI nie zabija zygoty w połowie zadania
+        )
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, job):
+        try:
+            self.proc.stdin.write(json.dumps(job) + "\n")
+            self.proc.stdin.flush()
+        except OSError as e:
+            self.close()
+            raise WorkerUnavailable(f"Interpreter pool worker is gone: {e}") from e
+        self.jobs += 1
+
+        # Od tego miejsca skrypt mógł już ruszyć - błąd nie może prowadzić do ponownego uruchomienia.
+        # Zygota sama pilnuje limitu czasu; tu tylko zabezpieczenie na wypadek jej zawieszenia
+        lines = []
+
+        def read_reply():
+            for _ in range(2):  # pid dziecka, potem wynik
+                line = self.proc.stdout.readline()
+                if not line:
+                    return
+                lines.append(json.loads(line))
+
+        reader = threading.Thread(target=read_reply, daemon=True)
+        reader.start()
+        reader.join(job["timeout"] + RESPONSE_GRACE)
+        if lines:
+            self.child_pid = lines[0]["pid"]
+        if len(lines) < 2:
+            hung = reader.is_alive()
+            self.close()
+            if hung:
+                return {"exit_code": None, "timed_out": True}
+            raise RuntimeError("Interpreter pool worker exited while running the script")
+        self.child_pid = None
+        return lines[1]
+
+    def close(self):
+        if self.child_pid is not None:
+            # Skrypt ma własną grupę procesów - zabicie samej zygoty by go nie zatrzymało
+            try:
+                os.killpg(self.child_pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.child_pid = None
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+
+
+class InterpreterPool:
+    def __init__(self, size=PYTHON_POOL_SIZE, max_jobs=PYTHON_POOL_MAX_JOBS, preload=PYTHON_POOL_PRELOAD):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.preload = list(preload)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def prewarm(self):
+        """Uruchamia zygoty w tle (import bibliotek trwa, zanim przyjdzie pierwsze zadanie)."""
+        with self._lock:
+            while self._idle.qsize() < self.size:
+                self._idle.put(_Zygote(self.preload))
+
+    def _checkout(self):
+        while True:
+            try:
+                zygote = self._idle.get_nowait()
+            except queue.Empty:
+                try:
+                    return _Zygote(self.preload)
+                except OSError as e:
+                    raise WorkerUnavailable(f"Cannot start an interpreter pool worker: {e}") from e
+            if zygote.alive():
+                return zygote
+            zygote.close()
+
+    def run_script(self, script, args, cwd, stdout_path, stderr_path, timeout):
+        """
+        Uruchamia skrypt w świeżym procesie z zygoty.
+        Zwraca (kod_wyjścia, czy_przekroczono_czas); wyjścia lądują w stdout_path / stderr_path.
+        WorkerUnavailable: zadanie nie zostało wysłane; każdy inny błąd - skrypt mógł już działać.
+        """
+        zygote = self._checkout()
+        try:
+            result = zygote.run({
+                "script": script,
+                "args": list(args or []),
+                "cwd": cwd,
+                "stdout": stdout_path,
+                "stderr": stderr_path,
+                "timeout": timeout,
+            })
+        except Exception:
+            zygote.close()
+            raise
+
+        if not zygote.alive() or zygote.jobs >= self.max_jobs:
+            # Zużyta zygota - wymieniamy na świeżą, od razu rozgrzewaną w tle
+            zygote.close()
+            self.prewarm()
+        else:
+            with self._lock:
+                # Przy równoległych zadaniach _checkout startuje dodatkowe zygoty - w puli
+                # zostaje najwyżej size, nadmiarowe (z zaimportowanym pandas itd.) zamykamy
+                keep = self._idle.qsize() < self.size
+                if keep:
+                    self._idle.put(zygote)
+            if not keep:
+                zygote.close()
+        return result["exit_code"], result["timed_out"]
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InterpreterPool()
+        return _pool
+
+def prewarm():
+    """Rozgrzewa pulę przy starcie aplikacji, żeby pierwszy run_python_file był szybki."""
+    if is_supported():
+        get_pool().prewarm()
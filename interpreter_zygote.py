@@ -0,0 +1,128 @@
+"""
+Proces-zygota puli interpreterów (uruchamiany przez interpreter_pool.py).
+
+Importuje tylko bibliotekę standardową i moduły z listy preload - żadnego kodu agenta,
+więc procesy potomne, które uruchamiają skrypty z workspace, mają w sys.modules
+to samo, co świeży interpreter z tymi bibliotekami.
+"""
+import json
+import os
+import sys
+
+
+def _run_child(job, channel_fds):
+    """Kod procesu potomnego: izolacja, przekierowanie wyjść i uruchomienie skryptu."""
+    import runpy
+    import traceback
+
+    os.setpgid(0, 0)  # własna grupa procesów - timeout zabija też podprocesy skryptu
+    for fd in channel_fds:
+        os.close(fd)
+
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    for target, path in ((1, job["stdout"]), (2, job["stderr"])):
+        # O_APPEND: run_python_file przycina za duży log, a zapis ma trafiać na nowy koniec pliku
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdout = open(1, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+
+    os.chdir(job["cwd"])
+    sys.argv = [job["script"], *job["args"]]
+    # Jak `python skrypt.py`: katalog skryptu na początku sys.path
+    sys.path.insert(0, os.path.dirname(job["script"]))
+
+    exit_code = 0
+    try:
+        runpy.run_path(job["script"], run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Traceback bez ramek puli - tak, jak wypisałby go zwykły interpreter
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != job["script"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def _wait_child(pid, timeout):
+    """Czeka na dziecko; po przekroczeniu limitu zabija całą jego grupę procesów."""
+    import signal
+    import time
+
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        finished, status = os.waitpid(pid, os.WNOHANG)
+        if finished:
+            return os.waitstatus_to_exitcode(status), False
+        if time.monotonic() >= deadline:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            os.waitpid(pid, 0)
+            return None, True
+        time.sleep(delay)
+        delay = min(delay * 2, 0.02)
+
+
+def _serve():
+    """
+    Pętla zygoty: jedna linia JSON z zadaniem na wejściu; na wyjściu linia z pid dziecka
+    zaraz po fork() i linia z wynikiem po jego zakończeniu.
+    """
+    # Kanał protokołu to kopie stdin/stdout; właściwe fd 1 kierujemy do /dev/null,
+    # żeby nic z preloadu nie zaśmieciło odpowiedzi
+    in_fd, out_fd = os.dup(0), os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    requests_in = os.fdopen(in_fd, "r", encoding="utf-8")
+    responses_out = os.fdopen(out_fd, "w", encoding="utf-8", buffering=1)
+
+    # Katalog projektu (katalog tego pliku) znika z sys.path - ani preload, ani skrypt
+    # nie zaimportują modułów agenta zamiast własnych plików
+    if sys.path and sys.path[0] == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+    for module_name in json.loads(sys.argv[1]):
+        try:
+            __import__(module_name)
+        except Exception:
+            pass  # Biblioteka niezainstalowana - skrypt i tak zgłosi błąd sam
+
+    for line in requests_in:
+        job = json.loads(line)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_child(job, (in_fd, out_fd))
+            finally:
+                os._exit(1)  # Dziecko nigdy nie wraca do pętli zygoty
+        # Grupę ustawiamy też po stronie rodzica (dziecko mogło jeszcze nie zdążyć) i zgłaszamy
+        # pid - agent, porzucając zawieszoną zygotę, zabija też grupę procesów skryptu
+        try:
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        responses_out.write(json.dumps({"pid": pid}) + "\n")
+        exit_code, timed_out = _wait_child(pid, job["timeout"])
+        responses_out.write(json.dumps({"exit_code": exit_code, "timed_out": timed_out}) + "\n")
+
+
+if __name__ == "__main__":
+    _serve()
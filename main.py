@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import os
 import sys
 
@@ -6,13 +7,56 @@ from dotenv import load_dotenv # type: ignore[import]
 from google import genai
 from google.genai import types # type: ignore[import]
 
-from call_function import available_functions_tool, call_function
-from config import MAX_ITERS
-from prompts import system_prompt
-from reviewer import review_code
-from memory import load_memory, save_memory, clear_memory
-
-SENSITIVE_FUNCTIONS = ["write_file", "run_python_file"]
+from agent_engine import AgentEngine, AgentHooks, run_blocking
+from config import (
+    MAX_ITERS, PROMPT_CACHE_ENABLED, PYTHON_POOL_ENABLED,
+    REQUEST_TOKEN_BUDGET, REQUEST_COST_BUDGET,
+)
+from memory import load_memory, save_memory, clear_memory, load_usage, save_usage
+from context_manager import ContextManager
+from prompt_cache import PromptCache
+import interpreter_pool
+from tracing import tracer
+import usage
+
+
+class CLIHooks(AgentHooks):
+    """Terminal: zgody przez input(), streaming i logi --verbose na stdout."""
+
+    def __init__(self, verbose=False, context=None):
+        self.verbose = verbose
+        self.context = context
+        self._streamed = False
+
+    async def approve(self, func_name, func_args, change=None):
+        print(f"\n⚠️  [SECURITY ALERT] Agent wants to execute: {func_name}")
+        if change is not None:
+            print(f"    File: {func_args.get('file_path', '')}\n{change}")
+        else:
+            print(f"    Args: {func_args}")
+        # input() blokuje - czekamy na odpowiedź w wątku, pętla zdarzeń działa dalej
+        user_approval = (await run_blocking(input, ">> Allow? (y/N): ")).strip().lower()
+
+        if user_approval != 'y':
+            print("❌ Denied by user.")
+            return False
+        return True
+
+    def on_event(self, event, **data):
+        if event == "context" and self.verbose and self.context:
+            print(f"[CONTEXT] Sending {data['sent']} of {data['total']} messages (~{self.context.last_estimate} tokens)")
+        elif event == "text":
+            self._streamed = True
+            print(data["text"], end="", flush=True)
+        elif event == "response":
+            if self._streamed:
+                print()
+                self._streamed = False
+            if self.verbose:
+                usage_metadata = data["response"].usage_metadata
+                print(f"[Tokens] Prompt: {usage_metadata.prompt_token_count} | Response: {usage_metadata.candidates_token_count} | Thoughts: {usage_metadata.thoughts_token_count or 0} | Cached: {usage_metadata.cached_content_token_count or 0}")
+        elif event == "tool_result" and self.verbose:
+            print(f"-> Output: {data['response']}")
 
 def main():
     parser = argparse.ArgumentParser(description="AI Code Assistant")
@@ -20,6 +64,15 @@ def main():
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
     # === NOWOŚĆ: Flaga do czyszczenia pamięci ===
     parser.add_argument("--new", action="store_true", help="Start a fresh session (clear memory)")
+    parser.add_argument("--stream", action="store_true", help="Stream the model's answer token by token")
+    parser.add_argument("--cache", action="store_true", default=PROMPT_CACHE_ENABLED,
+                        help="Cache the system prompt and tool declarations on the model side")
+    parser.add_argument("--profile", action="store_true",
+                        help="Trace every phase of the loop and write timings to agent_workspace/.traces")
+    parser.add_argument("--max-tokens", type=int, default=REQUEST_TOKEN_BUDGET,
+                        help="Stop the loop once this request has used this many tokens")
+    parser.add_argument("--max-cost", type=float, default=REQUEST_COST_BUDGET,
+                        help="Stop the loop once this request has cost this many USD")
     
     args = parser.parse_args()
 
@@ -34,6 +87,10 @@ def main():
 
     client = genai.Client(api_key=api_key)
 
+    # Workery dla run_python_file importują biblioteki w tle, zanim agent ich potrzebuje
+    if PYTHON_POOL_ENABLED:
+        interpreter_pool.prewarm()
+
     # === LOGIKA PAMIĘCI ===
     # 1. Wczytujemy starą historię
     messages = load_memory()
@@ -46,113 +103,77 @@ def main():
         print(f"User prompt: {args.user_prompt}\n")
         print(f"[MEMORY] Loaded {len(messages)-1} previous messages from context.")
 
-    # Główna pętla myślenia
-    for i in range(MAX_ITERS):
-        try:
-            final_response = generate_content(client, messages, args.verbose)
-            
-            # Po każdej udanej turze ZAPISUJEMY stan pamięci
-            save_memory(messages)
-
-            if final_response:
-                print(final_response)
-                return
-                
-        except Exception as e:
-            print(f"Error in iteration {i}: {e}")
-            break
-
-    print(f"Maximum iterations ({MAX_ITERS}) reached")
-    sys.exit(1)
-
-
-def generate_content(client, messages, verbose):
-    response = client.models.generate_content(
-        model="gemini-2.5-flash", 
-        contents=messages,
-        config=types.GenerateContentConfig(
-            tools=[available_functions_tool], 
-            system_instruction=system_prompt
-        ),
+    # Do modelu idzie tylko okno historii mieszczące się w budżecie tokenów
+    context = ContextManager()
+    prompt_cache = PromptCache(client) if args.cache else None
+
+    if args.profile:
+        tracer.enable()
+
+    # Tokeny i koszt: liczniki sesji są zapisywane obok pamięci, budżety przerywają pętlę
+    ledger = usage.UsageLedger(request_tokens=args.max_tokens, request_cost=args.max_cost)
+    ledger.load_dict(load_usage())
+    ledger.start_request(args.user_prompt)
+
+    def save_session(messages):
+        # Po każdej udanej turze ZAPISUJEMY stan pamięci
+        save_memory(messages)
+        save_usage(ledger.to_dict())
+
+    engine = AgentEngine(
+        client,
+        hooks=CLIHooks(args.verbose, context),
+        stream=args.stream,
+        context=context,
+        prompt_cache=prompt_cache,
+        ledger=ledger,
+        save_messages=save_session,
+        verbose=args.verbose,
     )
-    
-    if not response.usage_metadata:
-        raise RuntimeError("Gemini API response appears to be malformed")
-
-    if verbose:
-        print(f"[Tokens] Prompt: {response.usage_metadata.prompt_token_count} | Response: {response.usage_metadata.candidates_token_count}")
 
-    if response.candidates:
-        for candidate in response.candidates:
-            if candidate.content:
-                messages.append(candidate.content)
+    try:
+        # Główna pętla myślenia
+        try:
+            final_response = asyncio.run(engine.run(messages))
+        except Exception as e:
+            print(f"Error in iteration {engine.iteration}: {e}")
+            final_response = None
 
-    if not response.function_calls:
-        return response.text
+        if final_response:
+            # W trybie streamingu tekst jest już na ekranie
+            if not args.stream:
+                print(final_response)
+            if args.verbose:
+                print(f"\n[USAGE]\n{ledger.report()}")
+            return
+
+        if engine.stop_reason == "budget":
+            print(f"⛔ [BUDGET] {ledger.exceeded()}. Stopping.")
+            print(ledger.report())
+            sys.exit(1)
+
+        print(f"Maximum iterations ({MAX_ITERS}) reached")
+        sys.exit(1)
+    finally:
+        save_usage(ledger.to_dict())
+        if args.profile:
+            print_profile()
+
+
+def print_profile():
+    """Tabela czasów faz + eksport spanów (JSONL) i metryk (format Prometheusa)."""
+    print("\n[PROFILE]")
+    print(f"{'span':<34} {'count':>6} {'total ms':>10} {'mean':>9} {'p50':>9} {'p90':>9} {'max':>9}")
+    for row in tracer.summary():
+        print(
+            f"{row['span']:<34} {row['count']:>6} {row['total_ms']:>10.1f} {row['mean_ms']:>9.2f} "
+            f"{row['p50_ms']:>9.2f} {row['p90_ms']:>9.2f} {row['max_ms']:>9.2f}"
+        )
+    tokens = tracer.tokens
+    print(f"Tokens: prompt {tokens['prompt']} | response {tokens['response']} | cached {tokens['cached']}")
+    print(f"Trace: {tracer.export_jsonl()}")
+    print(f"Metrics: {tracer.export_prometheus()}")
 
-    function_responses = []
-    
-    for function_call in response.function_calls:
-        func_name = function_call.name
-        func_args = function_call.args
-        
-        # === REVIEWER (FAZA 3) ===
-        # === KROK 1: AUTOMATYCZNY AUDYT (REVIEWER) ===
-        # Sprawdzamy kod tylko przy próbie zapisu pliku
-        if func_name == "write_file":
-            # Pobieramy nazwę pliku, żeby sprawdzić rozszerzenie
-            file_path = func_args.get("file_path", "")
-            
-            # Uruchamiamy Reviewera TYLKO dla plików .py
-            # Pliki .txt, .json, .md są bezpieczne (chyba że to skrypt bash, ale skupiamy się na Pythonie)
-            if file_path.endswith(".py"):
-                content_to_review = func_args.get("content", "")
-                
-                is_approved, feedback = review_code(content_to_review)
-                
-                if not is_approved:
-                    rejection_part = types.Part.from_function_response(
-                        name=func_name,
-                        response={"error": f"Security Review Failed: {feedback}. Please fix the code and try again."}
-                    )
-                    function_responses.append(rejection_part)
-                    continue 
-        # =============================================
-
-        # === SECURITY CHECK (FAZA 1) ===
-        if func_name in SENSITIVE_FUNCTIONS:
-            print(f"\n⚠️  [SECURITY ALERT] Agent wants to execute: {func_name}")
-            print(f"    Args: {func_args}")
-            user_approval = input(">> Allow? (y/N): ").strip().lower()
-            
-            if user_approval != 'y':
-                print("❌ Denied by user.")
-                rejection_part = types.Part.from_function_response(
-                    name=func_name,
-                    response={"error": "User denied execution of this function."}
-                )
-                function_responses.append(rejection_part)
-                continue 
-
-        result = call_function(function_call, verbose)
-        
-        if (
-            not result.parts
-            or not result.parts[0].function_response
-            or not result.parts[0].function_response.response
-        ):
-            raise RuntimeError(f"Empty function response for {func_name}")
-            
-        if verbose:
-            print(f"-> Output: {result.parts[0].function_response.response}")
-            
-        function_responses.append(result.parts[0])
-
-    messages.append(types.Content(role="tool", parts=function_responses))
-    
-    save_memory(messages)
-    
-    return None
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
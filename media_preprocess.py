@@ -0,0 +1,221 @@
+"""
+Przygotowanie obrazów i nagrań przed wysłaniem do modelu (po stronie klienta).
+
+  - obraz: pomniejszenie do MEDIA_IMAGE_MAX_DIM (dłuższy bok) i ponowna kompresja
+    (WebP, a bez wsparcia WebP w Pillow - JPEG) z jakością MEDIA_IMAGE_QUALITY
+  - nagranie WAV (PCM 16-bit): cisza z początku i końca jest obcinana, dźwięk
+    przechodzi na mono i MEDIA_AUDIO_SAMPLE_RATE (model i tak słucha w 16 kHz)
+
+Wyniki trafiają do magazynu blobów, a mapowanie "hash oryginału + ustawienia -> blob"
+jest zapisywane obok, więc ten sam plik wysłany ponownie nie jest przetwarzany drugi raz.
+Każde wywołanie zwraca raport: bajty i szacowane tokeny przed i po.
+"""
+import array
+import hashlib
+import io
+import json
+import math
+import os
+import sys
+import threading
+import wave
+
+from PIL import Image, ImageOps, features  # type: ignore[import]
+
+from blob_store import BlobStore
+from config import (
+    MEDIA_PREPROCESS_ENABLED, MEDIA_IMAGE_MAX_DIM, MEDIA_IMAGE_QUALITY,
+    MEDIA_AUDIO_SAMPLE_RATE, MEDIA_AUDIO_SILENCE_THRESHOLD,
+)
+
+CACHE_FILE = "preprocessed.json"
+# Szacunki tokenów Gemini: obraz do 384 px = 258 tokenów, większy jest cięty na kafle 768x768;
+# audio = 32 tokeny na sekundę
+IMAGE_TILE_PX = 768
+IMAGE_SMALL_PX = 384
+TOKENS_PER_IMAGE_TILE = 258
+AUDIO_TOKENS_PER_SECOND = 32
+# Okno (ms), w którym liczymy głośność przy szukaniu ciszy; tyle ciszy zostawiamy na brzegach
+SILENCE_WINDOW_MS = 20
+SILENCE_PADDING_MS = 200
+
+
+def estimate_image_tokens(width, height):
+    if width <= IMAGE_SMALL_PX and height <= IMAGE_SMALL_PX:
+        return TOKENS_PER_IMAGE_TILE
+    return math.ceil(width / IMAGE_TILE_PX) * math.ceil(height / IMAGE_TILE_PX) * TOKENS_PER_IMAGE_TILE
+
+
+def estimate_audio_tokens(seconds):
+    return math.ceil(seconds * AUDIO_TOKENS_PER_SECOND)
+
+
+# === OBRAZY ===
+
+def preprocess_image(data, max_dim=MEDIA_IMAGE_MAX_DIM, quality=MEDIA_IMAGE_QUALITY):
+    """Zwraca (bajty, mime_type, tokeny przed, tokeny po)."""
+    image = Image.open(io.BytesIO(data))
+    original_format = image.format
+    # Zdjęcia z telefonu: orientacja z EXIF, zanim zgubimy metadane
+    image = ImageOps.exif_transpose(image)
+    tokens_before = estimate_image_tokens(*image.size)
+
+    if max(image.size) > max_dim:
+        image.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if features.check("webp"):
+        output_format, mime_type = "WEBP", "image/webp"
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    else:
+        output_format, mime_type = "JPEG", "image/jpeg"
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=output_format, quality=quality)
+    processed = buffer.getvalue()
+    tokens_after = estimate_image_tokens(*image.size)
+
+    # Mały, już skompresowany obraz - oryginał bywa lżejszy niż ponowna kompresja
+    if len(processed) >= len(data) and tokens_after == tokens_before and original_format:
+        return data, Image.MIME.get(original_format, mime_type), tokens_before, tokens_before
+    return processed, mime_type, tokens_before, tokens_after
+
+
+# === AUDIO ===
+
+def _trim_silence(samples, rate, threshold):
+    """Obcina ciszę z początku i końca (średnia amplituda w oknach SILENCE_WINDOW_MS)."""
+    window = max(1, rate * SILENCE_WINDOW_MS // 1000)
+    loud = [
+        start for start in range(0, len(samples), window)
+        if sum(map(abs, samples[start:start + window])) / len(samples[start:start + window]) >= threshold
+    ]
+    if not loud:
+        return samples
+    padding = rate * SILENCE_PADDING_MS // 1000
+    return samples[max(0, loud[0] - padding):min(len(samples), loud[-1] + window + padding)]
+
+
+def _resample(samples, rate, target_rate):
+    if rate <= target_rate:
+        return samples, rate
+    if rate % target_rate == 0:
+        # Całkowity stosunek (48k -> 16k): średnia z kolejnych próbek jako prosty filtr
+        step = rate // target_rate
+        return array.array("h", (sum(group) // step for group in zip(*(samples[i::step] for i in range(step))))), target_rate
+    ratio = rate / target_rate
+    return array.array("h", (samples[int(i * ratio)] for i in range(int(len(samples) / ratio)))), target_rate
+
+
+def preprocess_audio(data, target_rate=MEDIA_AUDIO_SAMPLE_RATE, threshold=MEDIA_AUDIO_SILENCE_THRESHOLD):
+    """
+    Zwraca (bajty, mime_type, tokeny przed, tokeny po).
+    Obsługuje WAV PCM 16-bit; inne formaty przechodzą bez zmian (ValueError z wave).
+    """
+    with wave.open(io.BytesIO(data), "rb") as reader:
+        channels = reader.getnchannels()
+        rate = reader.getframerate()
+        if reader.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM is supported")
+        samples = array.array("h", reader.readframes(reader.getnframes()))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    tokens_before = estimate_audio_tokens(len(samples) / channels / rate)
+
+    if channels > 1:
+        samples = array.array("h", (sum(frame) // channels for frame in zip(*(samples[i::channels] for i in range(channels)))))
+    samples = _trim_silence(samples, rate, threshold)
+    samples, rate = _resample(samples, rate, target_rate)
+
+    if sys.byteorder == "big":
+        samples.byteswap()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(samples.tobytes())
+    return buffer.getvalue(), "audio/wav", tokens_before, estimate_audio_tokens(len(samples) / rate)
+
+
+# === CACHE + RAPORT ===
+
+class MediaPreprocessor:
+    def __init__(self, store=None, enabled=MEDIA_PREPROCESS_ENABLED):
+        self.store = store or BlobStore()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def _settings_key(self, kind):
+        if kind == "image":
+            return f"image:{MEDIA_IMAGE_MAX_DIM}:{MEDIA_IMAGE_QUALITY}:{features.check('webp')}"
+        return f"audio:{MEDIA_AUDIO_SAMPLE_RATE}:{MEDIA_AUDIO_SILENCE_THRESHOLD}"
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(os.path.join(self.store.root, CACHE_FILE), "r", encoding="utf-8") as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self):
+        os.makedirs(self.store.root, exist_ok=True)
+        path = os.path.join(self.store.root, CACHE_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._cache, f)
+        os.replace(path + ".tmp", path)
+
+    def part(self, data, mime_type):
+        """
+        Referencja do przetworzonego bloba (types.Part) + raport:
+        {"kind", "bytes_before", "bytes_after", "tokens_before", "tokens_after", "cached"}.
+        """
+        kind = "image" if mime_type.startswith("image/") else "audio" if mime_type.startswith("audio/") else None
+        if not self.enabled or kind is None:
+            return self.store.part(data, mime_type), None
+
+        key = f"{hashlib.sha256(data).hexdigest()}:{self._settings_key(kind)}"
+        with self._lock:
+            entry = self._load_cache().get(key)
+            cached = entry is not None and self.store.exists(entry["digest"])
+            if not cached:
+                try:
+                    processor = preprocess_image if kind == "image" else preprocess_audio
+                    processed, processed_mime, tokens_before, tokens_after = processor(data)
+                except Exception as e:
+                    print(f"⚠️ [MEDIA] Nie udało się przetworzyć załącznika ({mime_type}), wysyłam oryginał: {e}")
+                    return self.store.part(data, mime_type), None
+                entry = {
+                    "digest": self.store.put(processed),
+                    "mime_type": processed_mime,
+                    "bytes_before": len(data),
+                    "bytes_after": len(processed),
+                    "tokens_before": tokens_before,
+                    "tokens_after": tokens_after,
+                }
+                self._cache[key] = entry
+                self._save_cache()
+
+        part = self.store.ref_part(entry["digest"], entry["mime_type"])
+        report = {key: entry[key] for key in ("bytes_before", "bytes_after", "tokens_before", "tokens_after")}
+        report.update(kind=kind, cached=cached)
+        return part, report
+
+
+def format_report(reports):
+    """Jedna linia podsumowania dla wiadomości (kilka załączników sumujemy)."""
+    reports = [report for report in reports if report]
+    if not reports:
+        return ""
+    bytes_before = sum(r["bytes_before"] for r in reports)
+    bytes_after = sum(r["bytes_after"] for r in reports)
+    tokens_before = sum(r["tokens_before"] for r in reports)
+    tokens_after = sum(r["tokens_after"] for r in reports)
+    return (
+        f"{bytes_before / 1024:,.0f} KB → {bytes_after / 1024:,.0f} KB "
+        f"(-{bytes_before - bytes_after:,} B), ~{tokens_before:,} → ~{tokens_after:,} tokenów"
+    )
@@ -1,33 +1,246 @@
+import json
 import os
 import pickle
-from config import WORKING_DIR
+import struct
+import threading
+import zlib
+from config import WORKING_DIR, JOURNAL_COMPACT_EVERY
+from tracing import span
 from google.genai import types # type: ignore[import]
 
 # Ścieżka do pliku pamięci (wewnątrz workspace, żeby nie śmiecić)
+# session_state.pkl to teraz skompaktowany snapshot, a nowe wiadomości
+# dopisujemy do dziennika obok (append-only).
 MEMORY_FILE = os.path.join(WORKING_DIR, "session_state.pkl")
+JOURNAL_FILE = os.path.join(WORKING_DIR, "session_state.journal")
+# Liczniki tokenów i kosztu sesji (usage.UsageLedger) - obok historii, czyszczone razem z nią
+USAGE_FILE = os.path.join(WORKING_DIR, "session_usage.json")
 
-def load_memory():
-    """Wczytuje historię rozmowy z pliku, jeśli istnieje."""
-    if os.path.exists(MEMORY_FILE):
-        try:
-            with open(MEMORY_FILE, 'rb') as f:
-                history = pickle.load(f)
-                return history
-        except Exception as e:
-            print(f"⚠️ [MEMORY] Błąd odczytu pamięci: {e}. Zaczynam nową sesję.")
-            return []
-    return []
-
-def save_memory(messages):
-    """Zapisuje aktualną listę wiadomości do pliku."""
+# Nagłówek rekordu w dzienniku: długość danych + CRC32
+_RECORD_HEADER = struct.Struct("<II")
+
+
+def _fsync_dir(path):
+    """Utrwala wpis katalogu po os.replace (na Windowsie nie ma takiej potrzeby)."""
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
     try:
-        with open(MEMORY_FILE, 'wb') as f:
-            pickle.dump(messages, f)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path, data):
+    """Zapis do pliku tymczasowego + fsync + rename - plik nigdy nie jest w połowie zapisany."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def _encode_record(obj):
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class SessionJournal:
+    """
+    Pamięć sesji w formie: snapshot + dziennik dopisywanych rekordów.
+
+    save() dopisuje tylko wiadomości, których jeszcze nie zapisaliśmy, więc koszt
+    tury nie zależy od długości historii. Co JOURNAL_COMPACT_EVERY rekordów
+    (albo gdy historia została przepisana) robimy nowy snapshot i zerujemy dziennik.
+    Snapshot i dziennik mają wspólny numer generacji - dziennik z innej generacji
+    (np. po awarii w trakcie kompaktowania) jest ignorowany.
+    """
+
+    def __init__(self, snapshot_path, journal_path, compact_every=JOURNAL_COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._count = 0          # ile wiadomości jest już na dysku
+        self._last = None        # ostatnia zapisana wiadomość (sprawdzamy tożsamość)
+        self._records = 0        # rekordy w dzienniku od ostatniego snapshotu
+
+    # === ODCZYT ===
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return 0, []
+        with open(self.snapshot_path, "rb") as f:
+            data = pickle.load(f)
+        # Stary format: sama lista wiadomości
+        if isinstance(data, list):
+            return 0, data
+        return data["generation"], data["messages"]
+
+    def _replay_journal(self, generation, messages):
+        """Odtwarza rekordy z dziennika. Urwany ostatni rekord jest odcinany."""
+        if not os.path.exists(self.journal_path):
+            return 0
+
+        records = 0
+        good_offset = 0
+        with open(self.journal_path, "rb") as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                length, crc = _RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                entry = pickle.loads(payload)
+
+                if good_offset == 0:
+                    # Pierwszy rekord to nagłówek z generacją - dziennik z innej
+                    # generacji jest już zawarty w snapshocie
+                    if entry.get("generation") != generation:
+                        break
+                else:
+                    messages.extend(entry)
+                    records += 1
+                good_offset = f.tell()
+
+            torn = f.read(1) != b"" or f.tell() != good_offset
+
+        if good_offset == 0:
+            # Nieaktualny albo pusty dziennik - następny zapis założy nowy
+            os.remove(self.journal_path)
+        elif torn:
+            print("⚠️ [MEMORY] Dziennik sesji był uszkodzony - odcinam niepełny rekord.")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_offset)
+        return records
+
+    def _set_aside(self):
+        """
+        Nieczytelny snapshot i jego dziennik odkładamy jako *.corrupt (do ręcznego odzyskania).
+        Nowa sesja zaczyna od generacji 0 - jej rekordy nie mogą trafić do starego dziennika.
+        """
+        for path in (self.snapshot_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            try:
+                os.replace(path, path + ".corrupt")
+            except OSError:
+                os.remove(path)
+
+    def load(self):
+        with self._lock:
+            try:
+                generation, messages = self._read_snapshot()
+                records = self._replay_journal(generation, messages)
+            except Exception as e:
+                print(f"⚠️ [MEMORY] Błąd odczytu pamięci: {e}. Zaczynam nową sesję.")
+                self._set_aside()
+                generation, messages, records = 0, [], 0
+
+            self._generation = generation
+            self._count = len(messages)
+            self._last = messages[-1] if messages else None
+            self._records = records
+            return messages
+
+    # === ZAPIS ===
+
+    def _write_snapshot(self, messages):
+        generation = self._generation + 1
+        _atomic_write(
+            self.snapshot_path,
+            pickle.dumps({"generation": generation, "messages": list(messages)}, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+        _atomic_write(self.journal_path, _encode_record({"generation": generation}))
+        self._generation = generation
+        self._records = 0
+
+    def _append(self, new_messages):
+        if not os.path.exists(self.journal_path):
+            _atomic_write(self.journal_path, _encode_record({"generation": self._generation}))
+        with open(self.journal_path, "ab") as f:
+            f.write(_encode_record(new_messages))
+            f.flush()
+            os.fsync(f.fileno())
+        self._records += 1
+
+    def save(self, messages):
+        with self._lock:
+            in_sync = self._count <= len(messages) and (
+                self._count == 0 or messages[self._count - 1] is self._last
+            )
+
+            if not in_sync or self._records >= self.compact_every:
+                # Historia została przepisana albo dziennik urósł - kompaktujemy
+                self._write_snapshot(messages)
+            elif len(messages) > self._count:
+                self._append(messages[self._count:])
+            else:
+                return
+
+            self._count = len(messages)
+            self._last = messages[-1] if messages else None
+
+    def clear(self):
+        with self._lock:
+            removed = False
+            for path in (self.snapshot_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+            self._generation = 0
+            self._count = 0
+            self._last = None
+            self._records = 0
+            return removed
+
+
+_journal = SessionJournal(MEMORY_FILE, JOURNAL_FILE)
+
+def session_journal(directory):
+    """Osobny snapshot + dziennik w podanym katalogu (sesje usługi, service.py)."""
+    return SessionJournal(
+        os.path.join(directory, os.path.basename(MEMORY_FILE)),
+        os.path.join(directory, os.path.basename(JOURNAL_FILE)),
+    )
+
+def load_memory(journal=None):
+    """Wczytuje historię rozmowy (snapshot + dziennik), jeśli istnieje."""
+    return (journal or _journal).load()
+
+def save_memory(messages, journal=None):
+    """Dopisuje do dziennika wiadomości, których jeszcze nie ma na dysku."""
+    try:
+        with span("memory.save", messages=len(messages)):
+            (journal or _journal).save(messages)
     except Exception as e:
         print(f"⚠️ [MEMORY] Nie udało się zapisać stanu: {e}")
 
+def load_usage(path=USAGE_FILE):
+    """Wczytuje zapisane liczniki tokenów sesji (dict) albo None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ [MEMORY] Nie udało się wczytać liczników tokenów: {e}")
+        return None
+
+def save_usage(usage_data, path=USAGE_FILE):
+    try:
+        _atomic_write(path, json.dumps(usage_data).encode("utf-8"))
+    except Exception as e:
+        print(f"⚠️ [MEMORY] Nie udało się zapisać liczników tokenów: {e}")
+
 def clear_memory():
-    """Czyści pamięć (usuwa plik sesji)."""
-    if os.path.exists(MEMORY_FILE):
-        os.remove(MEMORY_FILE)
-        print("🧹 [MEMORY] Pamięć wyczyszczona. Nowa sesja.")
\ No newline at end of file
+    """Czyści pamięć (usuwa snapshot i dziennik sesji oraz liczniki tokenów)."""
+    if os.path.exists(USAGE_FILE):
+        os.remove(USAGE_FILE)
+    if _journal.clear():
+        print("🧹 [MEMORY] Pamięć wyczyszczona. Nowa sesja.")
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from google.genai import types # type: ignore[import]
+
+from config import WORKING_DIR, MODEL_NAME, PROMPT_CACHE_TTL
+
+PROMPT_CACHE_FILE = os.path.join(WORKING_DIR, ".prompt_cache.json")
+
+# Przedłużamy / odtwarzamy cache, gdy zostało mniej niż tyle sekund
+REFRESH_MARGIN = 120
+
+
+def tools_fingerprint(model, system_instruction, tool):
+    """Hash modelu, system promptu i schematów narzędzi - zmiana czegokolwiek = nowy cache."""
+    payload = {
+        "model": model,
+        "system_instruction": system_instruction,
+        "declarations": [
+            declaration.model_dump(mode="json", exclude_none=True)
+            for declaration in (tool.function_declarations or [])
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Trzyma system prompt + deklaracje narzędzi w cache po stronie modelu
+    (client.caches), żeby nie wysyłać ich przy każdej iteracji.
+
+    Nazwa cache jest zapisywana w agent_workspace/.prompt_cache.json, więc kolejne
+    sesje używają tego samego wpisu. Gdy refresh_tools() zmieni zestaw narzędzi,
+    zmienia się odcisk i tworzymy nowy wpis (stary jest usuwany).
+    Korzysta tylko z client.caches.create/get/update/delete, więc da się go
+    sprawdzić na lokalnym, udawanym kliencie.
+    """
+
+    def __init__(self, client, model=MODEL_NAME, state_path=PROMPT_CACHE_FILE, ttl=PROMPT_CACHE_TTL):
+        self.client = client
+        self.model = model
+        self.state_path = state_path
+        self.ttl = ttl
+        self._state = self._load_state()
+        self._verified = False
+        self._last_fingerprint = None  # (tool, system_instruction, odcisk) z ostatniego wywołania
+        self._failed = set()         # odciski, dla których tworzenie cache się nie udało
+        # Jedna instancja bywa współdzielona przez równoległe sesje (service.py)
+        self._lock = threading.Lock()
+
+    # === STAN NA DYSKU ===
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_state(self):
+        try:
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump(self._state, f)
+        except Exception as e:
+            print(f"⚠️ [CACHE] Nie udało się zapisać stanu cache: {e}")
+
+    # === ZARZĄDZANIE WPISEM ===
+
+    def _fingerprint(self, system_instruction, tool):
+        # Ten sam obiekt Tool = te same deklaracje, nie trzeba liczyć hasha co iterację
+        last = self._last_fingerprint
+        if last and last[0] is tool and last[1] == system_instruction:
+            return last[2]
+        fingerprint = tools_fingerprint(self.model, system_instruction, tool)
+        self._last_fingerprint = (tool, system_instruction, fingerprint)
+        return fingerprint
+
+    def _expire_at(self, cached_content):
+        if cached_content.expire_time:
+            return cached_content.expire_time.timestamp()
+        return time.time() + self.ttl
+
+    def _create(self, fingerprint, system_instruction, tool):
+        self.invalidate()
+        cached_content = self.client.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                display_name="aiagent-system-prompt",
+                system_instruction=system_instruction,
+                tools=[tool],
+                ttl=f"{self.ttl}s",
+            ),
+        )
+        self._state = {
+            "name": cached_content.name,
+            "fingerprint": fingerprint,
+            "expire_at": self._expire_at(cached_content),
+        }
+        self._verified = True
+        self._save_state()
+
+    def _extend(self):
+        cached_content = self.client.caches.update(
+            name=self._state["name"],
+            config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"),
+        )
+        self._state["expire_at"] = self._expire_at(cached_content)
+        self._save_state()
+
+    def invalidate(self):
+        """Usuwa bieżący wpis (np. po zmianie narzędzi)."""
+        name = self._state.get("name")
+        self._state = {}
+        self._verified = False
+        if name:
+            try:
+                self.client.caches.delete(name=name)
+            except Exception:
+                pass  # Wpis mógł już wygasnąć po stronie serwera
+            self._save_state()
+
+    def get_cache_name(self, system_instruction, tool):
+        """Zwraca nazwę aktualnego wpisu cache albo None, jeśli cache jest niedostępny."""
+        fingerprint = self._fingerprint(system_instruction, tool)
+        if fingerprint in self._failed:
+            return None
+
+        if self._state.get("fingerprint") == fingerprint and not self._verified:
+            # Wpis z poprzedniej sesji - sprawdzamy raz, czy nadal istnieje po stronie serwera
+            try:
+                self.client.caches.get(name=self._state["name"])
+                self._verified = True
+            except Exception:
+                self._state = {}
+
+        expiring = self._state.get("fingerprint") == fingerprint and (
+            self._state["expire_at"] - time.time() < REFRESH_MARGIN
+        )
+        if expiring:
+            try:
+                self._extend()
+            except Exception as e:
+                # Wpis mógł wygasnąć albo zniknąć po stronie serwera - porzucamy go i tworzymy nowy
+                print(f"⚠️ [CACHE] Nie udało się przedłużyć cache, tworzę nowy: {e}")
+                self.invalidate()
+
+        try:
+            if self._state.get("fingerprint") != fingerprint:
+                self._create(fingerprint, system_instruction, tool)
+        except Exception as e:
+            # Np. prompt za krótki na cache albo brak uprawnień - wysyłamy pełny prompt
+            print(f"⚠️ [CACHE] Cache kontekstu niedostępny, wysyłam pełny prompt: {e}")
+            self._failed.add(fingerprint)
+            self._state = {}
+            return None
+
+        return self._state["name"]
+
+    def generation_config(self, system_instruction, tool):
+        """GenerateContentConfig z cached_content albo - gdy cache nie działa - pełny."""
+        with self._lock:
+            name = self.get_cache_name(system_instruction, tool)
+        if name:
+            return types.GenerateContentConfig(cached_content=name)
+        return types.GenerateContentConfig(tools=[tool], system_instruction=system_instruction)
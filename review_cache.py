@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from config import REVIEW_CACHE_FILE, REVIEW_CACHE_SIZE
+
+
+def normalize_code(code):
+    """Ujednolica końce linii i białe znaki, żeby kosmetyczne różnice nie psuły trafień."""
+    lines = [line.rstrip() for line in code.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def verdict_key(code, prompt, model):
+    digest = hashlib.sha256()
+    for piece in (model, prompt, normalize_code(code)):
+        digest.update(piece.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class VerdictCache:
+    """
+    Trwały cache werdyktów reviewera (LRU).
+    Klucz: hash znormalizowanego kodu + promptu reviewera + nazwy modelu, więc zmiana
+    promptu albo modelu automatycznie unieważnia stare werdykty.
+    """
+
+    def __init__(self, path=REVIEW_CACHE_FILE, max_entries=REVIEW_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for key, approved, feedback in json.load(f):
+                    self._entries[key] = (approved, feedback)
+        except Exception as e:
+            print(f"⚠️ [REVIEWER] Nie udało się wczytać cache werdyktów: {e}")
+            self._entries.clear()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([[key, approved, feedback] for key, (approved, feedback) in self._entries.items()], f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ [REVIEWER] Nie udało się zapisać cache werdyktów: {e}")
+
+    def get(self, key):
+        """Zwraca (czy_zatwierdzono, komentarz) albo None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, approved, feedback):
+        with self._lock:
+            self._entries[key] = (approved, feedback)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -1,47 +1,85 @@
 import os
-from google import genai
 from google.genai import types # type: ignore[import]
 from dotenv import load_dotenv # type: ignore[import]
-from prompts import reviewer_prompt
+from prompts import reviewer_prompt, diff_reviewer_prompt
+from config import MODEL_NAME
+from review_cache import VerdictCache, verdict_key
+from tracing import span
+import usage
 
 
 load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
 
-if not api_key:
-    raise RuntimeError("GEMINI_API_KEY not found in reviewer.py")
+# Klienta tworzymy dopiero przy pierwszym przeglądzie - większość uruchomień
+# w ogóle nie zapisuje plików .py, a start CLI ma być szybki
+_client = None
 
-client = genai.Client(api_key=api_key)
+def _get_client():
+    global _client
+    if _client is None:
+        from google import genai
+
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY not found in reviewer.py")
+        _client = genai.Client(api_key=api_key)
+    return _client
+
+# Ten sam kod (np. ponowny zapis po nieudanym uruchomieniu) nie idzie drugi raz do LLM
+verdict_cache = VerdictCache()
+
+def _review(payload, prompt):
+    """Wspólna ścieżka: cache werdyktów -> zapytanie do modelu -> zapis werdyktu."""
+    cache_key = verdict_key(payload, prompt, MODEL_NAME)
+    cached = verdict_cache.get(cache_key)
+    if cached is not None:
+        is_approved, feedback = cached
+        print(f"{'✅' if is_approved else '❌'} [REVIEWER] Werdykt z cache (ten kod był już sprawdzany).")
+        return is_approved, feedback
 
-def review_code(code_content: str) -> tuple[bool, str]:
-    """
-    Wysyła kod do agenta-audytora.
-    Zwraca: (czy_zatwierdzono, komentarz)
-    """
     print("\n🔍 [REVIEWER] Analizuję kod...")
     
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash", 
+        response = _get_client().models.generate_content(
+            model=MODEL_NAME,
             contents=[
-                types.Content(role="user", parts=[types.Part(text=f"CODE TO REVIEW:\n```python\n{code_content}\n```")]),
+                types.Content(role="user", parts=[types.Part(text=payload)]),
             ],
             config=types.GenerateContentConfig(
-                system_instruction=reviewer_prompt,
+                system_instruction=prompt,
                 temperature=0.0, 
             ),
         )
+        usage.record("reviewer", MODEL_NAME, response.usage_metadata)
         
         verdict = response.text.strip()
         
         if "APPROVED" in verdict:
             print("✅ [REVIEWER] Kod zatwierdzony.")
+            verdict_cache.put(cache_key, True, "Code looks safe.")
             return True, "Code looks safe."
         else:
             print(f"❌ [REVIEWER] Odrzucono: {verdict}")
+            verdict_cache.put(cache_key, False, verdict)
             return False, verdict
 
     except Exception as e:
         print(f"⚠️ [REVIEWER] Błąd API: {e}")
         
-        return False, f"Reviewer failed: {str(e)}"
\ No newline at end of file
+        return False, f"Reviewer failed: {str(e)}"
+
+def review_code(code_content: str) -> tuple[bool, str]:
+    """
+    Wysyła kod do agenta-audytora.
+    Zwraca: (czy_zatwierdzono, komentarz)
+    """
+    with span("reviewer", kind="code"):
+        return _review(f"CODE TO REVIEW:\n```python\n{code_content}\n```", reviewer_prompt)
+
+def review_diff(diff_text: str) -> tuple[bool, str]:
+    """
+    Przegląd samej zmiany (edit_file): reviewer dostaje diff z kontekstem, a nie cały plik.
+    Zwraca: (czy_zatwierdzono, komentarz)
+    """
+    with span("reviewer", kind="diff"):
+        return _review(f"CHANGE TO REVIEW:\n```diff\n{diff_text}\n```", diff_reviewer_prompt)
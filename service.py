@@ -0,0 +1,392 @@
+"""
+Tryb usługi (bez UI): wiele równoległych sesji agenta w jednym procesie.
+
+Każda sesja ma własny katalog agent_sessions/<id>/:
+  workspace/ - workspace agenta (jego pliki, tasks.db, cache wyszukiwań)
+  state/     - pamięć (snapshot + dziennik) i liczniki tokenów; poza workspace, bo snapshot
+               to pickle wczytywany w procesie usługi, a agent może pisać do workspace
+Wspólne dla wszystkich sesji są: rejestr narzędzi (call_function), klient Gemini
+(pula połączeń HTTP), cache werdyktów reviewera i pula interpreterów. Tracer
+(--profile) każda sesja ma własny.
+
+Wszystkie sesje działają na jednej pętli zdarzeń (AgentEngine); blokujące kroki idą
+do wspólnej puli wątków. Jedna sesja przetwarza naraz jedno zapytanie, a liczbę
+jednocześnie działających pętli ogranicza SERVICE_MAX_CONCURRENT_RUNS.
+
+HTTP API (JSON):
+    POST   /sessions                 -> {"session_id": ...}
+    POST   /sessions/<id>/messages   {"prompt": "..."} -> odpowiedź agenta + zużycie tokenów
+    GET    /sessions/<id>            -> liczba wiadomości i liczniki tokenów
+    DELETE /sessions/<id>            -> usuwa sesję razem z jej katalogiem
+    GET    /health                   -> liczniki usługi
+
+Użycie:
+    python service.py [--host 127.0.0.1] [--port 8765] [--auto-approve] [--cache] [--profile]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv  # type: ignore[import]
+from google import genai
+from google.genai import types  # type: ignore[import]
+
+from agent_engine import AgentEngine, AgentHooks, run_blocking
+from config import (
+    SESSIONS_DIR, SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_CONCURRENT_RUNS, SERVICE_WORKER_THREADS,
+    SERVICE_MAX_OPEN_SESSIONS, SERVICE_AUTO_APPROVE, PROMPT_CACHE_ENABLED, PYTHON_POOL_ENABLED,
+)
+from context_manager import ContextManager
+from prompt_cache import PromptCache
+import interpreter_pool
+import memory
+import tracing
+import usage
+
+# ID sesji staje się nazwą katalogu - tylko bezpieczne znaki
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def session_workspace(root, session_id):
+    return os.path.join(root, session_id, "workspace")
+
+
+def session_state_dir(root, session_id):
+    return os.path.join(root, session_id, "state")
+
+
+class SessionBusy(Exception):
+    pass
+
+
+class ServiceHooks(AgentHooks):
+    """Bez człowieka: zgody według ustawienia usługi, zdarzenia zbierane do odpowiedzi."""
+
+    def __init__(self, auto_approve):
+        self.auto_approve = auto_approve
+        self.tool_calls = []
+        self.rejected = []
+
+    async def approve(self, func_name, func_args, change=None):
+        return self.auto_approve
+
+    def on_event(self, event, **data):
+        if event == "tool_call":
+            self.tool_calls.append(data["name"])
+        elif event == "rejected":
+            self.rejected.append({"tool": data["name"], "reason": data["reason"]})
+
+
+class AgentSession:
+    """Stan jednej sesji - wszystko w jej własnym katalogu (workspace agenta + stan poza nim)."""
+
+    def __init__(self, session_id, root=SESSIONS_DIR, profile=False):
+        self.id = session_id
+        self.workspace = session_workspace(root, session_id)
+        state_dir = session_state_dir(root, session_id)
+        os.makedirs(self.workspace, exist_ok=True)
+        os.makedirs(state_dir, exist_ok=True)
+        self.journal = memory.session_journal(state_dir)
+        self.usage_path = os.path.join(state_dir, os.path.basename(memory.USAGE_FILE))
+        # Historię i liczniki wczytuje load() - poza wątkiem pętli zdarzeń
+        self.messages = None
+        self.ledger = usage.UsageLedger()
+        self._load_lock = threading.Lock()
+        self.context = ContextManager()
+        self.tracer = tracing.Tracer()
+        if profile:
+            self.tracer.enable()
+        # Jedna sesja przetwarza naraz jedno zapytanie
+        self.lock = asyncio.Lock()
+        # Ile zapytań trzyma teraz sesję (zamykamy tylko nieużywane)
+        self.users = 0
+
+    def load(self):
+        """Wczytuje pamięć i liczniki tokenów z dysku (blokujące - w pętli przez run_blocking)."""
+        with self._load_lock:
+            if self.messages is None:
+                self.ledger.load_dict(memory.load_usage(self.usage_path))
+                self.messages = memory.load_memory(self.journal)
+
+    def save(self, messages):
+        memory.save_memory(messages, self.journal)
+        memory.save_usage(self.ledger.to_dict(), self.usage_path)
+
+    def describe(self):
+        self.load()
+        description = {
+            "session_id": self.id,
+            "messages": len(self.messages),
+            "busy": self.lock.locked(),
+            "usage": {"request": self.ledger.request["total"], "session": self.ledger.session["total"]},
+        }
+        if self.tracer.enabled:
+            description["profile"] = self.tracer.summary()
+        return description
+
+
+class AgentService:
+    def __init__(self, client, root=SESSIONS_DIR, max_concurrent_runs=SERVICE_MAX_CONCURRENT_RUNS,
+                 max_open_sessions=SERVICE_MAX_OPEN_SESSIONS, auto_approve=SERVICE_AUTO_APPROVE,
+                 prompt_cache=None, stream=False, profile=False):
+        self.client = client
+        self.root = root
+        self.max_open_sessions = max_open_sessions
+        self.auto_approve = auto_approve
+        self.prompt_cache = prompt_cache
+        self.stream = stream
+        self.profile = profile
+        os.makedirs(root, exist_ok=True)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._runs = asyncio.Semaphore(max_concurrent_runs)
+        self.stats = {"requests": 0, "failed": 0, "active": 0}
+
+    # === SESJE ===
+
+    def create_session(self):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._open(session_id)
+        return session_id
+
+    def _open(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = AgentSession(session_id, self.root, self.profile)
+            self._evict()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict(self):
+        """Zamyka najdawniej używane sesje ponad limit (ich dane zostają na dysku)."""
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_open_sessions:
+                return
+            if self._sessions[session_id].users == 0:
+                del self._sessions[session_id]
+
+    def _exists(self, session_id):
+        return bool(SESSION_ID_PATTERN.match(session_id)) and os.path.isdir(os.path.join(self.root, session_id))
+
+    @contextmanager
+    def checkout(self, session_id):
+        """Sesja z pamięci albo wczytana z dysku (np. po restarcie). KeyError, gdy nie istnieje."""
+        with self._lock:
+            if session_id not in self._sessions and not self._exists(session_id):
+                raise KeyError(session_id)
+            session = self._open(session_id)
+            session.users += 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                session.users -= 1
+
+    def describe(self, session_id):
+        with self.checkout(session_id) as session:
+            return session.describe()
+
+    def delete_session(self, session_id):
+        with self._lock:
+            if not self._exists(session_id):
+                raise KeyError(session_id)
+            session = self._sessions.get(session_id)
+            if session is not None and session.users:
+                raise SessionBusy(session_id)
+            self._sessions.pop(session_id, None)
+            shutil.rmtree(os.path.join(self.root, session_id), ignore_errors=True)
+
+    # === ZAPYTANIA ===
+
+    async def send(self, session_id, prompt):
+        """Jedno zapytanie użytkownika: pętla agenta w workspace sesji."""
+        with self.checkout(session_id) as session:
+            async with session.lock:
+                await run_blocking(session.load)
+                async with self._runs:
+                    return await self._run(session, prompt)
+
+    async def _run(self, session, prompt):
+        self.stats["requests"] += 1
+        self.stats["active"] += 1
+        session.messages.append(types.Content(role="user", parts=[types.Part(text=prompt)]))
+        session.ledger.start_request(prompt)
+
+        hooks = ServiceHooks(self.auto_approve)
+        engine = AgentEngine(
+            self.client,
+            hooks=hooks,
+            stream=self.stream,
+            context=session.context,
+            prompt_cache=self.prompt_cache,
+            ledger=session.ledger,
+            tracer=session.tracer,
+            working_directory=session.workspace,
+            save_messages=session.save,
+        )
+        try:
+            text = await engine.run(session.messages)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.stats["active"] -= 1
+            await run_blocking(session.save, session.messages)
+
+        return {
+            "session_id": session.id,
+            "text": text,
+            "stop_reason": engine.stop_reason,
+            "iterations": engine.iteration + 1,
+            "tool_calls": hooks.tool_calls,
+            "rejected": hooks.rejected,
+            "usage": session.ledger.request["total"],
+        }
+
+
+# === HTTP ===
+
+def start_loop(worker_threads=SERVICE_WORKER_THREADS):
+    """Pętla zdarzeń w osobnym wątku - wątki HTTP zlecają jej zapytania."""
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="agent"))
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    return loop
+
+
+def make_handler(service, loop, verbose=False):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, data):
+            body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length))
+
+        def _route(self):
+            return [part for part in self.path.split("?", 1)[0].split("/") if part]
+
+        def do_GET(self):
+            parts = self._route()
+            if parts == ["health"]:
+                self._reply(200, dict(service.stats, open_sessions=len(service._sessions)))
+            elif len(parts) == 2 and parts[0] == "sessions":
+                try:
+                    self._reply(200, service.describe(parts[1]))
+                except KeyError:
+                    self._reply(404, {"error": "Unknown session"})
+            else:
+                self._reply(404, {"error": "Not found"})
+
+        def do_POST(self):
+            parts = self._route()
+            if parts == ["sessions"]:
+                self._reply(201, {"session_id": service.create_session()})
+                return
+            if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "messages":
+                self._reply(404, {"error": "Not found"})
+                return
+
+            try:
+                prompt = self._read_json().get("prompt")
+            except ValueError:
+                prompt = None
+            if not isinstance(prompt, str) or not prompt.strip():
+                self._reply(400, {"error": "Body must be JSON with a non-empty \"prompt\""})
+                return
+
+            future = asyncio.run_coroutine_threadsafe(service.send(parts[1], prompt), loop)
+            try:
+                self._reply(200, future.result())
+            except KeyError:
+                self._reply(404, {"error": "Unknown session"})
+            except Exception as e:
+                self._reply(500, {"error": f"Agent failed: {e}"})
+
+        def do_DELETE(self):
+            parts = self._route()
+            if len(parts) != 2 or parts[0] != "sessions":
+                self._reply(404, {"error": "Not found"})
+                return
+            try:
+                service.delete_session(parts[1])
+                self._reply(200, {"deleted": parts[1]})
+            except KeyError:
+                self._reply(404, {"error": "Unknown session"})
+            except SessionBusy:
+                self._reply(409, {"error": "Session is processing a request"})
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def serve(service, loop, host=SERVICE_HOST, port=SERVICE_PORT, verbose=False):
+    """Tworzy serwer HTTP (wywołujący robi serve_forever / shutdown)."""
+    server = ThreadingHTTPServer((host, port), make_handler(service, loop, verbose))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-session agent service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--auto-approve", action="store_true", default=SERVICE_AUTO_APPROVE,
+                        help="Allow sensitive tools (write, edit, run) without a human")
+    parser.add_argument("--cache", action="store_true", default=PROMPT_CACHE_ENABLED,
+                        help="Cache the system prompt and tool declarations on the model side")
+    parser.add_argument("--profile", action="store_true",
+                        help="Trace each session separately and report the timings in GET /sessions/<id>")
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY environment variable not set")
+
+    # Jeden klient (i jego pula połączeń) dla wszystkich sesji
+    client = genai.Client(api_key=api_key)
+    if PYTHON_POOL_ENABLED:
+        interpreter_pool.prewarm()
+
+    loop = start_loop()
+    service = AgentService(
+        client,
+        auto_approve=args.auto_approve,
+        prompt_cache=PromptCache(client) if args.cache else None,
+        profile=args.profile,
+    )
+    server = serve(service, loop, args.host, args.port, args.verbose)
+    print(f"🤖 Agent service on http://{args.host}:{args.port} (sessions in {service.root})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Lokalny pre-reviewer (AST) przed reviewerem LLM.
+
+Sprawdza w ułamku milisekundy to, co da się rozstrzygnąć bez modelu:
+  - kompilacja (błąd składni = odrzucenie z numerem linii)
+  - niezdefiniowane nazwy (brakujący import / literówka)
+  - zakazane wywołania i importy (usuwanie plików, polecenia powłoki, shell=True)
+  - literały ścieżek w operacjach na plikach - muszą wskazywać wnętrze workspace
+
+Wynik pre_review:
+  (False, powód) - oczywiste naruszenie, model nie jest pytany
+  (True, ...)    - tylko przy auto_approve (domyślnie wyłączone): trywialnie bezpieczny kod -
+                   tylko bezpieczne moduły, każde wywołanie da się przypisać do znanej funkcji,
+                   ścieżki wyłącznie z literałów, bez pętli while i dynamicznego wykonywania kodu
+  None           - przypadek niejednoznaczny, decyduje reviewer LLM
+"""
+import ast
+import builtins
+from collections import Counter
+import os
+import re
+
+from config import WORKING_DIR
+
+DENIED_CALLS = {
+    "os.remove": "deletes files",
+    "os.unlink": "deletes files",
+    "os.rmdir": "deletes directories",
+    "os.removedirs": "deletes directories",
+    "shutil.rmtree": "deletes directory trees",
+    "os.system": "runs shell commands",
+    "os.popen": "runs shell commands",
+    "os.kill": "sends signals to other processes",
+    "os.killpg": "sends signals to other processes",
+    "subprocess.getoutput": "runs shell commands",
+    "subprocess.getstatusoutput": "runs shell commands",
+    "asyncio.create_subprocess_shell": "runs shell commands",
+    "pty.spawn": "spawns an interactive shell",
+}
+DENIED_CALL_PREFIXES = {
+    "os.exec": "replaces the process with another program",
+    "os.spawn": "spawns other programs",
+}
+# Metody obiektów (np. Path(...).unlink()), których odbiorcy nie da się ustalić
+DENIED_METHODS = {"unlink": "deletes files", "rmdir": "deletes directories", "rmtree": "deletes directory trees"}
+DENIED_IMPORTS = {
+    "ctypes": "gives raw memory access",
+    "pty": "spawns interactive shells",
+    "winreg": "modifies the Windows registry",
+}
+
+# Wywołania i metody, których argumenty-literały traktujemy jak ścieżki
+FILESYSTEM_CALLS = ("open", "io.open", "sqlite3.connect")
+FILESYSTEM_PREFIXES = ("os.", "shutil.", "pathlib.", "glob.", "tarfile.", "zipfile.", "subprocess.")
+NON_FILESYSTEM_CALLS = ("os.environ", "os.getenv", "os.putenv")
+PATH_METHODS = {
+    "open", "read_text", "read_bytes", "write_text", "write_bytes", "savefig", "save", "load",
+    "to_csv", "to_json", "to_excel", "to_parquet", "read_csv", "read_json", "read_excel", "read_parquet",
+    "loadtxt", "savetxt",
+}
+ALLOWED_SYSTEM_PATHS = ("/dev/null",)
+_PATH_LITERAL = re.compile(r"^(/|~|[A-Za-z]:[\\/])|(^|[\\/])\.\.([\\/]|$)")
+
+# Kod, który importuje tylko te moduły, może zostać zatwierdzony bez modelu
+# (bez numpy/pandas/matplotlib - ich funkcje I/O czytają pliki i adresy URL)
+SAFE_MODULES = frozenset({
+    "__future__", "abc", "array", "base64", "bisect", "calendar", "cmath", "collections", "copy",
+    "csv", "dataclasses", "datetime", "decimal", "difflib", "enum", "fractions", "functools",
+    "hashlib", "heapq", "itertools", "json", "math", "numbers", "operator", "pprint", "random",
+    "re", "secrets", "statistics", "string", "struct", "textwrap", "time", "typing",
+    "unicodedata", "uuid",
+})
+DYNAMIC_BUILTINS = frozenset({
+    "eval", "exec", "compile", "__import__", "getattr", "setattr", "delattr",
+    "globals", "locals", "vars", "input", "breakpoint", "memoryview",
+})
+MODULE_NAMES = frozenset({
+    "__file__", "__name__", "__doc__", "__spec__", "__loader__", "__package__",
+    "__builtins__", "__annotations__", "__class__", "__qualname__", "__module__",
+})
+BUILTIN_NAMES = frozenset(dir(builtins))
+MAX_REPORTED = 5
+
+
+class _Analyzer(ast.NodeVisitor):
+    def __init__(self, working_directory):
+        self.root = os.path.realpath(working_directory)
+        self.aliases = {}
+        self.findings = []
+        # Powody, dla których kod nie może zostać zatwierdzony lokalnie (decyduje model)
+        self.unsure = []
+        self.star_import = False
+        self.bound = set()
+        self.loaded = []
+        # Funkcje i klasy zdefiniowane w pliku oraz nazwy, którym coś przypisano
+        self.definitions = set()
+        self.assigned = set()
+        # Wywołania nazw spoza importów i builtins - rozstrzygane po przejściu całego pliku
+        self.local_calls = []
+        self.call_targets = set()
+
+    def add(self, node, message):
+        self.findings.append((node.lineno, message))
+
+    # === IMPORTY ===
+
+    def collect_imports(self, tree):
+        """Mapa aliasów przed analizą wywołań - kolejność w pliku nie ma znaczenia."""
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        self.aliases[alias.asname] = alias.name
+                    else:
+                        self.aliases[alias.name.split(".")[0]] = alias.name.split(".")[0]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                for alias in node.names:
+                    if alias.name == "*":
+                        self.star_import = True
+                    else:
+                        self.aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+    def check_module(self, node, module):
+        top = module.split(".")[0]
+        if top in DENIED_IMPORTS:
+            self.add(node, f"import of '{module}' is not allowed ({DENIED_IMPORTS[top]})")
+        elif top not in SAFE_MODULES:
+            self.unsure.append(f"import {module}")
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.check_module(node, alias.name)
+            self.bound.add(alias.asname or alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        if node.level or not node.module:
+            self.unsure.append("relative import")
+        else:
+            self.check_module(node, node.module)
+        for alias in node.names:
+            self.bound.add(alias.asname or alias.name)
+
+    # === NAZWY ===
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.append(node)
+            # `f = open; f(...)` - referencja bez wywołania omija sprawdzanie argumentów
+            if id(node) not in self.call_targets and (node.id in FILESYSTEM_CALLS or node.id in DYNAMIC_BUILTINS):
+                self.unsure.append(f"reference to {node.id}")
+        else:
+            self.bound.add(node.id)
+            self.assigned.add(node.id)
+
+    def visit_arg(self, node):
+        self.bound.add(node.arg)
+        self.generic_visit(node)
+
+    def _visit_definition(self, node):
+        self.bound.add(node.name)
+        self.definitions.add(node.name)
+        self.generic_visit(node)
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_definition
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.bound.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    visit_MatchStar = visit_MatchAs
+    # Parametry typów (def f[T](...)) - Python 3.12+
+    visit_TypeVar = visit_ParamSpec = visit_TypeVarTuple = visit_MatchAs
+
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self.bound.add(node.rest)
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        if node.attr.startswith("__") and node.attr.endswith("__"):
+            self.unsure.append(f"dunder attribute {node.attr}")
+        self.generic_visit(node)
+
+    def visit_While(self, node):
+        self.unsure.append("while loop")
+        self.generic_visit(node)
+
+    # === WYWOŁANIA ===
+
+    def qualified_name(self, node):
+        """os.remove / shutil.rmtree itp. po rozwinięciu aliasów; None, gdy nie da się ustalić."""
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        if node.id in self.aliases:
+            base = self.aliases[node.id]
+        elif node.id in BUILTIN_NAMES:
+            base = node.id
+        else:
+            return None
+        return ".".join([base] + parts[::-1])
+
+    def visit_Call(self, node):
+        name = self.qualified_name(node.func)
+        method = node.func.attr if isinstance(node.func, ast.Attribute) else None
+        self.call_targets.add(id(node.func))
+        if name is None:
+            if isinstance(node.func, ast.Name):
+                self.local_calls.append(node.func.id)
+            else:
+                # Metoda obiektu albo wynik wywołania - nie wiemy, co naprawdę zostanie uruchomione
+                self.unsure.append("call with unresolved callee")
+
+        if name in DENIED_CALLS:
+            self.add(node, f"{name}() is not allowed ({DENIED_CALLS[name]})")
+        elif name and any(name.startswith(prefix) for prefix in DENIED_CALL_PREFIXES):
+            prefix = next(prefix for prefix in DENIED_CALL_PREFIXES if name.startswith(prefix))
+            self.add(node, f"{name}() is not allowed ({DENIED_CALL_PREFIXES[prefix]})")
+        elif name is None and method in DENIED_METHODS:
+            self.add(node, f".{method}() is not allowed ({DENIED_METHODS[method]})")
+
+        if name and name.startswith("subprocess."):
+            self.check_shell(node, name)
+        if name in DYNAMIC_BUILTINS:
+            self.unsure.append(f"{name}()")
+
+        is_filesystem = name is not None and (
+            name in FILESYSTEM_CALLS
+            or (name.startswith(FILESYSTEM_PREFIXES) and not name.startswith(NON_FILESYSTEM_CALLS))
+        )
+        if is_filesystem or method in PATH_METHODS:
+            self.check_paths(node, name or f".{method}")
+        self.generic_visit(node)
+
+    def check_shell(self, node, name):
+        for keyword in node.keywords:
+            if keyword.arg != "shell":
+                continue
+            if isinstance(keyword.value, ast.Constant):
+                if keyword.value.value:
+                    self.add(node, f"{name}() with shell=True is not allowed (runs shell commands)")
+            else:
+                self.unsure.append("dynamic shell argument")
+
+    def check_paths(self, node, name):
+        arguments = list(node.args) + [keyword.value for keyword in node.keywords]
+        for argument in arguments:
+            literal = argument
+            if not isinstance(argument, ast.Constant):
+                # Ścieżka sklejona z obliczonych części - sprawdzi ją model
+                self.unsure.append(f"{name}() with computed argument")
+                # Z f-stringa pewny jest tylko początek ("/etc/{x}"); środkowe kawałki
+                # ("{out}/chart.png" -> "/chart.png") nie są ścieżkami same w sobie
+                if not (isinstance(argument, ast.JoinedStr) and argument.values
+                        and isinstance(argument.values[0], ast.Constant)):
+                    continue
+                literal = argument.values[0]
+            if isinstance(literal.value, str) and _PATH_LITERAL.search(literal.value):
+                if not self.inside_workspace(literal.value):
+                    self.add(literal, f"{name}() uses path '{literal.value}' outside the workspace")
+
+    def inside_workspace(self, path):
+        if path in ALLOWED_SYSTEM_PATHS:
+            return True
+        path = os.path.expanduser(path)
+        resolved = os.path.realpath(os.path.join(self.root, path))
+        return os.path.commonpath([self.root, resolved]) == self.root
+
+    def resolve_local_calls(self):
+        """Wywołanie nazwy jest znane tylko, gdy to funkcja/klasa z pliku, której nic nie nadpisuje."""
+        for name in self.local_calls:
+            if name not in self.definitions or name in self.assigned:
+                self.unsure.append(f"call of {name}")
+
+    def undefined_names(self):
+        """NameError przy uruchomieniu - pomijamy przy `from x import *`."""
+        if self.star_import:
+            return
+        reported = set()
+        for node in self.loaded:
+            if node.id in self.bound or node.id in BUILTIN_NAMES or node.id in MODULE_NAMES or node.id in reported:
+                continue
+            reported.add(node.id)
+            self.add(node, f"name '{node.id}' is not defined (missing import or typo)")
+
+
+def analyze(code, working_directory=WORKING_DIR, filename="<agent>"):
+    """
+    Zwraca (błąd składni albo None, lista (linia, komunikat), lista niepewnych konstrukcji).
+    """
+    try:
+        tree = ast.parse(code, filename)
+        # Kompilacja łapie też to, czego sam parser nie widzi (np. return poza funkcją)
+        compile(tree, filename, "exec")
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None)
+        return f"{'line ' + str(line) + ': ' if line else ''}{getattr(e, 'msg', e)}", [], []
+
+    analyzer = _Analyzer(working_directory)
+    analyzer.collect_imports(tree)
+    analyzer.visit(tree)
+    analyzer.resolve_local_calls()
+    analyzer.undefined_names()
+    return None, sorted(analyzer.findings), analyzer.unsure
+
+
+def pre_review(code, working_directory=WORKING_DIR, filename="<agent>", baseline=None, auto_approve=False):
+    """
+    Werdykt dla oczywistych przypadków albo None (wtedy decyduje reviewer LLM).
+    baseline: treść pliku przed edycją - problemy, które już w nim były, nie blokują zmiany.
+    """
+    syntax_error, findings, unsure = analyze(code, working_directory, filename)
+    baseline_error, baseline_findings = None, []
+    if baseline is not None:
+        baseline_error, baseline_findings, _ = analyze(baseline, working_directory, filename)
+
+    if syntax_error:
+        # Plik i tak się nie kompilował - częściowa poprawka to sprawa dla modelu
+        if baseline_error:
+            return None
+        feedback = f"Static check: syntax error, {syntax_error}"
+        print(f"⚡ [REVIEWER] Odrzucono lokalnie: {feedback}")
+        return False, feedback
+
+    # Porównujemy liczbę wystąpień: drugi taki sam problem dopisany w edycji też jest nowy
+    known = Counter(message for _, message in baseline_findings)
+    counts = Counter(message for _, message in findings)
+    findings = [(line, message) for line, message in findings if counts[message] > known[message]]
+    if findings:
+        details = "; ".join(f"line {line}: {message}" for line, message in findings[:MAX_REPORTED])
+        more = f" (+{len(findings) - MAX_REPORTED} more)" if len(findings) > MAX_REPORTED else ""
+        feedback = f"Static check: {details}{more}"
+        print(f"⚡ [REVIEWER] Odrzucono lokalnie: {feedback}")
+        return False, feedback
+
+    if auto_approve and not unsure:
+        print("⚡ [REVIEWER] Kod zatwierdzony lokalnie (analiza statyczna).")
+        return True, "Code looks safe (static check)."
+    return None
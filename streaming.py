@@ -0,0 +1,70 @@
+from google.genai import types # type: ignore[import]
+
+
+def _merge_part(parts, part):
+    """Dokleja fragment ze streamu do listy części, sklejając kolejne kawałki tekstu."""
+    if part.text is not None and parts:
+        last = parts[-1]
+        if last.text is not None and bool(last.thought) == bool(part.thought):
+            parts[-1] = last.model_copy(update={"text": last.text + part.text})
+            return
+    parts.append(part)
+
+
+class _StreamAssembler:
+    """Składa kolejne chunki streamu w jedną odpowiedź."""
+
+    def __init__(self, on_text=None):
+        self.on_text = on_text
+        self.parts = []
+        self.role = "model"
+        self.finish_reason = None
+        self.usage_metadata = None
+
+    def add(self, chunk):
+        # usage_metadata przychodzi narastająco - ostatni chunk ma komplet
+        if chunk.usage_metadata:
+            self.usage_metadata = chunk.usage_metadata
+
+        if not chunk.candidates:
+            return
+
+        candidate = chunk.candidates[0]
+        if candidate.finish_reason:
+            self.finish_reason = candidate.finish_reason
+        if not candidate.content or not candidate.content.parts:
+            return
+
+        self.role = candidate.content.role or self.role
+        for part in candidate.content.parts:
+            if self.on_text and part.text and not part.thought:
+                self.on_text(part.text)
+            _merge_part(self.parts, part)
+
+    def response(self):
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    # Bez części (np. blokada bezpieczeństwa) content zostaje None jak w zwykłej
+                    # odpowiedzi - inaczej pusty Content trafiłby do historii
+                    content=types.Content(role=self.role, parts=self.parts) if self.parts else None,
+                    finish_reason=self.finish_reason,
+                )
+            ],
+            usage_metadata=self.usage_metadata,
+        )
+
+
+async def astream_generate_content(client, model, contents, config, on_text=None):
+    """
+    Woła generate_content_stream przez asynchronicznego klienta (client.aio) i wywołuje
+    on_text(fragment) dla każdego kawałka tekstu zaraz po jego nadejściu.
+    Zwraca złożony types.GenerateContentResponse - z pełną treścią kandydata,
+    function_calls i usage_metadata - tak, żeby pętla agenta działała jak przy
+    zwykłym generate_content.
+    """
+    assembler = _StreamAssembler(on_text)
+    stream = await client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+    async for chunk in stream:
+        assembler.add(chunk)
+    return assembler.response()
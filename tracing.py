@@ -0,0 +1,237 @@
+"""
+Lekkie spany do profilowania pętli agenta.
+
+    with span("model.call") as s:
+        response = ...
+        s.set(prompt_tokens=123)
+
+Spany zagnieżdżają się przez contextvars (call_functions przenosi kontekst do wątków
+puli), więc każdy tool.call wie, w której iteracji się wykonał. Gdy tracer jest
+wyłączony, span() zwraca pustą zaślepkę - koszt to jedno wywołanie funkcji.
+span() trafia do tracera bieżącego kontekstu (activate(), np. osobny dla sesji usługi),
+a gdy żaden nie jest ustawiony - do globalnego `tracer`.
+
+Eksport:
+  - export_jsonl() - jeden span na linię (trace_id, span_id, parent_id, name, start, duration_ms, attrs)
+  - prometheus_text() - podsumowanie w formacie tekstowym Prometheusa (kwantyle, sumy, tokeny)
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from config import WORKING_DIR, TRACE_MAX_SPANS, TRACE_SAMPLES_PER_SPAN
+from usage import token_counts
+
+TRACE_DIR = os.path.join(WORKING_DIR, ".traces")
+QUANTILES = (0.5, 0.9, 0.99)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_tracer = contextvars.ContextVar("current_tracer", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "duration_ms", "attrs")
+
+    def __init__(self, trace_id, span_id, parent_id, name, attrs):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration_ms = None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _span_key(span):
+    # Wywołania narzędzi rozbijamy na poszczególne narzędzia
+    return (span.name, span.attrs.get("tool", ""))
+
+
+class Tracer:
+    def __init__(self, max_spans=TRACE_MAX_SPANS, samples_per_span=TRACE_SAMPLES_PER_SPAN):
+        self.enabled = False
+        self.max_spans = max_spans
+        self.samples_per_span = samples_per_span
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.trace_id = uuid.uuid4().hex
+            self.spans = deque(maxlen=self.max_spans)
+            # (nazwa, narzędzie) -> {"count", "sum", "max", "samples"}
+            self._stats = {}
+            self.tokens = {"prompt": 0, "response": 0, "cached": 0}
+            self._finished = 0
+            self._exported = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        current = Span(self.trace_id, next(self._ids), parent.span_id if parent else None, name, attrs)
+        token = _current_span.set(current)
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            current.duration_ms = (time.perf_counter() - started) * 1000
+            _current_span.reset(token)
+            self._finish(current)
+
+    def _finish(self, span):
+        key = _span_key(span)
+        with self._lock:
+            self.spans.append(span)
+            self._finished += 1
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    "count": 0, "sum": 0.0, "max": 0.0, "samples": deque(maxlen=self.samples_per_span)
+                }
+            stats["count"] += 1
+            stats["sum"] += span.duration_ms
+            stats["max"] = max(stats["max"], span.duration_ms)
+            stats["samples"].append(span.duration_ms)
+
+    def record_usage(self, usage_metadata, span=None):
+        """Dolicza tokeny z usage_metadata (i dopisuje je do spanu wywołania modelu)."""
+        if not self.enabled or not usage_metadata:
+            return
+        prompt, response, cached = token_counts(usage_metadata)
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["response"] += response
+            self.tokens["cached"] += cached
+        if span is not None:
+            span.set(prompt_tokens=prompt, response_tokens=response, cached_tokens=cached)
+
+    # === PODSUMOWANIA I EKSPORT ===
+
+    def summary(self):
+        """Lista słowników: faza, liczba, suma/średnia/p50/p90/max w ms - posortowana po sumie czasu."""
+        rows = []
+        with self._lock:
+            items = [(key, dict(stats, samples=sorted(stats["samples"]))) for key, stats in self._stats.items()]
+        for (name, tool), stats in items:
+            samples = stats["samples"]
+            rows.append({
+                "span": f"{name} [{tool}]" if tool else name,
+                "count": stats["count"],
+                "total_ms": round(stats["sum"], 1),
+                "mean_ms": round(stats["sum"] / stats["count"], 2),
+                "p50_ms": round(_quantile(samples, 0.5), 2),
+                "p90_ms": round(_quantile(samples, 0.9), 2),
+                "max_ms": round(stats["max"], 2),
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP agent_span_duration_seconds Duration of agent loop phases.",
+            "# TYPE agent_span_duration_seconds summary",
+        ]
+        with self._lock:
+            items = [(key, dict(stats, samples=sorted(stats["samples"]))) for key, stats in sorted(self._stats.items())]
+            tokens = dict(self.tokens)
+        for (name, tool), stats in items:
+            labels = f'span="{name}"' + (f',tool="{tool}"' if tool else "")
+            for q in QUANTILES:
+                value = _quantile(stats["samples"], q) / 1000
+                lines.append(f'agent_span_duration_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+            lines.append(f"agent_span_duration_seconds_sum{{{labels}}} {stats['sum'] / 1000:.6f}")
+            lines.append(f"agent_span_duration_seconds_count{{{labels}}} {stats['count']}")
+        lines.append("# HELP agent_tokens_total Tokens reported in usage_metadata.")
+        lines.append("# TYPE agent_tokens_total counter")
+        for kind, value in tokens.items():
+            lines.append(f'agent_tokens_total{{kind="{kind}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export_jsonl(self, path=None):
+        """Dopisuje do pliku spany, których jeszcze nie wyeksportowano. Zwraca ścieżkę."""
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(TRACE_DIR, f"trace-{self.trace_id}.jsonl")
+        with self._lock:
+            # Bufor jest ograniczony - przy przepełnieniu najstarsze spany już wypadły
+            pending = min(self._finished - self._exported, len(self.spans))
+            new = list(self.spans)[len(self.spans) - pending:]
+            self._exported = self._finished
+        with open(path, "a", encoding="utf-8") as f:
+            for span in new:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+        return path
+
+    def export_prometheus(self, path=None):
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(TRACE_DIR, "metrics.prom")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+
+def _quantile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * q))]
+
+
+tracer = Tracer()
+
+
+def activate(active_tracer):
+    """Ustawia tracer dla bieżącego kontekstu (wątku/żądania)."""
+    return _current_tracer.set(active_tracer)
+
+
+def current_tracer():
+    return _current_tracer.get() or tracer
+
+
+def span(name, **attrs):
+    return current_tracer().span(name, **attrs)
@@ -0,0 +1,186 @@
+"""
+Liczenie tokenów i kosztu sesji oraz budżety, które zatrzymują pętlę agenta.
+
+UsageLedger sumuje usage_metadata z każdego wywołania modelu w podziale na źródło:
+  - "model"    - tury agenta
+  - "reviewer" - przeglądy kodu
+oraz szacuje, ile tokenów do kolejnych promptów wnosi wynik każdego narzędzia.
+Liczniki są dwa: bieżące zapytanie użytkownika i cała sesja (zapisywana razem
+z pamięcią sesji, więc przetrwa restart CLI).
+
+Moduły, które same wołają model (reviewer), nie dostają ledgera w argumentach -
+zapisują się do bieżącego przez record(), który korzysta z contextvar.
+"""
+import contextvars
+import threading
+
+from config import (
+    MODEL_PRICES,
+    REQUEST_TOKEN_BUDGET,
+    REQUEST_COST_BUDGET,
+    SESSION_TOKEN_BUDGET,
+    SESSION_COST_BUDGET,
+)
+
+CHARS_PER_TOKEN = 4
+# Tyle ostatnich zapytań zostaje w historii ledgera
+REQUEST_HISTORY = 50
+
+_current_ledger = contextvars.ContextVar("current_ledger", default=None)
+
+
+def _empty_totals():
+    return {"calls": 0, "prompt": 0, "response": 0, "cached": 0, "cost": 0.0}
+
+
+def _empty_bucket():
+    return {"total": _empty_totals(), "sources": {}, "tools": {}}
+
+
+def token_counts(usage_metadata):
+    """
+    (prompt, response, cached) z usage_metadata.
+    Tokeny "myślenia" są płatne jak wyjście, a prompt narzędzi (np. wyszukiwarki) jak wejście.
+    """
+    prompt = (usage_metadata.prompt_token_count or 0) + (usage_metadata.tool_use_prompt_token_count or 0)
+    response = (usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0)
+    cached = usage_metadata.cached_content_token_count or 0
+    return prompt, response, cached
+
+
+def call_cost(model, prompt, response, cached):
+    """Koszt w USD; tokeny z cache są tańsze od zwykłego wejścia."""
+    prices = MODEL_PRICES.get(model)
+    if not prices:
+        return 0.0
+    uncached = max(0, prompt - cached)
+    return (
+        uncached * prices["input"] + cached * prices.get("cached", prices["input"]) + response * prices["output"]
+    ) / 1_000_000
+
+
+class UsageLedger:
+    def __init__(self, request_tokens=REQUEST_TOKEN_BUDGET, request_cost=REQUEST_COST_BUDGET,
+                 session_tokens=SESSION_TOKEN_BUDGET, session_cost=SESSION_COST_BUDGET):
+        self.budgets = {
+            "request_tokens": request_tokens,
+            "request_cost": request_cost,
+            "session_tokens": session_tokens,
+            "session_cost": session_cost,
+        }
+        self._lock = threading.Lock()
+        self.session = _empty_bucket()
+        self.request = _empty_bucket()
+        self.history = []
+
+    # === ZAPIS ===
+
+    def start_request(self, label=""):
+        """Nowe zapytanie użytkownika - poprzednie trafia do historii."""
+        with self._lock:
+            if self.request["total"]["calls"] or self.request["tools"]:
+                self.history.append(self.request)
+                del self.history[:-REQUEST_HISTORY]
+            self.request = _empty_bucket()
+            self.request["label"] = label[:80]
+
+    def record(self, source, model, usage_metadata):
+        if not usage_metadata:
+            return
+        prompt, response, cached = token_counts(usage_metadata)
+        cost = call_cost(model, prompt, response, cached)
+        with self._lock:
+            for bucket in (self.session, self.request):
+                for totals in (bucket["total"], bucket["sources"].setdefault(source, _empty_totals())):
+                    totals["calls"] += 1
+                    totals["prompt"] += prompt
+                    totals["response"] += response
+                    totals["cached"] += cached
+                    totals["cost"] += cost
+
+    def record_tool(self, tool_name, output):
+        """Szacunek: ile tokenów wynik narzędzia dokłada do kolejnych promptów."""
+        tokens = len(str(output)) // CHARS_PER_TOKEN
+        with self._lock:
+            for bucket in (self.session, self.request):
+                stats = bucket["tools"].setdefault(tool_name, {"calls": 0, "output_tokens": 0})
+                stats["calls"] += 1
+                stats["output_tokens"] += tokens
+
+    # === BUDŻETY ===
+
+    def exceeded(self):
+        """Opis przekroczonego budżetu albo None."""
+        with self._lock:
+            checks = (
+                ("request_tokens", self.request["total"]["prompt"] + self.request["total"]["response"], "tokens in this request"),
+                ("request_cost", self.request["total"]["cost"], "USD in this request"),
+                ("session_tokens", self.session["total"]["prompt"] + self.session["total"]["response"], "tokens in this session"),
+                ("session_cost", self.session["total"]["cost"], "USD in this session"),
+            )
+        for name, used, unit in checks:
+            limit = self.budgets.get(name)
+            if limit is not None and used >= limit:
+                if name.endswith("_cost"):
+                    return f"Budget exceeded: {used:,.4f} {unit} (limit {limit:,})"
+                return f"Budget exceeded: {used:,} {unit} (limit {limit:,})"
+        return None
+
+    # === RAPORTY I TRWAŁOŚĆ ===
+
+    @staticmethod
+    def format_totals(totals):
+        return (
+            f"{totals['prompt'] + totals['response']:,} tokens "
+            f"(prompt {totals['prompt']:,}, response {totals['response']:,}, cached {totals['cached']:,}) "
+            f"${totals['cost']:.4f} in {totals['calls']} calls"
+        )
+
+    def report(self):
+        """Czytelne podsumowanie: zapytanie i sesja w podziale na źródła i narzędzia."""
+        with self._lock:
+            lines = []
+            for label, bucket in (("Request", self.request), ("Session", self.session)):
+                lines.append(f"{label}: {self.format_totals(bucket['total'])}")
+                for source, totals in sorted(bucket["sources"].items()):
+                    lines.append(f"  {source:<10} {self.format_totals(totals)}")
+                for tool, stats in sorted(bucket["tools"].items(), key=lambda item: -item[1]["output_tokens"]):
+                    lines.append(f"  tool {tool:<20} {stats['calls']} calls, ~{stats['output_tokens']:,} output tokens")
+            return "\n".join(lines)
+
+    def to_dict(self):
+        with self._lock:
+            return {"session": self.session, "request": self.request, "history": self.history}
+
+    def load_dict(self, data):
+        if not data:
+            return
+        with self._lock:
+            self.session = data.get("session") or _empty_bucket()
+            self.request = data.get("request") or _empty_bucket()
+            self.history = data.get("history") or []
+
+    def reset(self):
+        with self._lock:
+            self.session = _empty_bucket()
+            self.request = _empty_bucket()
+            self.history = []
+
+
+# === BIEŻĄCY LEDGER (dla modułów, które same wołają model) ===
+
+def activate(ledger):
+    """Ustawia ledger dla bieżącego kontekstu (wątku/żądania)."""
+    return _current_ledger.set(ledger)
+
+
+def record(source, model, usage_metadata):
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.record(source, model, usage_metadata)
+
+
+def record_tool(tool_name, output):
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.record_tool(tool_name, output)
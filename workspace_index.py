@@ -0,0 +1,249 @@
+"""
+Indeks trigramowy plików tekstowych w workspace (dla narzędzia search_files).
+
+Dla każdego pliku trzymamy zbiór trigramów (małymi literami), a globalnie
+trigram -> zbiór ścieżek. Zapytanie wybiera kandydatów przez przecięcie zbiorów
+dla trigramów, które MUSZĄ wystąpić w trafieniu, i dopiero te pliki przeszukuje
+regexem. Indeks jest aktualizowany przyrostowo: write_file/edit_file zgłaszają zmiany
+od razu, run_python_file oznacza indeks jako nieaktualny, a skan stat-only przed
+zapytaniem wyłapuje resztę (np. pliki zmienione ręcznie) - najwyżej raz na
+REFRESH_INTERVAL sekund, jeśli nic nie zgłosiło zmian.
+
+Pliki tekstowe większe niż MAX_INDEX_FILE_BYTES nie mają trigramów - są zawsze
+kandydatami i search_files przeszukuje je strumieniowo.
+"""
+import os
+import re
+import threading
+import time
+
+# Pomijane katalogi (logi, cache) i pliki zbyt duże, żeby je indeksować
+SKIP_DIRS = {"__pycache__", ".git", ".run_logs", "node_modules", ".venv", "venv"}
+MAX_INDEX_FILE_BYTES = 2 * 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+# Co ile sekund najpóźniej robimy pełny skan stat, gdy nikt nie zgłosił zmian
+REFRESH_INTERVAL = 10
+
+# Rodzaje wpisów w indeksie
+TEXT, LARGE_TEXT, BINARY = "text", "large", "binary"
+
+
+def is_indexed(rel_path):
+    """Ta sama reguła co w walk_files: bez ukrytych plików/katalogów i bez SKIP_DIRS."""
+    parts = rel_path.split("/")
+    return not any(part.startswith(".") or part in SKIP_DIRS for part in parts[:-1]) and not parts[-1].startswith(".")
+
+
+def walk_files(root):
+    """(ścieżka względna, os.DirEntry) dla plików workspace - bez ukrytych i katalogów z SKIP_DIRS."""
+    stack = [(root, "")]
+    while stack:
+        current, prefix = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS and not entry.name.startswith("."):
+                    stack.append((entry.path, prefix + entry.name + "/"))
+                continue
+            if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                continue
+            yield prefix + entry.name, entry
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _literal_runs(parsed):
+    """Zbiera ciągi literałów z sekwencji sparsowanego regexu (bez alternatyw na tym poziomie)."""
+    from re import _constants as c  # type: ignore[attr-defined]
+
+    runs, current = [], []
+    for op, value in parsed:
+        if op is c.LITERAL:
+            current.append(chr(value))
+            continue
+        if current:
+            runs.append("".join(current))
+            current = []
+        if op is c.SUBPATTERN:
+            # Grupa bez kwantyfikatora - jej literały też są wymagane
+            runs.extend(_literal_runs(value[-1]))
+        elif op in (c.MAX_REPEAT, c.MIN_REPEAT) and value[0] >= 1:
+            runs.extend(_literal_runs(value[2]))
+        # Alternatywy, klasy znaków itp. tylko przerywają ciąg literałów
+    if current:
+        runs.append("".join(current))
+    return runs
+
+
+def required_trigrams(pattern, is_regex):
+    """
+    Trigramy, które musi zawierać każdy plik z trafieniem.
+    Pusty zbiór = nie da się zawęzić (trzeba przejrzeć wszystkie pliki).
+    """
+    if not is_regex:
+        return trigrams(pattern)
+    try:
+        from re import _parser  # type: ignore[attr-defined]
+        runs = _literal_runs(_parser.parse(pattern))
+    except Exception:
+        return set()
+    required = set()
+    for run in runs:
+        required |= trigrams(run)
+    return required
+
+
+class WorkspaceIndex:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        # ścieżka względna -> (mtime_ns, rozmiar, trigramy, rodzaj: TEXT / LARGE_TEXT / BINARY)
+        self._files = {}
+        self._postings = {}
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._last_refresh = 0.0
+
+    # --- utrzymanie indeksu ---
+
+    def _read_text(self, path, size):
+        """(tekst albo None, rodzaj) - duże pliki czytamy tylko na tyle, by odróżnić binarne."""
+        with open(path, "rb") as f:
+            data = f.read(BINARY_SNIFF_BYTES if size > MAX_INDEX_FILE_BYTES else -1)
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return None, BINARY
+        if size > MAX_INDEX_FILE_BYTES:
+            return None, LARGE_TEXT
+        return data.decode("utf-8", errors="replace"), TEXT
+
+    def _remove(self, rel_path):
+        entry = self._files.pop(rel_path, None)
+        if entry is None:
+            return
+        for gram in entry[2]:
+            paths = self._postings.get(gram)
+            if paths is not None:
+                paths.discard(rel_path)
+                if not paths:
+                    del self._postings[gram]
+
+    def _add(self, rel_path, abs_path, stat):
+        try:
+            text, kind = self._read_text(abs_path, stat.st_size)
+        except OSError:
+            return
+        grams = frozenset(trigrams(text)) if text is not None else frozenset()
+        # Pliki binarne / zbyt duże też zapamiętujemy (bez trigramów), żeby ich nie czytać ponownie
+        self._files[rel_path] = (stat.st_mtime_ns, stat.st_size, grams, kind)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(rel_path)
+
+    def update_file(self, abs_path):
+        """Wywoływane po zapisie pliku - aktualizuje tylko ten jeden wpis."""
+        rel_path = os.path.relpath(os.path.abspath(abs_path), self.root).replace(os.sep, "/")
+        with self._lock:
+            self._remove(rel_path)
+            if not is_indexed(rel_path):
+                return
+            try:
+                stat = os.stat(abs_path)
+            except OSError:
+                return
+            self._add(rel_path, abs_path, stat)
+
+    def mark_dirty(self):
+        """Coś mogło zmienić pliki poza write_file/edit_file (np. skrypt) - następne zapytanie skanuje."""
+        self._dirty = True
+
+    def refresh(self, force=False):
+        """Skan stat-only: dokłada nowe/zmienione pliki i usuwa skasowane (pomijany, gdy indeks jest świeży)."""
+        seen = set()
+        with self._lock:
+            if not (force or self._dirty or time.monotonic() - self._last_refresh >= REFRESH_INTERVAL):
+                return
+            self._dirty = False
+            self._last_refresh = time.monotonic()
+            for rel_path, entry in walk_files(self.root):
+                seen.add(rel_path)
+                stat = entry.stat(follow_symlinks=False)
+                known = self._files.get(rel_path)
+                if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+                    continue
+                self._remove(rel_path)
+                self._add(rel_path, entry.path, stat)
+
+            for rel_path in [p for p in self._files if p not in seen]:
+                self._remove(rel_path)
+
+    # --- zapytania ---
+
+    def candidates(self, required):
+        """
+        Pliki tekstowe, które mogą zawierać trafienie (przecięcie list dla trigramów)
+        plus duże pliki tekstowe, których indeks nie obejmuje.
+        """
+        with self._lock:
+            large = {p for p, entry in self._files.items() if entry[3] == LARGE_TEXT}
+            if not required:
+                return sorted(p for p, entry in self._files.items() if entry[3] != BINARY)
+            postings = []
+            for gram in required:
+                paths = self._postings.get(gram)
+                if not paths:
+                    return sorted(large)
+                postings.append(paths)
+            postings.sort(key=len)
+            result = set(postings[0])
+            for paths in postings[1:]:
+                result &= paths
+                if not result:
+                    break
+            return sorted(result | large)
+
+    def is_large(self, rel_path):
+        with self._lock:
+            entry = self._files.get(rel_path)
+            return entry is not None and entry[3] == LARGE_TEXT
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "trigrams": len(self._postings),
+                "large": sum(1 for entry in self._files.values() if entry[3] == LARGE_TEXT),
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root):
+    """Indeks dla danego katalogu roboczego (jeden na proces)."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = WorkspaceIndex(root)
+        return index
+
+def notify_write(root, abs_path):
+    """Hook dla write_file: aktualizuje indeks, o ile został już zbudowany."""
+    index = _indexes.get(os.path.abspath(root))
+    if index is not None:
+        index.update_file(abs_path)
+
+def notify_changed(root):
+    """Hook dla run_python_file: skrypt mógł zmienić dowolne pliki - następne zapytanie skanuje."""
+    index = _indexes.get(os.path.abspath(root))
+    if index is not None:
+        index.mark_dirty()
+
+
+def compile_query(pattern, is_regex, case_sensitive):
+    flags = 0 if case_sensitive else re.IGNORECASE
+    return re.compile(pattern if is_regex else re.escape(pattern), flags)